@@ -51,6 +51,10 @@ parser.add_option("-f", "--fullscreen",
 parser.add_option("-d","--dev", type="int", dest= "devmode",
                   default=None, help="enable dev keys")
 parser.add_option("-k","--keysprintdbg",type="string", dest="printkeys",default="",help="keys to enable selective printing of debug info. Separator is ':'")
+parser.add_option("-r", "--record", dest="replayPath", default=None,
+                  help="record every play to a replay in this directory")
+parser.add_option("-p", "--replay", dest="replay", default=None,
+                  help="play back this replay")
 (options, args) = parser.parse_args()
 
 paths = [ options.configPath, baseConf ]
@@ -70,6 +74,21 @@ if options.fullscreen != None:
     conf["fullscreen"] = bool(options.fullscreen)
 if options.devmode != None:
     conf["devmode"] = bool(options.devmode)
+if options.replayPath != None:
+    conf["replay_path"] = options.replayPath
 parse_printkeys(options.printkeys)
 gameEngine = GameEngine(conf)
-gameEngine.start(CopyrightNoticeState(conf, None, gameEngine.screen))
+if options.replay:
+    from magicor.replay import Replay
+    from magicor.states.play import PlayState
+    from magicor.states.title import LevelSelectState
+    replay = Replay.load(options.replay)
+    filename, level = replay.findLevel(gameEngine.resources)
+    if not level:
+        sys.exit("level '%s' of the replay not found"%replay.title)
+    gameEngine.resources.clearLevelResources()
+    gameEngine.resources.addLevelResources(filename)
+    gameEngine.start(PlayState(conf, None, gameEngine.screen, level,
+                               LevelSelectState, replay = replay))
+else:
+    gameEngine.start(CopyrightNoticeState(conf, None, gameEngine.screen))
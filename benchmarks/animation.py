@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks the compiled sprite animations against the old frame
+interpreter that dispatched on the frame types.
+
+Player, Lava and Seeker sprites cycle through all of their animations,
+once with the compiled programs and once with the old interpreter
+patched back in. Both runs must step through the same frames.
+
+Usage: python benchmarks/animation.py [options]
+"""
+import os, sys, time, hashlib, warnings
+import pygame
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.level import Level
+from magicor.sprites import (AnimatedSprite, ImageFrame, AnimationFrame,
+                             SetFrame, JumpFrame, KillFrame, MoveFrame,
+                             SoundFrame, AttributeFrame, CallbackFrame)
+from magicor.sprites.world import Lava
+from magicor.sprites.seekers import Seeker
+from magicor.world import World, initHeadless
+
+# an animation that loops is switched after this many frames
+HOLD = 48
+
+
+def makeLevel():
+    lines = ["title animation benchmark", "shadows 0"]
+    for x in range(20):
+        lines.append("tile %d 17 tiles/stone"%x)
+    lines.append("sprite 1 16 player")
+    lines.append("sprite 18 16 fire")
+    for x in range(4, 8):
+        lines.append("sprite %d 16 lava"%x)
+    return Level("\n".join(lines))
+
+
+def legacySetAnimation(self, name, bResetIndex=True):
+    if name not in self._animations:
+        raise KeyError("no animation named '%s' for sprite %s"
+                       %(name, type(self)))
+    self._animationName = name
+    self._index = 0
+    self._count = 0
+    self.image = None
+    self.flags = {}
+    self._srcRect = pygame.Rect((0, 0, 0, 0))
+    for frame in self._animations[name]:
+        if isinstance(frame, ImageFrame):
+            self.image = self.resources[frame.resource]
+            self.rect.left = self.x
+            self.rect.top = self.y
+            self.rect.width = frame.width
+            self.rect.height = frame.height
+            if self.width is None:
+                self.width = frame.width
+            if self.height is None:
+                self.height = frame.height
+        elif self.image and isinstance(frame, AnimationFrame):
+            self._frameIndex = frame.frame
+            break
+    self.reindex()
+
+
+def legacyAnimate(self):
+    name = self._animationName
+    animation = self._animations[self._animationName]
+    while self._index < len(animation):
+        if name != self._animationName:
+            name = self._animationName
+            animation = self._animations[self._animationName]
+        frame = animation[self._index]
+        if isinstance(frame, ImageFrame):
+            self.image = self.resources[frame.resource]
+            self.rect.left = self.x
+            self.rect.top = self.y
+            self.rect.width = frame.width
+            self.rect.height = frame.height
+            self.reindex()
+            self._index += 1
+        elif isinstance(frame, SetFrame):
+            self.setAnimation(frame.animationName)
+        elif isinstance(frame, JumpFrame):
+            self._index = frame.index
+        elif isinstance(frame, KillFrame):
+            self.kill()
+            break
+        elif isinstance(frame, AnimationFrame):
+            if self._count == 0:
+                self._frameIndex = frame.frame
+            self._count += 1
+            if self._count > frame.delay:
+                self._index += 1
+                self._count = 0
+            else:
+                break
+        elif isinstance(frame, MoveFrame):
+            self.x += frame.x
+            self.y += frame.y
+            self._index += 1
+        elif isinstance(frame, SoundFrame):
+            self.resources.playSound(frame.resource)
+            self._index += 1
+        elif isinstance(frame, AttributeFrame):
+            if hasattr(self, frame.attr):
+                setattr(self, frame.attr, frame.value)
+            self._index += 1
+        elif isinstance(frame, CallbackFrame):
+            callback = frame.callback
+            if isinstance(callback, str):
+                callback = getattr(self, callback)
+            callback(*frame.args, **frame.kwargs)
+            self._index += 1
+        else:
+            raise TypeError("invalid frame, %s in sprite %s"
+                            %(frame, self))
+
+
+def makeSprite(kind):
+    world = World(makeLevel(), False)
+    world.initializeSprites()
+    if kind == "player":
+        return world.player
+    elif kind == "lava":
+        return [s for s in world.world if isinstance(s, Lava)][0]
+    return Seeker(320.0, 320.0, [1.0, 0.5], 3.0, world.player)
+
+
+def run(kind, frames):
+    """
+    Returns animated frames per second and a digest of the frames.
+    """
+    sprite = makeSprite(kind)
+    names = sorted(sprite._animations)
+    h = hashlib.md5()
+    n = 0
+    held = 0
+    sprite.setAnimation(names[0])
+    start = time.perf_counter()
+    for i in range(frames):
+        sprite.animate()
+        held += 1
+        if (held >= HOLD or sprite._index
+            >= len(sprite._animations[sprite._animationName])):
+            n = (n + 1) % len(names)
+            held = 0
+            sprite.x, sprite.y = 320, 320
+            sprite.setAnimation(names[n])
+        if i % 64 == 0:
+            h.update(("%s %d %d %r %r;"%(sprite._animationName,
+                                         sprite._index,
+                                         sprite._frameIndex,
+                                         sprite.x, sprite.y)).encode())
+    elapsed = time.perf_counter() - start
+    return frames / elapsed, h.hexdigest()
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-f", "--frames", type="int", dest="frames",
+                      default=200000, help="frames to animate per sprite")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    resources = initHeadless([os.path.join(BASE_PATH, "data")])
+    resources.addLevelResources(
+        os.path.join(BASE_PATH, "data", "levels", "space", "space-01.lvl"))
+    identical = True
+    print("%-8s %14s %14s %8s"%("sprite", "interpreted", "compiled",
+                                 "speedup"))
+    for kind in ("player", "lava", "seeker"):
+        compiled, compiledPrint = run(kind, options.frames)
+        animate = AnimatedSprite.animate
+        setAnimation = AnimatedSprite.setAnimation
+        AnimatedSprite.animate = legacyAnimate
+        AnimatedSprite.setAnimation = legacySetAnimation
+        try:
+            interpreted, interpretedPrint = run(kind, options.frames)
+        finally:
+            AnimatedSprite.animate = animate
+            AnimatedSprite.setAnimation = setAnimation
+        identical = identical and compiledPrint == interpretedPrint
+        print("%-8s %10.0f f/s %10.0f f/s %7.2fx"%(kind, interpreted,
+                                                   compiled,
+                                                   compiled / interpreted))
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
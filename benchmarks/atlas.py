@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks rendering levels with the sprite frames sliced in the atlas
+against rendering them from the sprite sheets.
+
+The first level of every theme is rendered headless by PlayState, once
+with the sprite sheets left as they are loaded and converted and once
+packed into the atlas. Both runs must render the same pixels. The time
+it takes to load the resources of a theme is reported too, with and
+without packing them.
+
+Usage: python benchmarks/atlas.py [options]
+"""
+import os, sys, time, hashlib, warnings, io, contextlib
+import pygame
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor import ConfigDict
+from magicor.level import Level
+from magicor.resources import Resources
+from magicor.states import BaseState
+from magicor.states.play import PlayState
+from magicor.world import initHeadless
+
+
+class Ended(BaseState):
+    """
+    Where PlayState would go when the level ends.
+    """
+
+    def run(self):
+        pass
+
+
+def findThemes(path):
+    """
+    Returns a level file of every theme directory.
+    """
+    ret = []
+    for theme in sorted(os.listdir(path)):
+        directory = os.path.join(path, theme)
+        if os.path.isdir(directory) and not theme.startswith("_"):
+            for f in sorted(os.listdir(directory)):
+                if f.endswith(".lvl"):
+                    ret.append(os.path.join(directory, f))
+                    break
+    return ret
+
+
+def render(resources, config, screen, themes, frames):
+    """
+    Returns the seconds it took to render the levels, the seconds it
+    took to load their themes and a digest of the frames rendered.
+    """
+    h = hashlib.md5()
+    rendering = loading = 0.0
+    for filename in themes:
+        resources.clearLevelResources()
+        start = time.perf_counter()
+        resources.addLevelResources(filename)
+        loading += time.perf_counter() - start
+        state = PlayState(config, None, screen,
+                          Level(open(filename).read()), Ended)
+        state.update()
+        start = time.perf_counter()
+        for i in range(frames):
+            state.render()
+        rendering += time.perf_counter() - start
+        h.update(pygame.image.tobytes(screen, "RGB"))
+    return rendering, loading, h.hexdigest()
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-f", "--frames", type="int", dest="frames",
+                      default=300, help="frames to render per level")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    data = os.path.join(BASE_PATH, "data")
+    themes = findThemes(os.path.join(data, "levels"))
+    config = ConfigDict({"default_tile": "tiles/stone", "joystick": 0,
+                         "music": 0})
+    pack = Resources._pack
+    # resources are chatty about every file they load
+    with contextlib.redirect_stdout(io.StringIO()):
+        resources = initHeadless([data])
+        screen = pygame.display.set_mode((800, 600))
+        Resources._pack = lambda self, atlas, images: None
+        try:
+            resources.convertImages()
+            sheets = render(resources, config, screen, themes,
+                            options.frames)
+        finally:
+            Resources._pack = pack
+        resources._pack(resources._atlas, resources._resources)
+        atlas = render(resources, config, screen, themes, options.frames)
+    renders = len(themes) * options.frames
+    print("%-10s %8s %12s"%("", "levels", "frames/sec"))
+    for name, (rendering, loading, digest) in (("sheets", sheets),
+                                               ("atlas", atlas)):
+        print("%-10s %8d %12.1f"%(name, len(themes), renders / rendering))
+    print("speedup:        %.2fx"%(sheets[0] / atlas[0]))
+    print("atlas pages:    %d"%len(resources._atlas.pages))
+    print("theme loading:  %.1fms, %.1fms packed"
+          %(sheets[1] * 1000 / len(themes), atlas[1] * 1000 / len(themes)))
+    identical = sheets[2] == atlas[2]
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
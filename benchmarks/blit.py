@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks blitting the images as loaded against the images converted
+to the display format by Resources.convertImage().
+
+Every image of the game is blitted all over a display sized surface,
+first as pygame.image.load() returns it and then converted. Both must
+draw the same pixels. The results are summed up by the kind of image
+the conversion found, and the scroller of PlayState is timed with and
+without RLE acceleration of its colorkey.
+
+Usage: python benchmarks/blit.py [options]
+"""
+import os, sys, time, hashlib, warnings, io, contextlib
+import pygame
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.resources import Resources
+from magicor.world import initHeadless
+
+
+def findImages(path):
+    ret = []
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            if f[-3:] in Resources.SUPPORTED_IMAGES:
+                ret.append(os.path.join(root, f))
+    ret.sort()
+    return ret
+
+
+def blit(image, blits, background):
+    """
+    Returns the seconds it took to blit the image and a digest of the
+    result.
+    """
+    surface = background.copy()
+    # sprites are blitted a frame at a time
+    area = pygame.Rect(0, 0, min(image.get_width(), 96),
+                       min(image.get_height(), 96))
+    width = surface.get_width() - area.width
+    height = surface.get_height() - area.height
+    start = time.perf_counter()
+    for i in range(blits):
+        surface.blit(image, ((i * 37) % width, (i * 53) % height), area)
+    elapsed = time.perf_counter() - start
+    return elapsed, hashlib.md5(pygame.image.tobytes(surface,
+                                                     "RGB")).hexdigest()
+
+
+def scroller(ticks, flags):
+    """
+    Returns the seconds it took to scroll and blit a scroller like the
+    one of PlayState.
+    """
+    screen = pygame.Surface((800, 600), 0, 32)
+    surface = pygame.Surface((832, 32), pygame.HWSURFACE, 32)
+    surface.fill(0)
+    for x in range(0, 832, 64):
+        surface.fill((200, 200, 255), (x, 8, 24, 16))
+    start = time.perf_counter()
+    for i in range(ticks):
+        surface.set_colorkey(None)
+        surface.blit(surface, (0, 0), (3, 0, 829, 32))
+        surface.set_colorkey(0, flags)
+        screen.blit(surface, (0, 568))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-b", "--blits", type="int", dest="blits",
+                      default=2000, help="blits per image")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    # resources are chatty about every file they load
+    with contextlib.redirect_stdout(io.StringIO()):
+        resources = initHeadless([os.path.join(BASE_PATH, "data")])
+    pygame.display.set_mode((800, 600))
+    background = pygame.Surface((800, 600), 0, 32)
+    background.blit(pygame.image.load(
+        os.path.join(BASE_PATH, "data", "levels", "space",
+                     "_bg-nebula.png")).convert(), (0, 0))
+    times = {}
+    identical = True
+    for filename in findImages(os.path.join(BASE_PATH, "data")):
+        image = pygame.image.load(filename)
+        converted = resources.convertImage(image)
+        kind = resources.imageKind(converted)
+        loadedTime, loadedPrint = blit(image, options.blits, background)
+        convertedTime, convertedPrint = blit(converted, options.blits,
+                                             background)
+        if loadedPrint != convertedPrint:
+            print("differs:  %s"%os.path.relpath(filename, BASE_PATH))
+            identical = False
+        count, loaded, conv = times.get(kind, (0, 0.0, 0.0))
+        times[kind] = (count + 1, loaded + loadedTime, conv + convertedTime)
+    print("%-10s %7s %14s %14s %8s"%("kind", "images", "loaded b/s",
+                                      "converted b/s", "speedup"))
+    total = [0, 0.0, 0.0]
+    for kind in Resources.IMAGE_KINDS:
+        if kind in times:
+            count, loaded, conv = times[kind]
+            blits = count * options.blits
+            print("%-10s %7d %14.0f %14.0f %7.1fx"%(kind, count,
+                                                     blits / loaded,
+                                                     blits / conv,
+                                                     loaded / conv))
+            total = [total[0] + count, total[1] + loaded, total[2] + conv]
+    blits = total[0] * options.blits
+    print("%-10s %7d %14.0f %14.0f %7.1fx"%("all", total[0],
+                                             blits / total[1],
+                                             blits / total[2],
+                                             total[1] / total[2]))
+    plain = scroller(options.blits, 0)
+    rle = scroller(options.blits, pygame.RLEACCEL)
+    print("scroller:       %.0f t/s, %.0f t/s with RLE, %.1fx"
+          %(options.blits / plain, options.blits / rle, plain / rle))
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks listing the levels for the level browser with the level
+catalog against parsing every level the way the browser used to.
+
+A user path is made with a large level pack, copies of the shipped
+levels, and the levels are listed once by parsing all of them, once
+with an empty catalog cache that is filled and written and once with
+the filled cache. All three must list the same levels.
+
+Usage: python benchmarks/catalog.py [options]
+"""
+import os, sys, time, shutil, tempfile, warnings, io, contextlib
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.level import Level
+from magicor.resources import Resources
+
+
+def makePack(path, copies):
+    """
+    Copies the shipped levels into a level pack of the user path.
+    """
+    pack = os.path.join(path, "levels", "pack")
+    os.makedirs(pack)
+    levels = os.path.join(BASE_PATH, "data", "levels")
+    count = 0
+    for theme in sorted(os.listdir(levels)):
+        directory = os.path.join(levels, theme)
+        if not os.path.isdir(directory):
+            continue
+        for f in sorted(os.listdir(directory)):
+            if f.endswith(".lvl"):
+                with open(os.path.join(directory, f)) as src:
+                    data = src.read()
+                for i in range(copies):
+                    count += 1
+                    # every copy is a level of its own
+                    with open(os.path.join(pack, "%05d.lvl"%count),
+                              "w") as dst:
+                        dst.write(data.replace("title ", "title %d "%i, 1))
+    return count
+
+
+def parseAll(resources):
+    ret = []
+    for path, levelInfo in resources.loadLevelData():
+        for filename, data in levelInfo:
+            level = Level(data)
+            ret.append((level.id, level.title, level.credits,
+                        level.description, filename))
+    return ret
+
+
+def catalog(resources):
+    return [(entry.id, entry.title, entry.credits, entry.description,
+             entry.filename) for entry in resources.loadLevelCatalog()]
+
+
+def run(userPath, cacheFile, listing):
+    """
+    Returns the seconds it took to list the levels and the levels.
+    """
+    resources = Resources([userPath, os.path.join(BASE_PATH, "data")],
+                          False, False, levelCatalog = cacheFile)
+    start = time.perf_counter()
+    levels = listing(resources)
+    return time.perf_counter() - start, levels
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-c", "--copies", type="int", dest="copies",
+                      default=20, help="copies of every level in the pack")
+    parser.add_option("-r", "--runs", type="int", dest="runs",
+                      default=3, help="runs of each, the best is reported")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    userPath = tempfile.mkdtemp()
+    cacheFile = os.path.join(userPath, "levels.cache")
+    results = {"parsed": [], "cold": [], "warm": []}
+    listings = []
+    try:
+        count = makePack(userPath, options.copies)
+        # resources are chatty about every path they search
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(options.runs):
+                for name in ("parsed", "cold", "warm"):
+                    if name == "cold" and os.path.exists(cacheFile):
+                        os.remove(cacheFile)
+                    elapsed, levels = run(userPath, cacheFile,
+                                          name == "parsed" and parseAll
+                                          or catalog)
+                    results[name].append(elapsed)
+                    listings.append(levels)
+    finally:
+        shutil.rmtree(userPath)
+    best = min(results["parsed"])
+    print("%d levels, %d in the pack"%(len(listings[0]), count))
+    print("%-12s %10s %8s"%("listing", "time", "speedup"))
+    for name, label in (("parsed", "parsed"), ("cold", "empty cache"),
+                        ("warm", "filled cache")):
+        elapsed = min(results[name])
+        print("%-12s %8.1fms %7.1fx"%(label, elapsed * 1000, best / elapsed))
+    identical = all(levels == listings[0] for levels in listings)
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
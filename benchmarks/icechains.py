@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks testing whether connected ices fall with the supports
+remembered by BlocksGroup against walking every chain for every ice.
+
+A synthetic level of long ice bridges, some held up by the walls and
+some by a single pillar, with loose ices dropping onto them, is
+simulated headless once as it is and once with the old walks patched
+back into Ice.testFall(). So is a level of bridges held up by nothing,
+falling onto each other, where every ice moves and tests the chain
+every tick. Both runs of a level are seeded the same way and must end
+in the same state.
+
+Usage: python benchmarks/icechains.py [options]
+"""
+import os, sys, time, hashlib, warnings, io, contextlib
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.level import Level
+from magicor.sprites.blocks import Ice
+from magicor.world import World, initHeadless
+
+
+def makeLevel():
+    """
+    Walls left and right, a floor, and bridges of connected ices every
+    third row, every other one held up by the walls and the rest by a
+    pillar in the middle, with a loose ice above each end.
+    """
+    lines = ["title ice chain benchmark", "shadows 0"]
+    for y in range(18):
+        lines.append("tile 0 %d tiles/stone"%y)
+        lines.append("tile 19 %d tiles/stone"%y)
+    for x in range(1, 19):
+        lines.append("tile %d 17 tiles/stone"%x)
+    lines.append("sprite 1 16 player")
+    lines.append("sprite 18 16 fire")
+    for n, y in enumerate(range(2, 16, 3)):
+        if n % 2:
+            left, right = 2, 17
+            lines.append("tile 9 %d tiles/stone"%(y + 1))
+        else:
+            left, right = 1, 18
+        for x in range(left, right + 1):
+            lines.append("sprite %d %d ice connect"%(x, y))
+        lines.append("sprite %d %d ice"%(left + 1, y - 2))
+        lines.append("sprite %d %d ice"%(right - 1, y - 2))
+    return Level("\n".join(lines))
+
+
+def makeFallingLevel():
+    """
+    Walls left and right, a floor, and bridges of connected ices every
+    other row touching neither wall, so they all fall.
+    """
+    lines = ["title falling ice chain benchmark", "shadows 0"]
+    for y in range(18):
+        lines.append("tile 0 %d tiles/stone"%y)
+        lines.append("tile 19 %d tiles/stone"%y)
+    for x in range(1, 19):
+        lines.append("tile %d 17 tiles/stone"%x)
+    lines.append("sprite 1 16 player")
+    for y in range(1, 13, 2):
+        for x in range(2, 18):
+            lines.append("sprite %d %d ice connect"%(x, y))
+    return Level("\n".join(lines))
+
+
+def walkingTestFall(self):
+    if (not self.created
+        or self.blockedBelow()
+        or self.right == self
+        or self.left == self):
+        return False
+    right = self.right
+    while right:
+        if right.blockedBelow() or right == right.right:
+            self.y = right.y
+            return False
+        right = right.right
+    left = self.left
+    while left:
+        if left.blockedBelow() or left == left.left:
+            self.y = left.y
+            return False
+        left = left.left
+    return True
+
+
+def fingerprint(world):
+    h = hashlib.md5()
+    for group in (world.players, world.blocks):
+        for s in group:
+            h.update(("%s %r %r %s;"%(type(s).__name__, s.x, s.y,
+                                      s._animationName)).encode())
+    return h.hexdigest()
+
+
+def run(level, ticks):
+    world = World(level, False, seed = 0)
+    world.initializeSprites()
+    blocks = len(world.blocks)
+    start = time.perf_counter()
+    for i in range(ticks):
+        world.step()
+    elapsed = time.perf_counter() - start
+    return blocks, ticks / elapsed, fingerprint(world)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-t", "--ticks", type="int", dest="ticks",
+                      default=300, help="ticks to simulate per run")
+    parser.add_option("-r", "--runs", type="int", dest="runs",
+                      default=3, help="runs of each, the best is reported")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    # resources are chatty about every path they search
+    with contextlib.redirect_stdout(io.StringIO()):
+        resources = initHeadless([os.path.join(BASE_PATH, "data")])
+        resources.addLevelResources(
+            os.path.join(BASE_PATH, "data", "levels", "space",
+                         "space-01.lvl"))
+    identical = True
+    for name, makeLevel_ in (("bridges", makeLevel),
+                             ("falling", makeFallingLevel)):
+        remembered = walking = 0
+        # the arms take turns, so they share whatever else the machine
+        # is doing
+        for i in range(options.runs):
+            blocks, speed, rememberedPrint = run(makeLevel_(), options.ticks)
+            remembered = max(remembered, speed)
+            testFall = Ice.testFall
+            Ice.testFall = walkingTestFall
+            try:
+                blocks, speed, walkingPrint = run(makeLevel_(),
+                                                  options.ticks)
+            finally:
+                Ice.testFall = testFall
+            walking = max(walking, speed)
+        print("%s, %d ices"%(name, blocks))
+        print("walking chains: %.1f ticks/sec"%walking)
+        print("supports:       %.1f ticks/sec"%remembered)
+        print("speedup:        %.2fx"%(remembered / walking))
+        identical = identical and rememberedPrint == walkingPrint
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
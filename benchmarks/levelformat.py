@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks loading levels from the binary level format against parsing
+the level files.
+
+The shipped levels are copied to a temporary directory and loaded by
+loadLevel(), once from the level files and once from compiled files
+made by compileLevel(). Both must load the same levels, down to the
+text they are saved as.
+
+Usage: python benchmarks/levelformat.py [options]
+"""
+import os, sys, time, shutil, tempfile, warnings
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.level import loadLevel, compileLevel, compiledFilename
+
+
+def copyLevels(path):
+    ret = []
+    levels = os.path.join(BASE_PATH, "data", "levels")
+    for root, dirs, files in os.walk(levels):
+        for f in sorted(files):
+            if f.endswith(".lvl"):
+                filename = os.path.join(path, "%03d.lvl"%len(ret))
+                shutil.copy2(os.path.join(root, f), filename)
+                ret.append(filename)
+    return ret
+
+
+def load(filenames, runs):
+    """
+    Returns the best seconds it took to load the levels and the text
+    of the levels with their ids.
+    """
+    best = None
+    for i in range(runs):
+        start = time.perf_counter()
+        levels = [loadLevel(filename) for filename in filenames]
+        elapsed = time.perf_counter() - start
+        best = best is None and elapsed or min(best, elapsed)
+    return best, [(level.id, str(level)) for level in levels]
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-r", "--runs", type="int", dest="runs",
+                      default=10, help="runs of each, the best is reported")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    path = tempfile.mkdtemp()
+    try:
+        filenames = copyLevels(path)
+        textSize = sum(os.path.getsize(f) for f in filenames)
+        parsed = load(filenames, options.runs)
+        for filename in filenames:
+            compileLevel(filename)
+        binarySize = sum(os.path.getsize(compiledFilename(f))
+                         for f in filenames)
+        compiled = load(filenames, options.runs)
+    finally:
+        shutil.rmtree(path)
+    print("%d levels"%len(filenames))
+    print("%-10s %10s %10s"%("format", "load", "size"))
+    for name, (elapsed, levels), size in (("text", parsed, textSize),
+                                          ("binary", compiled, binarySize)):
+        print("%-10s %8.1fms %8.1fkB"%(name, elapsed * 1000, size / 1024.0))
+    print("speedup:        %.1fx"%(parsed[0] / compiled[0]))
+    identical = parsed[1] == compiled[1]
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Runs every shipped level headless and measures how expensive it is.
+
+Each level found by Resources.loadLevelData() is simulated for a number
+of ticks, either idle or with scripted input, and then rendered once
+per tick. For every level it reports the simulation ticks per second,
+the rendered frames per second, the peak number of sprites in each
+group and the garbage collections and allocated memory blocks the
+simulation caused.
+
+The results can be written as JSON with sorted keys, so two runs can be
+diffed, or compared directly with --compare.
+
+With --without the levels are run with and without one of the
+optimisations of the game instead, see FEATURES, taking turns so both
+share whatever else the machine is doing. The best simulation ticks per
+second of each are reported and every level must end the same way
+both ways. The optimisations were measured with scripted input and
+without eyecandy, for example:
+
+    python benchmarks/levels.py -s -p -t 300 -r 2 --without occupancy
+
+Usage: python benchmarks/levels.py [options]
+"""
+import os, sys, gc, time, json, random, hashlib, warnings, io, contextlib
+import pygame
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.level import Level
+from magicor.sprites import AnimatedSprite
+from magicor.sprites.enemies import Enemy
+from magicor.sprites.occupancy import OccupancyGrid
+from magicor.sprites.particles import ParticleEmitter
+from magicor.sprites.world import TubeRegistry
+from magicor.world import World, initHeadless
+
+# groups of the world whose peak sizes are reported
+GROUPS = ("players", "blocks", "fires", "enemies", "world", "stones",
+          "decorations", "lights", "hudSprites")
+
+# the scripted input presses one of these every tick, or nothing
+MOVES = ("left", "right", "left", "right", "up", "down", "action",
+         None, None)
+
+
+class Inputs(object):
+    """
+    Input for World.step(), pressing nothing or a random move each
+    tick.
+    """
+
+    def __init__(self, seed = None):
+        self.random = seed is not None and random.Random(seed) or None
+        self.next()
+
+    def next(self):
+        move = self.random and self.random.choice(MOVES)
+        for name in ("left", "right", "up", "down", "action"):
+            setattr(self, name, move == name)
+
+
+class Feature(object):
+    """
+    An optimisation --without takes out, by patching what it replaced
+    back in while entered. Only the levels with one of the sprites it
+    is about are run, or all of them if it names none.
+    """
+
+    def __init__(self, patches, sprites = ()):
+        """
+        Arguments:
+        patches             (owner, name, value) tuples of the attributes
+                            to set.
+        sprites             Names of the level sprites it is about.
+        """
+        self.patches = patches
+        self.sprites = sprites
+        self._saved = []
+
+    def applies(self, level):
+        return (not self.sprites
+                or [s for s in level.sprites if s.name in self.sprites])
+
+    def __enter__(self):
+        self._saved = [(owner, name, getattr(owner, name))
+                       for owner, name, value in self.patches]
+        for owner, name, value in self.patches:
+            setattr(owner, name, value)
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, value in self._saved:
+            setattr(owner, name, value)
+
+
+def unanswered(grid, *area):
+    return None
+
+
+def neverSleep(sprite, occupancy, cells = ()):
+    pass
+
+
+def neverListen(sprite, occupancy, cells):
+    pass
+
+
+def never(enemy, at):
+    return False
+
+
+def notRegistered(registry, tube):
+    return False
+
+
+# the optimisations --without can take out
+FEATURES = {
+    # the blocked queries test the tiles and sprites themselves
+    "occupancy": Feature([(OccupancyGrid, "test", unanswered)]),
+    # every sprite is updated every tick
+    "sleeping": Feature([(AnimatedSprite, "sleep", neverSleep)]),
+    # lava, fires, trapolas and stationary enemies look through the
+    # groups every tick
+    "contacts": Feature([(AnimatedSprite, "listen", neverListen)]),
+    # walking and climbing enemies ask what is in their way every tick
+    "navigation": Feature([(Enemy, "walkable", never),
+                           (Enemy, "climbable", never)],
+                          ("walking-enemy", "climbing-enemy")),
+    # tubes are matched by looking through the world group
+    "tubes": Feature([(TubeRegistry, "__contains__", notRegistered)],
+                     ("tube",)),
+    }
+
+
+def countSprites(world):
+    counts = {}
+    for name in GROUPS:
+        count = 0
+        for sprite in getattr(world, name):
+            if isinstance(sprite, ParticleEmitter):
+                count += sprite.count()
+            else:
+                count += 1
+        counts[name] = count
+    return counts
+
+
+def groups(world):
+    """
+    The groups of the world fingerprint() covers, in the order it covers
+    them.
+    """
+    return (world.players, world.blocks, world.fires, world.enemies,
+            world.world, world.stones)
+
+
+def fingerprint(world):
+    """
+    Returns a digest of the type, position and animation of every sprite
+    of the groups, so the runs of a level can be compared.
+    """
+    h = hashlib.md5()
+    for group in groups(world):
+        for s in group:
+            h.update(("%s %r %r %s;"%(type(s).__name__, s.x, s.y,
+                                      s._animationName)).encode())
+    return h.hexdigest()
+
+
+def runLevel(resources, filename, data, options):
+    """
+    Returns the measurements of one level.
+    """
+    resources.clearLevelResources()
+    resources.addLevelResources(filename)
+    level = Level(data)
+    world = World(level, not options.plain, seed = options.seed)
+    world.initializeSprites()
+    surface = pygame.Surface((level.width * 32, level.height * 32), 0, 32)
+    world.renderLevel()
+    inputs = Inputs(options.seed if options.scripted else None)
+    peak = countSprites(world)
+    simulating = rendering = 0.0
+    ticks = 0
+    gc.collect()
+    collections = [s["collections"] for s in gc.get_stats()]
+    blocks = sys.getallocatedblocks()
+    peakBlocks = blocks
+    while ticks < options.ticks and not world.over():
+        start = time.perf_counter()
+        world.step(inputs)
+        simulated = time.perf_counter()
+        if options.dirty:
+            world.renderDirty(surface)
+        else:
+            world.render(surface)
+        rendering += time.perf_counter() - simulated
+        simulating += simulated - start
+        ticks += 1
+        inputs.next()
+        peakBlocks = max(peakBlocks, sys.getallocatedblocks())
+        for name, count in countSprites(world).items():
+            peak[name] = max(peak[name], count)
+    return {"title": level.title,
+            "ticks": ticks,
+            "ticks_per_sec": round(ticks / (simulating or 1), 1),
+            "frames_per_sec": round(ticks / (rendering or 1), 1),
+            "peak_sprites": peak,
+            "peak_sprites_total": sum(peak.values()),
+            "gc_collections": [s["collections"] - c for s, c
+                               in zip(gc.get_stats(), collections)],
+            "peak_allocated_blocks": peakBlocks - blocks,
+            "fingerprint": fingerprint(world),
+            }
+
+
+def findLevels(resources, pattern):
+    """
+    Returns the (name, filename, data) of every level, sorted by name.
+    """
+    ret = []
+    for path, levelInfo in resources.loadLevelData():
+        for filename, data in levelInfo:
+            name = os.path.relpath(filename, path)
+            if not pattern or pattern in name:
+                ret.append((name, filename, data))
+    ret.sort()
+    return ret
+
+
+def compare(results, filename):
+    """
+    Prints how the speed of every level changed since an earlier run.
+    """
+    with open(filename) as f:
+        previous = json.load(f)["levels"]
+    print()
+    print("%-28s %18s %18s"%("compared to %s"%os.path.basename(filename),
+                             "ticks/sec", "frames/sec"))
+    for name, result in sorted(results.items()):
+        old = previous.get(name)
+        if not old or "error" in old or "error" in result:
+            continue
+        print("%-28s %+17.1f%% %+17.1f%%"
+              %(name,
+                100.0 * result["ticks_per_sec"] / old["ticks_per_sec"] - 100,
+                100.0 * result["frames_per_sec"] / old["frames_per_sec"]
+                - 100))
+
+
+def runWithout(resources, levels, options):
+    """
+    Prints how much faster the levels the feature of --without is about
+    run with it than without it. Returns whether they all ended the same
+    both ways.
+    """
+    feature = FEATURES[options.without]
+    print("%-28s %6s %10s %10s %8s  %s"%("level", "ticks", "with",
+                                         "without", "speedup", "same"))
+    identical = True
+    seconds = {True: 0.0, False: 0.0}
+    for name, filename, data in levels:
+        if not feature.applies(Level(data)):
+            continue
+        best = {}
+        prints = {}
+        for i in range(options.runs):
+            for without in (True, False):
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        if without:
+                            with feature:
+                                result = runLevel(resources, filename,
+                                                  data, options)
+                        else:
+                            result = runLevel(resources, filename, data,
+                                              options)
+                except Exception as e:
+                    result = {"ticks": 0, "ticks_per_sec": 0.0,
+                              "fingerprint": "%s: %s"%(type(e).__name__,
+                                                       e)}
+                best[without] = max(best.get(without, 0.0),
+                                    result["ticks_per_sec"])
+                prints[without] = result["fingerprint"]
+        same = prints[True] == prints[False]
+        identical = identical and same
+        ticks = result["ticks"]
+        if ticks and best[True] and best[False]:
+            seconds[True] += ticks / best[True]
+            seconds[False] += ticks / best[False]
+            print("%-28s %6d %10.1f %10.1f %7.2fx  %s"
+                  %(name, ticks, best[False], best[True],
+                    best[False] / best[True], same and "yes" or "NO"))
+        else:
+            print("%-28s %s"%(name, prints[False]))
+    print()
+    if seconds[False]:
+        print("speedup:        %.2fx"%(seconds[True] / seconds[False]))
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    return identical
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [level name filter]")
+    parser.add_option("-t", "--ticks", type="int", dest="ticks",
+                      default=500, help="ticks to simulate per level")
+    parser.add_option("-s", "--scripted", action="store_true",
+                      dest="scripted", default=False,
+                      help="press random moves instead of idling")
+    parser.add_option("--seed", type="int", dest="seed", default=1,
+                      help="random seed for the levels and the script")
+    parser.add_option("-d", "--dirty", action="store_true", dest="dirty",
+                      default=False, help="render dirty rectangles only")
+    parser.add_option("-p", "--plain", action="store_true", dest="plain",
+                      default=False, help="run without eyecandy")
+    parser.add_option("-o", "--output", dest="output", default=None,
+                      help="write the results as JSON to this file")
+    parser.add_option("-c", "--compare", dest="compare", default=None,
+                      help="compare with the JSON results of a run")
+    parser.add_option("-w", "--without", type="choice", dest="without",
+                      choices=sorted(FEATURES), default=None,
+                      help="compare with running the levels without one "
+                      "of %s"%", ".join(sorted(FEATURES)))
+    parser.add_option("-r", "--runs", type="int", dest="runs", default=1,
+                      help="runs of each level with --without, the best "
+                      "is reported")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    # resources are chatty about every file they load
+    with contextlib.redirect_stdout(io.StringIO()):
+        resources = initHeadless([os.path.join(BASE_PATH, "data")])
+        levels = findLevels(resources, args and args[0])
+    if options.without:
+        if not runWithout(resources, levels, options):
+            sys.exit(1)
+        return
+    results = {}
+    print("%-28s %6s %10s %10s %8s %6s"%("level", "ticks", "ticks/sec",
+                                         "frames/sec", "sprites", "gc"))
+    for name, filename, data in levels:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = runLevel(resources, filename, data, options)
+        except Exception as e:
+            results[name] = {"error": "%s: %s"%(type(e).__name__, e)}
+            print("%-28s %s"%(name, results[name]["error"]))
+            continue
+        results[name] = result
+        print("%-28s %6d %10.1f %10.1f %8d %6d"
+              %(name, result["ticks"], result["ticks_per_sec"],
+                result["frames_per_sec"], result["peak_sprites_total"],
+                sum(result["gc_collections"])))
+    timed = [(1.0 / r["ticks_per_sec"] + 1.0 / r["frames_per_sec"], name)
+             for name, r in results.items() if "error" not in r]
+    timed.sort(reverse=True)
+    print()
+    print("most expensive: %s"%", ".join(name for cost, name in timed[:5]))
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump({"ticks": options.ticks,
+                       "scripted": options.scripted,
+                       "seed": options.seed,
+                       "dirty": options.dirty,
+                       "eyecandy": not options.plain,
+                       "levels": results},
+                      f, indent=1, sort_keys=True)
+            f.write("\n")
+    if options.compare:
+        compare(results, options.compare)
+
+
+if __name__ == "__main__":
+    main()
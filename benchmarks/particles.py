@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks the particle emitter against a sprite for every particle.
+
+Bursts of yellow sparks, like a dying fire leaves, and falling ice
+pieces are emitted into a group that is updated and drawn every tick.
+The sprites are the classes the particles replaced, the emitter runs
+once with NumPy and once with the array module. All runs must draw the
+same pixels.
+
+Usage: python benchmarks/particles.py [options]
+"""
+import os, sys, time, math, random, hashlib, warnings
+import pygame
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.sprites import (AnimationGroup, AnimatedSprite, ImageFrame,
+                             AnimationFrame, KillFrame)
+from magicor.sprites import particles
+from magicor.sprites.particles import ParticleEmitter, emit
+from magicor.sprites.lights import YELLOW_SPARK
+from magicor.sprites.blocks import ICE_PIECE, ICE_PIECES
+from magicor.world import initHeadless
+
+# a burst is emitted every this many ticks
+BURST = 4
+
+
+class LegacySpark(AnimatedSprite):
+
+    def __init__(self, x, y, dx, dy):
+        AnimatedSprite.__init__(
+            self, x, y, 96, 96,
+            {"default": (ImageFrame("sprites/light-yellow", 96, 96),
+                         AnimationFrame(0, 1),
+                         AnimationFrame(1, 1),
+                         AnimationFrame(2, 1),
+                         AnimationFrame(3, 1),
+                         AnimationFrame(1, 1),
+                         AnimationFrame(2, 1),
+                         AnimationFrame(3, 1),
+                         AnimationFrame(2, 1),
+                         AnimationFrame(3, 1),
+                         KillFrame())})
+        self.dx = dx
+        self.dy = dy
+
+    def physics(self):
+        self.x += self.dx
+        self.y += self.dy
+
+
+class LegacyIcePiece(AnimatedSprite):
+
+    def __init__(self, x, y, frame, dx, dy):
+        AnimatedSprite.__init__(
+            self, x, y, 32, 32,
+            {"default": (ImageFrame("sprites/ice-normal", 32, 32),)})
+        self._frameIndex = frame
+        self.dx = dx
+        self.dy = dy
+
+    def update(self):
+        self.x += self.dx
+        self.y += self.dy
+        self.dy += 0.75
+        if self.y > 600:
+            self.kill()
+
+
+def burst(group, rand, legacy):
+    x = rand.randint(0, 19) * 32
+    y = rand.randint(0, 17) * 32
+    for i in range(16):
+        angle = i * (360 / 16.0)
+        dx = 8.0 * math.cos(math.radians(angle))
+        dy = 8.0 * math.sin(math.radians(angle))
+        if legacy:
+            group.add(LegacySpark(x - 32, y - 32, dx, dy))
+        else:
+            emit(group, YELLOW_SPARK, x - 32, y - 32, dx, dy)
+    for frame, dx, dy in ICE_PIECES:
+        dx = rand.randint(*dx)
+        dy = rand.randint(*dy)
+        if legacy:
+            group.add(LegacyIcePiece(x, y, frame, dx, dy))
+        else:
+            emit(group, ICE_PIECE, x, y, dx, dy, frame)
+
+
+def run(ticks, legacy):
+    """
+    Returns the updates and draws per second, the most particles alive
+    at once and a digest of the drawn frames.
+    """
+    rand = random.Random(0)
+    group = AnimationGroup()
+    surface = pygame.Surface((640, 640), 0, 32)
+    h = hashlib.md5()
+    most = 0
+    updating = drawing = 0.0
+    for i in range(ticks):
+        if i % BURST == 0:
+            burst(group, rand, legacy)
+        surface.fill(0)
+        start = time.perf_counter()
+        group.update()
+        updated = time.perf_counter()
+        group.draw(surface)
+        updating += updated - start
+        drawing += time.perf_counter() - updated
+        most = max(most, sum(s.count() if isinstance(s, ParticleEmitter)
+                             else 1 for s in group))
+        if i % 16 == 0:
+            h.update(pygame.image.tobytes(surface, "RGB"))
+    return ticks / updating, ticks / drawing, most, h.hexdigest()
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-t", "--ticks", type="int", dest="ticks",
+                      default=2000, help="ticks to simulate per run")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    initHeadless([os.path.join(BASE_PATH, "data")])
+    pygame.display.set_mode((640, 640))
+    updates, draws, most, spritesPrint = run(options.ticks, True)
+    prints = [spritesPrint]
+    print("particles:      %d"%most)
+    print("%-8s %14s %14s"%("", "updates/sec", "draws/sec"))
+    print("%-8s %14.0f %14.0f"%("sprites", updates, draws))
+    for useNumpy in (True, False):
+        name = useNumpy and "numpy" or "array"
+        if useNumpy and particles.numpy is None:
+            print("%-8s %14s"%(name, "not installed"))
+            continue
+        ParticleEmitter.USE_NUMPY = useNumpy
+        emitterUpdates, emitterDraws, most, emitterPrint = run(options.ticks,
+                                                               False)
+        prints.append(emitterPrint)
+        print("%-8s %8.0f %4.1fx %8.0f %4.1fx"%(name,
+                                                emitterUpdates,
+                                                emitterUpdates / updates,
+                                                emitterDraws,
+                                                emitterDraws / draws))
+    identical = len(set(prints)) == 1
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
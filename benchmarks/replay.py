@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Plays replays back headless through PlayState as reproducible workloads.
+
+Every replay is played from the start of its level until it ends or
+the number of ticks runs out, updating and rendering PlayState once per
+tick. It reports the ticks and frames per second and a digest of where
+every sprite was on each tick. A replay plays out the same way every
+time, so a digest that changes after an optimisation means the game
+plays differently.
+
+With --make a replay of random moves is written for a level instead,
+the level being the first whose file name contains the given text.
+
+Usage: python benchmarks/replay.py [options] replay...
+"""
+import os, sys, time, random, hashlib, warnings, io, contextlib
+import pygame
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor import ConfigDict
+from magicor.level import Level
+from magicor.replay import Replay
+from magicor.states import BaseState
+from magicor.states.play import PlayState
+from magicor.world import initHeadless
+
+
+class Ended(BaseState):
+    """
+    Where PlayState goes when the replay ends.
+    """
+
+    def run(self):
+        pass
+
+
+def fingerprint(world, h):
+    for group in (world.players, world.blocks, world.fires,
+                  world.enemies, world.world):
+        for s in group:
+            h.update(("%s %r %r %s;"%(type(s).__name__, s.x, s.y,
+                                      s._animationName)).encode())
+
+
+def findLevel(resources, text):
+    for path, levelInfo in resources.loadLevelData():
+        for filename, data in sorted(levelInfo):
+            if text in os.path.relpath(filename, path):
+                return filename, Level(data)
+    return None, None
+
+
+def make(resources, text, options):
+    """
+    Writes a replay of random moves on the level.
+    """
+    filename, level = findLevel(resources, text)
+    if not level:
+        sys.exit("no level matching '%s'"%text)
+    replay = Replay(level = level, seed = options.seed,
+                    eyecandy = not options.plain)
+    rand = random.Random(options.seed)
+    for i in range(options.ticks):
+        # one of the buttons or nothing
+        replay.inputs.append(rand.choice((1, 2, 1, 2, 4, 8, 16, 0, 0)))
+    print("replay saved as %s"%replay.save(options.make))
+
+
+def play(resources, config, screen, filename, options):
+    """
+    Returns the ticks played, the updates and renders per second and
+    the digest of the replay.
+    """
+    replay = Replay.load(filename)
+    levelFilename, level = replay.findLevel(resources)
+    if not level:
+        raise ValueError("level '%s' not found"%replay.title)
+    resources.clearLevelResources()
+    resources.addLevelResources(levelFilename)
+    state = PlayState(config, None, screen, level, Ended, replay = replay)
+    h = hashlib.md5()
+    updating = rendering = 0.0
+    ticks = 0
+    while ticks < options.ticks and state._next is state:
+        start = time.perf_counter()
+        state.update()
+        updated = time.perf_counter()
+        state.render()
+        rendering += time.perf_counter() - updated
+        updating += updated - start
+        ticks += 1
+        fingerprint(state.world, h)
+    return ticks, ticks / (updating or 1), ticks / (rendering or 1), \
+           h.hexdigest()
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] replay...")
+    parser.add_option("-t", "--ticks", type="int", dest="ticks",
+                      default=5000, help="most ticks to play per replay")
+    parser.add_option("-d", "--dirty", action="store_true", dest="dirty",
+                      default=False, help="render dirty rectangles only")
+    parser.add_option("-m", "--make", dest="make", default=None,
+                      help="write a replay of random moves to this "
+                      "directory for the level matching the argument")
+    parser.add_option("--seed", type="int", dest="seed", default=1,
+                      help="seed of the world and moves of --make")
+    parser.add_option("-p", "--plain", action="store_true", dest="plain",
+                      default=False, help="make the replay without eyecandy")
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.error("no replay given")
+    warnings.simplefilter("ignore")
+    # resources are chatty about every file they load
+    with contextlib.redirect_stdout(io.StringIO()):
+        resources = initHeadless([os.path.join(BASE_PATH, "data")])
+    if options.make:
+        make(resources, args[0], options)
+        return
+    config = ConfigDict({"default_tile": "tiles/stone",
+                         "dirty_rects": options.dirty and 1 or 0,
+                         "joystick": 0, "music": 0})
+    screen = pygame.display.set_mode((800, 600))
+    print("%-36s %6s %10s %10s  %s"%("replay", "ticks", "ticks/sec",
+                                     "frames/sec", "digest"))
+    for filename in args:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                ticks, updates, renders, digest = play(resources, config,
+                                                       screen, filename,
+                                                       options)
+        except (IOError, ValueError) as e:
+            print("%-36s %s"%(os.path.basename(filename), e))
+            continue
+        print("%-36s %6d %10.1f %10.1f  %s"%(os.path.basename(filename),
+                                             ticks, updates, renders,
+                                             digest))
+
+
+if __name__ == "__main__":
+    main()
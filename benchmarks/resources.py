@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks the resource lookups of state transitions with the manifest
+against the old lookups that listed and stat'ed the directories.
+
+A transition adds the resources every BaseState and PlayState add and
+loads the images the title states load by name. The old lookups are
+patched back in for comparison. Both must end up with the same
+resources, the filesystem calls of each are counted.
+
+Usage: python benchmarks/resources.py [options]
+"""
+import os, sys, time, warnings, io, contextlib
+import pygame
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.resources import Resources
+
+PREFIXES = ("tiles", "sprites", "samples", "fonts", "sprites/", "sounds/")
+IMAGES = ("images/magicor", "images/title-sky", "images/footstep")
+
+
+def legacyFindAlternative(self, path, name, suffixes):
+    name1 = name
+    spl = name.split('/')
+    name2 = "%s%s_%s"%(os.path.sep.join(spl[:-1]), os.path.sep, spl[-1])
+    for suffix in suffixes:
+        fn1 = "%s%s%s.%s"%(path, os.path.sep, name1, suffix)
+        fn2 = "%s%s%s.%s"%(path, os.path.sep, name2, suffix)
+        if os.path.isfile(fn1):
+            return fn1
+        elif os.path.isfile(fn2):
+            return fn2
+    return None
+
+
+def legacyAddResources(self, ret, path, prefix = None):
+    if prefix:
+        while prefix.endswith('/'):
+            prefix = prefix[:-1]
+        p = "%s%s%s"%(path, os.path.sep, prefix)
+    else:
+        p = path
+    p = p.replace("/", os.path.sep)
+    if os.path.isdir(p):
+        for f in os.listdir(p):
+            if (os.path.isfile("%s%s%s"%(p, os.path.sep, f))
+                and f[:-4] not in ret
+                and not f[:-4].startswith("_")):
+                if prefix:
+                    name = "%s%s%s"%(prefix, '/', f[:-4])
+                else:
+                    name = f[:-4]
+                if f[-3:] in self.SUPPORTED_IMAGES:
+                    r = self._loadImage(path, name)
+                elif f[-3:] in self.SUPPORTED_SOUNDS:
+                    r = self._loadSound(path, name)
+                else:
+                    r = None
+                name = name.replace(os.path.sep, "/")
+                if r and name not in ret:
+                    ret[name] = r
+                    self.version += 1
+    return ret
+
+
+class Counter(object):
+    """
+    Counts the calls of the filesystem functions of the os module.
+    """
+    NAMES = ("stat", "listdir", "scandir")
+
+    def __init__(self):
+        self.calls = 0
+        self._originals = dict((name, getattr(os, name))
+                               for name in self.NAMES)
+
+    def __enter__(self):
+        for name, original in self._originals.items():
+            setattr(os, name, self._counted(original))
+        return self
+
+    def __exit__(self, *args):
+        for name, original in self._originals.items():
+            setattr(os, name, original)
+
+    def _counted(self, function):
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return function(*args, **kwargs)
+        return counted
+
+
+def transition(resources):
+    for prefix in PREFIXES:
+        resources.addResources(prefix)
+    for name in IMAGES:
+        resources.loadImage(name, False)
+
+
+def run(transitions):
+    """
+    Returns the seconds and filesystem calls of creating the resources
+    and of the transitions, and the resources found.
+    """
+    paths = [os.path.join(BASE_PATH, "data")]
+    with Counter() as created:
+        start = time.perf_counter()
+        resources = Resources(paths, False, False)
+        transition(resources)
+        creating = time.perf_counter() - start
+    with Counter() as transitioned:
+        start = time.perf_counter()
+        for i in range(transitions):
+            transition(resources)
+        transitioning = time.perf_counter() - start
+    return (creating, created.calls, transitioning, transitioned.calls,
+            sorted(resources._resources))
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-t", "--transitions", type="int", dest="transitions",
+                      default=50, help="state transitions to run")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.display.set_mode((800, 600))
+    # resources are chatty about every file they load
+    with contextlib.redirect_stdout(io.StringIO()):
+        manifest = run(options.transitions)
+        findAlternative = Resources.findAlternative
+        addResources = Resources._addResources
+        Resources.findAlternative = legacyFindAlternative
+        Resources._addResources = legacyAddResources
+        try:
+            legacy = run(options.transitions)
+        finally:
+            Resources.findAlternative = findAlternative
+            Resources._addResources = addResources
+    print("%-10s %10s %8s %14s %8s"%("", "startup", "fs calls",
+                                     "transition", "fs calls"))
+    for name, (creating, created, transitioning, transitioned, keys) \
+            in (("legacy", legacy), ("manifest", manifest)):
+        print("%-10s %8.1fms %8d %12.2fms %8d"
+              %(name, creating * 1000, created,
+                transitioning * 1000 / options.transitions,
+                transitioned // options.transitions))
+    print("speedup:        %.1fx"%(legacy[2] / manifest[2]))
+    identical = legacy[4] == manifest[4]
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks the AnimationGroup spatial index against the old linear scan.
+
+A synthetic level holding a few hundred ice blocks and walking enemies
+is simulated headless, once with the grid index and once with the
+linear scan patched back in. Both runs are seeded the same way and must
+end in the same state.
+
+Usage: python benchmarks/spatial.py [options]
+"""
+import os, sys, time, hashlib, warnings
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.level import Level
+from magicor.sprites import AnimationGroup
+from magicor.world import World, initHeadless
+
+ENEMY = "walking-enemy %s space/walking-blob space/blob-die 1"
+
+
+def makeLevel(enemySpacing = 2):
+    """
+    Walls left and right, a floor, and bands of two rows of ice with a
+    row of walking enemies on top of each band.
+    """
+    lines = ["title spatial benchmark", "shadows 0"]
+    for y in range(18):
+        lines.append("tile 0 %d tiles/stone"%y)
+        lines.append("tile 19 %d tiles/stone"%y)
+    for x in range(1, 19):
+        lines.append("tile %d 17 tiles/stone"%x)
+    lines.append("sprite 1 0 player")
+    lines.append("sprite 18 0 fire")
+    for y in range(17):
+        if y % 3 == 0:
+            for x in range(3, 17, enemySpacing):
+                lines.append("sprite %d %d %s"
+                             %(x, y, ENEMY%("left", "right")[x % 2]))
+        else:
+            for x in range(1, 19):
+                lines.append("sprite %d %d ice"%(x, y))
+    return Level("\n".join(lines))
+
+
+def linearGetSprites(self, x, y, width, height, exclude, type_,
+                     single = True):
+    ret = []
+    self.r.left = x
+    self.r.top = y
+    self.r.width = width if width > 0 else 1
+    self.r.height = height if height > 0 else 1
+    for sprite in self.sprites():
+        if (sprite != exclude
+            and self.r.colliderect(sprite.rect)
+            and (not type_ or isinstance(sprite, type_))
+            ):
+            if single:
+                return sprite
+            ret.append(sprite)
+    if single:
+        return None
+    return ret
+
+
+def fingerprint(world):
+    h = hashlib.md5()
+    for group in (world.players, world.blocks, world.fires,
+                  world.enemies, world.world):
+        for s in group:
+            h.update(("%s %r %r %s;"%(type(s).__name__, s.x, s.y,
+                                      s._animationName)).encode())
+    return h.hexdigest()
+
+
+def run(ticks):
+    world = World(makeLevel(), False, seed = 0)
+    world.initializeSprites()
+    sprites = sum(len(g) for g in (world.blocks, world.enemies,
+                                   world.players, world.fires))
+    start = time.perf_counter()
+    for i in range(ticks):
+        world.step()
+    elapsed = time.perf_counter() - start
+    return sprites, ticks / elapsed, fingerprint(world)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-t", "--ticks", type="int", dest="ticks",
+                      default=500, help="ticks to simulate per run")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    resources = initHeadless([os.path.join(BASE_PATH, "data")])
+    resources.addLevelResources(
+        os.path.join(BASE_PATH, "data", "levels", "space", "space-01.lvl"))
+    sprites, grid, gridPrint = run(options.ticks)
+    indexed = AnimationGroup._getSprites
+    AnimationGroup._getSprites = linearGetSprites
+    try:
+        sprites, linear, linearPrint = run(options.ticks)
+    finally:
+        AnimationGroup._getSprites = indexed
+    print("sprites:        %d"%sprites)
+    print("linear scan:    %.1f ticks/sec"%linear)
+    print("spatial index:  %.1f ticks/sec"%grid)
+    print("speedup:        %.2fx"%(grid / linear))
+    print("identical:      %s"%(gridPrint == linearPrint and "yes" or "NO"))
+    if gridPrint != linearPrint:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Compares the time it takes to load the images of the game with and
+without the decoded-image cache.
+
+The resources every state adds and the resources of every level theme
+are loaded into new Resources, once without an image cache, once with
+an empty cache that is filled and written and once with the filled
+cache. All three must load the same pixels.
+
+Usage: python benchmarks/startup.py [options]
+"""
+import os, sys, time, hashlib, shutil, tempfile, warnings, io, contextlib
+import pygame
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.resources import Resources
+
+PREFIXES = ("tiles", "sprites", "samples", "fonts", "sounds")
+
+
+def findThemes(path):
+    """
+    Returns a level file of every theme directory.
+    """
+    ret = []
+    for theme in sorted(os.listdir(path)):
+        directory = os.path.join(path, theme)
+        if os.path.isdir(directory):
+            for f in sorted(os.listdir(directory)):
+                if f.endswith(".lvl"):
+                    ret.append(os.path.join(directory, f))
+                    break
+    return ret
+
+
+def digest(h, images):
+    for key, value in sorted(images.items()):
+        h.update(key.encode())
+        h.update(pygame.image.tobytes(value, "RGBA"))
+
+
+def load(imageCache):
+    """
+    Returns the seconds it took to load the images and their digest.
+    """
+    data = os.path.join(BASE_PATH, "data")
+    themes = findThemes(os.path.join(data, "levels"))
+    h = hashlib.md5()
+    start = time.perf_counter()
+    resources = Resources([data], False, False, imageCache = imageCache)
+    for prefix in PREFIXES:
+        resources.addResources(prefix)
+    elapsed = time.perf_counter() - start
+    digest(h, resources._resources)
+    for filename in themes:
+        start = time.perf_counter()
+        resources.clearLevelResources()
+        resources.addLevelResources(filename)
+        elapsed += time.perf_counter() - start
+        digest(h, resources._level)
+    return elapsed, h.hexdigest()
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-r", "--runs", type="int", dest="runs",
+                      default=5, help="runs of each, the best is reported")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.display.set_mode((800, 600))
+    results = {"none": [], "cold": [], "warm": []}
+    prints = set()
+    directory = tempfile.mkdtemp()
+    try:
+        # resources are chatty about every file they load
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(options.runs):
+                for name in ("none", "cold", "warm"):
+                    if name == "cold":
+                        for f in os.listdir(directory):
+                            os.remove(os.path.join(directory, f))
+                    elapsed, digest = load(name != "none" and directory
+                                           or None)
+                    results[name].append(elapsed)
+                    prints.add(digest)
+        size = sum(os.path.getsize(os.path.join(directory, f))
+                   for f in os.listdir(directory))
+    finally:
+        shutil.rmtree(directory)
+    best = min(results["none"])
+    print("%-12s %10s %8s"%("image cache", "startup", "speedup"))
+    for name, label in (("none", "none"), ("cold", "empty"),
+                        ("warm", "filled")):
+        elapsed = min(results[name])
+        print("%-12s %8.1fms %7.1fx"%(label, elapsed * 1000, best / elapsed))
+    print("cache size:     %.1f MB"%(size / 1048576.0))
+    identical = len(prints) == 1
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks sweeping stones through tiles and sprites against moving
+them in steps and probing for what they run into.
+
+The levels with balls are simulated headless with random moves, once
+with the stones swept and once with the stepping functions they used
+to move with patched back in. The time spent moving the stones is
+reported, with how many times a ball ended a tick inside a tile and how
+many levels broke off with an error.
+
+Then balls of rising speed are shot at a wall, an ice, a fire and an
+enemy. A ball that gets past its target without bouncing off,
+evaporating or killing it missed the target.
+
+Usage: python benchmarks/stones.py [options]
+"""
+import os, sys, time, random, warnings, io, contextlib
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+import pygame
+from optparse import OptionParser
+from magicor import sprites
+from magicor.level import Level
+from magicor.sprites import PhysicsStoneSprite
+from magicor.sprites.stones import Ball
+from magicor.world import World, initHeadless
+
+MOVES = ("left", "right", "left", "right", "up", "down", "action",
+         None, None)
+SPEEDS = (4, 12, 20, 28, 36, 44, 52)
+TARGETS = ("wall", "ice", "fire", "enemy")
+
+
+class Inputs(object):
+    """
+    Input for World.step(), pressing nothing or a random move each
+    tick.
+    """
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.next()
+
+    def next(self):
+        move = self.random.choice(MOVES)
+        for name in ("left", "right", "up", "down", "action"):
+            setattr(self, name, move == name)
+
+
+def steppedSpritesTouched(self, toTravel):
+    x0 = self.x; y0 = self.y
+    self.rect.x += self.veldir[0] * toTravel
+    self.rect.y += self.veldir[1] * toTravel
+    r = self.radius
+    minFreeTravel = toTravel
+    tl = []
+    bGenStuck = False
+    steps = int(toTravel) + 1
+    dx = toTravel / float(steps) * self.veldir[0]
+    dy = toTravel / float(steps) * self.veldir[1]
+    for (group, ignoreSubgroup, minOverlap, bStop, self_action,
+         inflict_action) in self.collisionTable:
+        for s in pygame.sprite.spritecollide(self, group, False):
+            if ignoreSubgroup is None or s.subgroup != ignoreSubgroup:
+                ww = s.width - 2. * minOverlap
+                hh = s.height - 2. * minOverlap
+                target = pygame.Rect(s.x + minOverlap, s.y + minOverlap,
+                                     ww, hh)
+                px = x0 + self.width / 2. - r
+                py = y0 + self.height / 2.0 - r
+                bBump = False
+                for i in range(0, steps):
+                    if target.colliderect(px, py, 2. * r, 2. * r):
+                        bBump = True
+                        break
+                    px += dx
+                    py += dy
+                if bBump:
+                    if i == 0 and bStop:
+                        bStuck = True
+                        bGenStuck = True
+                        freeTravel = 0
+                    else:
+                        bStuck = False
+                        freeTravel = (i - 1) / float(steps) * toTravel
+                else:
+                    bStuck = False
+                    freeTravel = toTravel
+                tl.append((freeTravel, minOverlap, bStop, bStuck, group, s,
+                           self_action, inflict_action))
+                if bStop and freeTravel < minFreeTravel:
+                    minFreeTravel = freeTravel
+    tl = [v for v in tl if v[0] <= minFreeTravel]
+    self.rect.x = x0
+    self.rect.y = y0
+    self.reindex()
+    return minFreeTravel, bGenStuck, tl
+
+
+def steppedH(self, toTravel):
+    x0 = self.x; y0 = int(self.y)
+    bOutOfScreen = False
+    bBump = False
+    nonColisionTravel = toTravel
+    x1 = x0 + self.veldir[0] * toTravel
+    if self.veldir[0] < 0:
+        if x1 + self.width < 0:
+            bOutOfScreen = True
+        elif self.level.isSolid(int(x1) / 32, y0 / 32):
+            x1 = (int(x1) / 32 + 1) * 32
+            nonColisionTravel = x0 - x1
+            self.bounceDir = [1, 0]
+            bBump = True
+    else:
+        if x1 >= self.level.width * 32:
+            bOutOfScreen = True
+        elif self.level.isSolid(int(x1 + self.width) / 32, y0 / 32):
+            x1 -= int(x1 + self.width) % 32
+            nonColisionTravel = x1 - x0
+            self.bounceDir = [-1, 0]
+            bBump = True
+    return bBump, toTravel, nonColisionTravel, bOutOfScreen
+
+
+def steppedV(self, toTravel):
+    x0 = int(self.x); y0 = self.y
+    bOutOfScreen = False
+    bBump = False
+    nonColisionTravel = toTravel
+    y1 = y0 + self.veldir[1] * toTravel
+    if self.veldir[1] < 0:
+        if y1 + self.height < 0:
+            bOutOfScreen = True
+        elif self.level.isSolid(x0 / 32, int(y1) / 32):
+            y1 = (int(y1) / 32 + 1) * 32
+            nonColisionTravel = y0 - y1
+            self.bounceDir = [0, 1]
+            bBump = True
+    else:
+        if y1 >= self.level.height * 32:
+            bOutOfScreen = True
+        elif self.level.isSolid(x0 / 32, int(y1 + self.height) / 32):
+            y1 -= int(y1 + self.height) % 32 + 1
+            nonColisionTravel = y1 - y0
+            self.bounceDir = [0, -1]
+            bBump = True
+    return bBump, toTravel, nonColisionTravel, bOutOfScreen
+
+
+def steppedDiagonal(self, toTravel):
+    x0 = self.x; y0 = self.y
+    r = self.radius - 1
+    veldir = self.veldir
+    level = self.level
+    bBump = False
+    x1 = x0 + veldir[0] * toTravel
+    y1 = y0 + veldir[1] * toTravel
+    bOutOfScreen = (x1 + self.width < 0 if veldir[0] < 0
+                    else x1 >= level.width * 32)
+    bOutOfScreen = bOutOfScreen or (y1 + self.height < 0 if veldir[1] < 0
+                                    else y1 >= level.height * 32)
+    if bOutOfScreen:
+        return bBump, toTravel, toTravel, bOutOfScreen
+    a = x0 + self.width / 2.0
+    b = y0 + self.height / 2.0
+    aa = a + r * veldir[0]
+    bb = b + r * veldir[1]
+    steps = int(toTravel) + 1
+    dx = self.fasteness / float(steps) * veldir[0]
+    dy = self.fasteness / float(steps) * veldir[1]
+    self.bounceDir = veldir
+    for i in range(0, steps):
+        aa += dx; a += dx
+        bb += dy; b += dy
+        if level.isSolid(int(aa) / 32, int(b) / 32):
+            bBump = True
+            self.bounceDir[0] = -veldir[0]
+        if level.isSolid(int(a) / 32, int(bb) / 32):
+            self.bounceDir[1] = -veldir[1]
+            bBump = True
+        if bBump:
+            break
+    if not bBump:
+        aa = (x0 + self.width / 2.0) + r * 0.7071 * veldir[0]
+        bb = (y0 + self.height / 2.0) + r * 0.7071 * veldir[1]
+        for i in range(0, steps):
+            aa += dx
+            bb += dy
+            if level.isSolid(int(aa) / 32, int(bb) / 32):
+                bBump = True
+                self.bounceDir[0] = -veldir[0]
+                self.bounceDir[1] = -veldir[1]
+            if bBump:
+                break
+    if bBump:
+        nonColisionTravel = i / float(steps) * toTravel
+    else:
+        nonColisionTravel = toTravel
+    return bBump, toTravel, nonColisionTravel, bOutOfScreen
+
+
+def step(world):
+    """
+    Lets the stones of the world move in steps the way they used to.
+    """
+    for stone in world.stones:
+        if isinstance(stone, PhysicsStoneSprite):
+            if stone.veldir[0] and stone.veldir[1]:
+                stone.move = steppedDiagonal
+            elif stone.veldir[0]:
+                stone.move = steppedH
+            elif stone.veldir[1]:
+                stone.move = steppedV
+
+
+def inside(ball, level):
+    """
+    Whether the ball overlaps a solid tile.
+    """
+    for y in range(int(ball.y) // 32, (int(ball.y) + ball.height - 1) // 32 + 1):
+        for x in range(int(ball.x) // 32,
+                       (int(ball.x) + ball.width - 1) // 32 + 1):
+            if (0 <= x < level.width and 0 <= y < level.height
+                and level.isSolid(x, y)):
+                return True
+    return False
+
+
+def timed(physics, elapsed):
+    """
+    Wraps PhysicsStoneSprite.physics(), summing the time spent in it in
+    elapsed[0].
+    """
+    def timedPhysics(stone):
+        start = time.perf_counter()
+        try:
+            physics(stone)
+        finally:
+            elapsed[0] += time.perf_counter() - start
+    return timedPhysics
+
+
+def load(resources, filename, data, stepped):
+    with contextlib.redirect_stdout(io.StringIO()):
+        resources.clearLevelResources()
+        resources.addLevelResources(filename)
+        world = World(Level(data), False, seed = 1)
+        world.initializeSprites()
+    if stepped:
+        step(world)
+    return world
+
+
+def run(resources, levels, ticks, stepped):
+    """
+    Returns the seconds spent moving the stones of the levels, the
+    stones moved, the times a ball ended a tick inside a tile it was not
+    in before and the levels broken off with an error.
+    """
+    physics = PhysicsStoneSprite.physics
+    elapsed = [0.0]
+    PhysicsStoneSprite.physics = timed(physics, elapsed)
+    touched = sprites.getSpritesTouched
+    if stepped:
+        sprites.getSpritesTouched = steppedSpritesTouched
+    moved = insideTile = errors = 0
+    try:
+        for filename, data in levels:
+            world = load(resources, filename, data, stepped)
+            inputs = Inputs(1)
+            stuck = set(b for b in world.stones if inside(b, world.level))
+            try:
+                for i in range(ticks):
+                    if world.over():
+                        break
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        world.step(inputs)
+                    inputs.next()
+                    for ball in world.stones:
+                        if isinstance(ball, Ball):
+                            moved += 1
+                            if inside(ball, world.level):
+                                if ball not in stuck:
+                                    insideTile += 1
+                                    stuck.add(ball)
+                            else:
+                                stuck.discard(ball)
+            except Exception:
+                errors += 1
+    finally:
+        PhysicsStoneSprite.physics = physics
+        sprites.getSpritesTouched = touched
+    return elapsed[0], moved, insideTile, errors
+
+
+def gauntlet(speed, target):
+    """
+    A level with a ball shot to the right at the target every other
+    row.
+    """
+    lines = ["title gauntlet", "tile 18 17 tiles/stone",
+             "sprite 18 16 player left"]
+    for row in range(1, 16, 2):
+        column = 6 + row % 4
+        if target == "wall":
+            lines.append("tile %d %d tiles/stone"%(column, row))
+        else:
+            lines.append("tile %d %d tiles/stone"%(column, row + 1))
+            lines.append("sprite %d %d %s"%(
+                column, row,
+                {"ice": "ice",
+                 "fire": "fire nofall",
+                 "enemy": "stationary-enemy up sprites/spikes "
+                 "samples/spikes 18"}[target]))
+        lines.append("sprite %d %d ball 1 0 %d"%(row % 3, row, speed))
+    return "\n".join(lines)
+
+
+def missed(resources, speed, target, stepped):
+    """
+    Returns the balls of the gauntlet that got past their targets, or
+    None if the gauntlet broke off with an error, and the balls shot.
+    """
+    world = load(resources, "gauntlet", gauntlet(speed, target), stepped)
+    touched = sprites.getSpritesTouched
+    if stepped:
+        sprites.getSpritesTouched = steppedSpritesTouched
+    balls = [b for b in world.stones if isinstance(b, Ball)]
+    past = set()
+    try:
+        for i in range(80):
+            with contextlib.redirect_stdout(io.StringIO()):
+                world.step()
+            for ball in balls:
+                column = 6 + (int(ball.y) // 32) % 4
+                if (ball.alive() and ball._animationName == "default"
+                    and ball.x > (column + 1) * 32):
+                    past.add(ball)
+    except Exception:
+        return None, len(balls)
+    finally:
+        sprites.getSpritesTouched = touched
+    return len(past), len(balls)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-t", "--ticks", type="int", dest="ticks",
+                      default=600, help="ticks to simulate per level")
+    parser.add_option("-r", "--runs", type="int", dest="runs",
+                      default=3, help="runs of each, the best is reported")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    # resources are chatty about every path they search
+    with contextlib.redirect_stdout(io.StringIO()):
+        resources = initHeadless([os.path.join(BASE_PATH, "data")])
+        levels = []
+        for path, levelInfo in resources.loadLevelData():
+            for filename, data in levelInfo:
+                if "ball" in data:
+                    levels.append((filename, data))
+    best = {}
+    results = {}
+    # the arms take turns, so they share whatever else the machine is
+    # doing
+    for i in range(options.runs):
+        for stepped in (True, False):
+            results[stepped] = run(resources, levels, options.ticks, stepped)
+            best[stepped] = min(best.get(stepped, results[stepped][0]),
+                                results[stepped][0])
+    print("%d levels with balls, %d ticks each"%(len(levels), options.ticks))
+    print("%-8s %14s %12s %8s"%("", "stones/sec", "in a tile", "errors"))
+    for name, stepped in (("stepped", True), ("swept", False)):
+        elapsed, moved, insideTile, errors = results[stepped]
+        print("%-8s %14.1f %12d %8d"%(name, moved / best[stepped],
+                                       insideTile, errors))
+    print("speedup:        %.2fx"%(best[True] / best[False]))
+    print()
+    print("balls past their target, stepped/swept")
+    print("%-8s"%"speed" + "".join("%12s"%t for t in TARGETS))
+    sweptMissed = 0
+    for speed in SPEEDS:
+        row = "%-8d"%speed
+        for target in TARGETS:
+            old, shot = missed(resources, speed, target, True)
+            new, shot = missed(resources, speed, target, False)
+            sweptMissed += new is None and shot or new
+            row += "%12s"%("%s/%s of %d"%(old is None and "err" or old,
+                                          new is None and "err" or new,
+                                          shot))
+        print(row)
+    print("swept missed:   %d"%sweptMissed)
+    if sweptMissed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Benchmarks the tile queries of the physics on the compact tile grid of
+Level against the lists of tile names it used to keep.
+
+The tiles of every shipped level are queried at the coordinates the
+blocked tests of sprites use, pixel positions divided by 32, through
+the old lists, level[x, y] and Level.isSolid(). All three must agree on
+which tiles are solid.
+
+Usage: python benchmarks/tiles.py [options]
+"""
+import os, sys, time, random, warnings
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from optparse import OptionParser
+from magicor.level import Level
+
+
+class LegacyTiles(object):
+    """
+    The tiles of a level as lists of names, queried the old way.
+    """
+
+    def __init__(self, level):
+        self.tiles = level.tiles
+
+    def __getitem__(self, v):
+        try:
+            return self.tiles[int(v[1])][int(v[0])]
+        except IndexError:
+            raise IndexError("coordinate (%d, %d) out of range"%v)
+
+
+def findLevels(path):
+    ret = []
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            if f.endswith(".lvl"):
+                ret.append(os.path.join(root, f))
+    ret.sort()
+    return ret
+
+
+def query(levels, points, solid):
+    """
+    Returns the seconds it took to query the points of every level and
+    the solid tiles found.
+    """
+    found = []
+    start = time.perf_counter()
+    for level in levels:
+        test = solid(level)
+        for x, y in points:
+            if test(x, y):
+                found.append((x, y))
+    return time.perf_counter() - start, found
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-q", "--queries", type="int", dest="queries",
+                      default=20000, help="queries per level")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    levels = []
+    for filename in findLevels(os.path.join(BASE_PATH, "data", "levels")):
+        with open(filename) as f:
+            levels.append(Level(f.read()))
+    rand = random.Random(1)
+    # sprites move 4 pixels at a time and test the pixel beside them
+    points = [((rand.randrange(0, 640, 4) + rand.choice((-1, 0, 31, 32)))
+               / 32, (rand.randrange(0, 576, 4) + rand.choice((-1, 0, 32)))
+               / 32) for i in range(options.queries)]
+    points = [(x, y) for x, y in points if 0 <= x < 20 and 0 <= y < 18]
+    results = []
+    for name, solid in (
+        ("lists", lambda level: lambda x, y, t = LegacyTiles(level): t[x, y]),
+        ("level[x, y]", lambda level: lambda x, y: level[x, y]),
+        ("isSolid", lambda level: level.isSolid)):
+        elapsed, found = query(levels, points, solid)
+        results.append((name, elapsed, found))
+    queries = len(levels) * len(points)
+    print("%-12s %14s %8s"%("tiles", "queries/sec", "speedup"))
+    for name, elapsed, found in results:
+        print("%-12s %14.0f %7.1fx"%(name, queries / elapsed,
+                                     results[0][1] / elapsed))
+    identical = all(found == results[0][2] for name, elapsed, found
+                    in results)
+    print("identical:      %s"%(identical and "yes" or "NO"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
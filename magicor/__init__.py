@@ -7,7 +7,7 @@ game itself.
 Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 (see LICENSE for more info)
 """
-import os, warnings, textwrap
+import os, random, warnings, textwrap
 
 # from pygame.locals import *
 import pygame, pygame.image, pygame.sprite,  pygame.mixer
@@ -17,6 +17,9 @@ from magicor.resources import getResources
 
 _CONFIG = None
 g_groups = {}
+# all randomness of the simulation comes from here, a World seeds it so
+# the same seed and input always play out the same way
+g_random = random.Random()
 g_printkeys = {}
 g_devflags = { "F5":False, "F6":False, "F7":False ,"F8":False }
 
@@ -101,6 +104,28 @@ class State(object):
     def run(self):
         raise NotImplementedError()
 
+    def update(self):
+        """
+        Advances the state one tick when the game runs with a fixed
+        timestep. States that draw and advance in one go simply run.
+        """
+        self.run()
+
+    def render(self, alpha):
+        """
+        Draws the state alpha (0.0 - 1.0) of the way from the previous
+        tick to the current one, as often as the display allows.
+        Nothing by default, since update() ran and drew the state.
+        """
+        pass
+
+    def updatedRects(self):
+        """
+        The areas of the screen changed by the last frame, or None
+        to update the whole screen.
+        """
+        return None
+
     def eventJoystick(self):
         pass
 
@@ -227,7 +252,13 @@ class GameEngine(object):
     resources and handles map and sprites. (everything)
     To make the code more readable (and possible more reusable), subclass
     and write events and handling somewhere else.
+
+    By default every frame runs the state once at 25 frames per second.
+    With fixed_timestep set in the config the states are instead ticked
+    tick_rate times per second while rendering at up to frame_rate
+    frames per second, see start().
     """
+    MAX_TICKS_PER_FRAME = 5
 
     def __init__(self, config = {}):
         self.byFrame = False
@@ -268,11 +299,21 @@ class GameEngine(object):
             self.config["default_tile"] = "tiles/stone"
         self.resources = getResources(paths=paths,
                                       sound=config.getBool("sound"),
-                                      music=config.getBool("music"))
+                                      music=config.getBool("music"),
+                                      manifest="%s/manifest.cache"%paths[0],
+                                      imageCache=paths[0],
+                                      levelCatalog="%s/levels.cache"%paths[0])
         self.resources.soundVol = self.config.getInt("sound_vol")
         self.resources.musicVol = self.config.getInt("music_vol")
         self.clock = pygame.time.Clock()
 
+    def updateDisplay(self, state):
+        rects = state.updatedRects()
+        if rects is None:
+            pygame.display.flip()
+        elif rects:
+            pygame.display.update(rects)
+
     def handleEvents(self, state, events):
         if events:
             for event in events:
@@ -296,6 +337,9 @@ class GameEngine(object):
                     f(event)
 
     def start(self, state):
+        if self.config.getBool("fixed_timestep"):
+            self.startFixed(state)
+            return
         self.doFrame = True
         while state:
             if self.byFrame:
@@ -304,10 +348,50 @@ class GameEngine(object):
             state.eventJoystick()
             if self.doFrame:
                 state.run()
-                pygame.display.flip()
+                self.updateDisplay(state)
             self.clock.tick(25)
             state = next(state)
 
+    def startFixed(self, state):
+        """
+        The time passed since the last frame is consumed in ticks of
+        1 / tick_rate seconds, what is left over decides how far
+        between the last two ticks the state is rendered. At most
+        MAX_TICKS_PER_FRAME ticks are run per frame so a slow machine
+        slows the game down rather than falling further and further
+        behind.
+        """
+        tickRate = self.config.getInt("tick_rate", 25)
+        if tickRate <= 0:
+            warnings.warn("invalid tick_rate %d, using 25"%tickRate)
+            tickRate = 25
+        frameRate = max(self.config.getInt("frame_rate", 60), 0)
+        tickTime = 1000.0 / tickRate
+        lag = 0.0
+        elapsed = 0
+        self.doFrame = True
+        self.clock.tick()
+        while state:
+            if self.byFrame:
+                self.doFrame = False
+            self.handleEvents(state, pygame.event.get())
+            state.eventJoystick()
+            if self.byFrame:
+                lag = self.doFrame and tickTime or 0.0
+            else:
+                lag = min(lag + elapsed, tickTime * self.MAX_TICKS_PER_FRAME)
+            while lag >= tickTime and next(state) is state:
+                state.update()
+                lag -= tickTime
+            if next(state) is state:
+                if self.byFrame:
+                    state.render(1.0)
+                else:
+                    state.render(lag / tickTime)
+                self.updateDisplay(state)
+            elapsed = self.clock.tick(frameRate)
+            state = next(state)
+
 
 class ConfigDict(dict):
 
@@ -0,0 +1,124 @@
+"""
+Texture atlases of sprite sheets.
+
+An atlas packs the sprite sheets of the game or of a level theme into a
+few large surfaces, pages, and hands out subsurfaces of the pages in
+place of the sheets. The frames of a sheet are sliced once into
+subsurfaces too, so sprites blit a frame without computing its area.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+
+import pygame
+
+class Atlas(object):
+    """
+    Sprite sheets packed into pages in rows of sheets, the tallest
+    first. Per-pixel alpha sheets and opaque sheets go to pages of
+    their own kind. Colorkeyed sheets are left out since a subsurface
+    can not keep their RLE acceleration, and so are sheets taller than
+    MAX_SHEET_HEIGHT, which are backgrounds rather than sprites.
+    """
+    PAGE_WIDTH = 2048
+    PAGE_HEIGHT = 2048
+    MAX_SHEET_HEIGHT = 128
+
+    def __init__(self):
+        self.pages = []
+        self._sheets = set()
+        self._frames = {}
+
+    def canPack(self, surface):
+        width, height = surface.get_size()
+        return bool(not surface.get_colorkey()
+                    and width <= self.PAGE_WIDTH
+                    and height <= self.MAX_SHEET_HEIGHT)
+
+    def _layout(self, images):
+        """
+        Returns the pages as (width, height, [(name, x, y)]) of the
+        images, a list of (name, surface) pairs.
+        """
+        images = sorted(images, key = lambda image: (-image[1].get_height(),
+                                                     -image[1].get_width(),
+                                                     image[0]))
+        pages = []
+        placed = []
+        x = y = rowHeight = pageWidth = 0
+        for name, surface in images:
+            width, height = surface.get_size()
+            if x + width > self.PAGE_WIDTH:
+                x = 0
+                y += rowHeight
+                rowHeight = 0
+            if y + height > self.PAGE_HEIGHT:
+                pages.append((pageWidth, y, placed))
+                placed = []
+                x = y = pageWidth = 0
+            placed.append((name, x, y))
+            x += width
+            rowHeight = max(rowHeight, height)
+            pageWidth = max(pageWidth, x)
+        if placed:
+            pages.append((pageWidth, y + rowHeight, placed))
+        return pages
+
+    def build(self, images):
+        """
+        Packs the images, a dictionary of names and surfaces, and
+        returns a dictionary of the names of the packed ones and their
+        subsurfaces in the pages. Sheets of an earlier build are
+        forgotten.
+        """
+        self.pages = []
+        self._sheets = set()
+        self._frames = {}
+        ret = {}
+        alpha = []
+        opaque = []
+        for name, surface in images.items():
+            if self.canPack(surface):
+                if surface.get_flags() & pygame.SRCALPHA:
+                    alpha.append((name, surface))
+                else:
+                    opaque.append((name, surface))
+        for kind, packed in ((pygame.SRCALPHA, alpha), (0, opaque)):
+            for width, height, placed in self._layout(packed):
+                page = pygame.Surface((width, height), kind, 32)
+                if kind:
+                    page = page.convert_alpha()
+                    page.fill((0, 0, 0, 0))
+                else:
+                    page = page.convert()
+                for name, x, y in placed:
+                    sheet = images[name]
+                    # copies the pixels as they are, alpha included
+                    page.blit(sheet, (x, y), None,
+                              kind and pygame.BLEND_RGBA_MAX or 0)
+                    ret[name] = page.subsurface((x, y) + sheet.get_size())
+                    self._sheets.add(ret[name])
+                self.pages.append(page)
+        return ret
+
+    def hasSheet(self, sheet):
+        return sheet in self._sheets
+
+    def getFrames(self, sheet, width, height):
+        """
+        Returns subsurfaces of the frames of the sheet that are
+        entirely on it, the frames lying side by side. Frames of a
+        fractional size are not sliced.
+        """
+        key = (sheet, width, height)
+        frames = self._frames.get(key)
+        if frames is None:
+            if (isinstance(width, int) and isinstance(height, int)
+                and 0 < height <= sheet.get_height() and width > 0):
+                count = sheet.get_width() // width
+            else:
+                count = 0
+            frames = tuple(sheet.subsurface((i * width, 0, width, height))
+                           for i in range(count))
+            self._frames[key] = frames
+        return frames
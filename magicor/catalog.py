@@ -0,0 +1,148 @@
+"""
+A catalog of the levels in the level directories.
+
+The catalog keeps what the level browser shows of every level, so the
+levels do not have to be parsed to be listed. With a cache file the
+catalog is kept between runs and a level file is only read again when
+its size or modification time has changed.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import os, json, hashlib, warnings
+
+from magicor.level import DataParser, loadLevel
+
+class LevelEntry(DataParser):
+    """
+    A level as listed by the catalog, the title, credits and
+    description of the level file and where it is. The id is the id
+    the Level will have. The Level is loaded by getLevel().
+    """
+    HEADER = ("title", "credits", "description")
+
+    def __init__(self, filename, theme = None, data = None):
+        DataParser.__init__(self)
+        self.filename = filename
+        self.theme = theme
+        self.mtime = None
+        self.size = None
+        self.id = None
+        self.title = None
+        self.credits = None
+        self.description = None
+        self._level = None
+        if data:
+            self.id = hashlib.md5(data.encode()).hexdigest()
+            self.parse(data)
+
+    def handle(self, command, rest, lc):
+        if command in self.HEADER:
+            setattr(self, command, rest)
+
+    def getLevel(self):
+        """
+        Returns a copy of the Level, loading the file the first time, so
+        what a World sets in it is not kept for the next play. Raises
+        IOError if it can not be read.
+        """
+        if self._level is None:
+            level = loadLevel(self.filename)
+            level.theme = self.theme
+            self._level = level
+        return self._level.copy()
+
+    def toList(self):
+        return [self.filename, self.theme, self.mtime, self.size, self.id,
+                self.title, self.credits, self.description]
+
+    @classmethod
+    def fromList(cls, values):
+        entry = cls(values[0], values[1])
+        (entry.mtime, entry.size, entry.id,
+         entry.title, entry.credits, entry.description) = values[2:]
+        return entry
+
+    def __str__(self):
+        return "<LevelEntry %s>"%self.filename
+
+
+class LevelCatalog(object):
+    """
+    The levels found by update(), by their filenames.
+    """
+    VERSION = 1
+
+    def __init__(self, cacheFile = None):
+        self.cacheFile = cacheFile
+        self._entries = {}
+        self._changed = False
+        if cacheFile:
+            self.load()
+
+    def update(self, filenames):
+        """
+        Returns the entries of the level files, (filename, theme) pairs,
+        reading only the files that are new or have changed. Levels not
+        among them are dropped from the catalog.
+        """
+        ret = []
+        entries = {}
+        for filename, theme in filenames:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            entry = self._entries.get(filename)
+            if (not entry or entry.theme != theme
+                or entry.mtime != st.st_mtime_ns or entry.size != st.st_size):
+                try:
+                    with open(filename) as f:
+                        data = f.read()
+                except (IOError, OSError, UnicodeDecodeError) as e:
+                    warnings.warn("unable to read level '%s'; %s"
+                                  %(filename, e))
+                    continue
+                if not data:
+                    continue
+                entry = LevelEntry(filename, theme, data)
+                entry.mtime = st.st_mtime_ns
+                entry.size = st.st_size
+                self._changed = True
+            entries[filename] = entry
+            ret.append(entry)
+        if len(entries) != len(self._entries):
+            self._changed = True
+        self._entries = entries
+        return ret
+
+    def load(self):
+        try:
+            with open(self.cacheFile) as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if cache.get("version") != self.VERSION:
+            return
+        for values in cache["levels"]:
+            entry = LevelEntry.fromList(values)
+            self._entries[entry.filename] = entry
+
+    def save(self):
+        """
+        Writes the cache file if a level was read or dropped since it
+        was loaded.
+        """
+        if (not self.cacheFile or not self._changed
+            or not os.path.isdir(os.path.dirname(self.cacheFile))):
+            return
+        try:
+            with open(self.cacheFile, "w") as f:
+                json.dump({"version": self.VERSION,
+                           "levels": [entry.toList()
+                                      for entry in self._entries.values()]},
+                          f)
+            self._changed = False
+        except (IOError, OSError) as e:
+            warnings.warn("unable to save level catalog '%s'; %s"
+                          %(self.cacheFile, e))
@@ -1,15 +1,32 @@
 """
 Contains level parsing and handling types.
 
+Levels can also be compiled to a binary format by compileLevel(), which
+loadLevel() loads instead of the level file while it is unchanged.
+
 Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 (see LICENSE for more info)
 """
 
-import warnings
+import os, sys, mmap, struct, array, warnings, copy
 import hashlib
 
 _SORT = ["player", "lava", "decoration", "ice", "fire", "tube"]
 
+# the compiled file of a level is its filename with this appended
+COMPILED_SUFFIX = "c"
+_MAGIC = b"MLVL"
+_VERSION = 1
+# magic, version, width, height, shadows, mtime and size of the source,
+# id, number of strings and sprites and the strings of the fields
+_HEADER = struct.Struct("<4sHHHBxqQ32sII7H")
+_SPRITE = struct.Struct("<iiHH")
+_STRING = struct.Struct("<H")
+# index of no string
+_NONE = 0xffff
+_FIELDS = ("title", "credits", "description", "hint", "difficulty",
+           "background", "music")
+
 class DataParser(object):
 
     def __init__(self, data = None):
@@ -55,6 +72,13 @@ class LevelSprite(object):
 
 
 class Level(DataParser):
+    """
+    The tiles are kept in a flat array of indexes into a table of the
+    tile names, row by row, with masks of the solid tiles of each row
+    beside it.
+    Use isSolid() and the row and region accessors for speed, level[x, y]
+    for the names and the tiles property for a read-only tuple of rows.
+    """
     DIFFICULTIES = ("easy", "normal", "hard")
 
     def __init__(self, data = None):
@@ -76,16 +100,54 @@ class Level(DataParser):
         self.background = None
         self.music = None
         self.sprites = []
-        self.tiles = []
+        self.clearTiles()
         if data:
             self.parse(data)
-        if not self.tiles:
-            self.clearTiles()
 
     def clearTiles(self):
-        self.tiles = []
-        for i in range(self.height):
-            self.tiles.append([None] * self.width)
+        # index 0 is no tile
+        self._tileNames = [None]
+        self._tileIndexes = {None: 0}
+        self._grid = array.array("H", [0]) * (self.width * self.height)
+        self._solid = [bytearray(self.width) for y in range(self.height)]
+
+    def copy(self):
+        """
+        Returns a copy of the level, setting a tile of one does not
+        change the other.
+        """
+        level = copy.copy(self)
+        level._tileNames = list(self._tileNames)
+        level._tileIndexes = dict(self._tileIndexes)
+        level._grid = array.array("H", self._grid)
+        level._solid = [bytearray(row) for row in self._solid]
+        level.sprites = list(self.sprites)
+        return level
+
+    def _intern(self, name):
+        index = self._tileIndexes.get(name)
+        if index is None:
+            index = len(self._tileNames)
+            if index > 0xffff:
+                raise ValueError("too many tile names")
+            self._tileNames.append(name)
+            self._tileIndexes[name] = index
+        return index
+
+    def _getTiles(self):
+        return tuple(tuple(self.getRow(y)) for y in range(self.height))
+
+    def _setTiles(self, rows):
+        self.clearTiles()
+        for y, row in enumerate(rows):
+            for x, name in enumerate(row):
+                if name is not None:
+                    self[x, y] = name
+
+    tiles = property(_getTiles, _setTiles, None,
+                     "The tile names as a tuple of rows, read-only. "
+                     "Set tiles with level[x, y] or all of them by "
+                     "setting a list of rows.")
 
     def handle(self, command, rest, lc):
         if command == "title":
@@ -125,8 +187,6 @@ class Level(DataParser):
         #        self.height = 18
         #        warnings.warn("invalid height, setting to %d"%self.height)
         elif command == "tile":
-            if not self.tiles:
-                self.clearTiles()
             spl = rest.split(" ", 2)
             if len(spl) == 3:
                 try:
@@ -170,17 +230,167 @@ class Level(DataParser):
         else:
             warnings.warn("unknown command '%s' on row %d"%(command, lc))
 
+    def toBinary(self, source = (0, 0)):
+        """
+        Returns the level in the compiled format, source being the
+        modification time in nanoseconds and the size of the file it was
+        compiled from. Raises ValueError if it has too many strings.
+
+        The strings are interned in a table at the end, the fields, the
+        tile grid and the sprites refer to them by index.
+        """
+        strings = []
+        table = {}
+        def intern(value):
+            if value is None:
+                return _NONE
+            if value not in table:
+                table[value] = len(strings)
+                strings.append(value)
+            return table[value]
+        fields = [intern(getattr(self, name)) for name in _FIELDS]
+        grid = array.array("H", [intern(name)
+                                 for y in range(self.height)
+                                 for name in self.getRow(y)])
+        sprites = [_SPRITE.pack(sprite.x, sprite.y, intern(sprite.name),
+                                intern(sprite.args))
+                   for sprite in self.sprites]
+        if len(strings) >= _NONE:
+            raise ValueError("too many strings in level '%s'"%self.title)
+        if sys.byteorder != "little":
+            grid.byteswap()
+        output = [_HEADER.pack(_MAGIC, _VERSION, self.width, self.height,
+                               self.shadows and 1 or 0, source[0], source[1],
+                               (self.id or "").encode(), len(strings),
+                               len(sprites), *fields),
+                  grid.tobytes()]
+        output += sprites
+        for value in strings:
+            encoded = value.encode()
+            output.append(_STRING.pack(len(encoded)))
+            output.append(encoded)
+        return b"".join(output)
+
+    @classmethod
+    def fromBinary(cls, data):
+        """
+        Returns the Level of compiled data, a buffer such as a memory
+        mapped file. Raises ValueError if it is not a compiled level.
+        """
+        with memoryview(data) as view:
+            if (len(view) < _HEADER.size
+                or _HEADER.unpack_from(view)[:2] != (_MAGIC, _VERSION)):
+                raise ValueError("not a compiled level")
+            values = _HEADER.unpack_from(view)
+            width, height, shadows = values[2:5]
+            id_, numStrings, numSprites = values[7:10]
+            offset = _HEADER.size
+            gridOffset = offset
+            offset += width * height * 2
+            spritesOffset = offset
+            offset += numSprites * _SPRITE.size
+            strings = []
+            for i in range(numStrings):
+                length, = _STRING.unpack_from(view, offset)
+                offset += _STRING.size
+                strings.append(str(view[offset:offset + length], "utf-8"))
+                offset += length
+            def lookup(index):
+                if index == _NONE:
+                    return None
+                return strings[index]
+            level = cls()
+            level.id = id_.rstrip(b"\0").decode() or None
+            level.width = width
+            level.height = height
+            level.shadows = bool(shadows)
+            for name, index in zip(_FIELDS, values[10:]):
+                setattr(level, name, lookup(index))
+            level.clearTiles()
+            with view[gridOffset:spritesOffset].cast("H") as grid:
+                if sys.byteorder != "little":
+                    grid = array.array("H", grid)
+                    grid.byteswap()
+                # the strings of the grid become the tile name table
+                tiles = dict((index, level._intern(lookup(index)))
+                             for index in sorted(set(grid)))
+                level._grid = array.array("H", [tiles[index]
+                                                for index in grid])
+            names = level._tileNames
+            solid = bytearray(names[index] and 1 or 0
+                              for index in level._grid)
+            level._solid = [solid[y * width:(y + 1) * width]
+                            for y in range(height)]
+            sprites = view[spritesOffset:spritesOffset
+                           + numSprites * _SPRITE.size]
+            level.sprites = [LevelSprite(x, y, lookup(name), lookup(args))
+                             for x, y, name, args
+                             in _SPRITE.iter_unpack(sprites)]
+            sprites.release()
+        return level
+
+    def _cell(self, x, y, v):
+        """
+        Index of the tile in the grid, negative coordinates count from
+        the end of the row or column like list indexes do.
+        """
+        width, height = self.width, self.height
+        if -width <= x < width and -height <= y < height:
+            return (y % height) * width + x % width
+        raise IndexError("coordinate (%d, %d) out of range"%v)
+
+    def isSolid(self, x, y):
+        """
+        Returns 1 if there is a tile at x, y and 0 if not. The
+        coordinates are truncated and negative ones count from the end
+        like level[x, y] does, IndexError is raised outside the level.
+        """
+        return self._solid[int(y)][int(x)]
+
+    def getRow(self, y):
+        """
+        Returns the tile names of the row as a list.
+        """
+        names = self._tileNames
+        start = self._cell(0, y, (0, y))
+        return [names[i] for i in self._grid[start:start + self.width]]
+
+    def getRegion(self, x, y, width, height):
+        """
+        Returns the tile names of the region as a list of rows, the
+        region clipped to the level.
+        """
+        names = self._tileNames
+        x0, x1 = max(x, 0), min(x + width, self.width)
+        ret = []
+        for row in range(max(y, 0), min(y + height, self.height)):
+            start = row * self.width
+            ret.append([names[i] for i in self._grid[start + x0:start + x1]])
+        return ret
+
+    def getSolidRow(self, y):
+        """
+        Returns the solid tiles of the row as a bitmask, bit x set for
+        a tile at x.
+        """
+        mask = 0
+        for x, solid in enumerate(self._solid[y]):
+            if solid:
+                mask |= 1 << x
+        return mask
+
     def __getitem__(self, v):
-        try:
-            return self.tiles[int(v[1])][int(v[0])]
-        except IndexError:
-            raise IndexError("coordinate (%d, %d) out of range"%v)
+        x = int(v[0])
+        y = int(v[1])
+        width = self.width
+        if 0 <= x < width and 0 <= y < self.height:
+            return self._tileNames[self._grid[y * width + x]]
+        return self._tileNames[self._grid[self._cell(x, y, v)]]
 
     def __setitem__(self, v, value):
-        try:
-            self.tiles[v[1]][v[0]] = value
-        except IndexError:
-            raise IndexError("coordinate (%d, %d) out of range"%v)
+        i = self._cell(v[0], v[1], v)
+        self._grid[i] = self._intern(value)
+        self._solid[i // self.width][i % self.width] = value and 1 or 0
 
     def _sortSprites(self, a, b):
         def cmp(a, b):
@@ -201,17 +411,51 @@ class Level(DataParser):
                   "music %s"%(self.music or ""),
                   "shadows %d"%(self.shadows and 1 or 0),
                   ""]
-        if self.tiles:
-            oldLen = len(output)
-            for row in range(self.height):
-                for col in range(self.width):
-                    if self[col, row]:
-                        output.append("tile %d %d %s"%
-                                      (col, row, self[col, row]))
-            if oldLen != len(output) and self.sprites:
-                output.append("")
+        oldLen = len(output)
+        for row in range(self.height):
+            for col, name in enumerate(self.getRow(row)):
+                if name:
+                    output.append("tile %d %d %s"%(col, row, name))
+        if oldLen != len(output) and self.sprites:
+            output.append("")
         if self.sprites:
             # self.sprites.sort(self._sortSprites)
             for sprite in self.sprites:
                 output.append("%s"%sprite)
         return "\n".join(output)
+
+
+def compiledFilename(filename):
+    return filename + COMPILED_SUFFIX
+
+
+def compileLevel(filename):
+    """
+    Writes the compiled file of the level file and returns its
+    filename. Raises IOError if either can not be accessed.
+    """
+    st = os.stat(filename)
+    with open(filename) as f:
+        level = Level(f.read())
+    compiled = compiledFilename(filename)
+    with open(compiled, "wb") as f:
+        f.write(level.toBinary((st.st_mtime_ns, st.st_size)))
+    return compiled
+
+
+def loadLevel(filename):
+    """
+    Returns the Level of the level file, loaded from its compiled file
+    if there is one compiled from the file as it is now.
+    """
+    st = os.stat(filename)
+    try:
+        with open(compiledFilename(filename), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                source = _HEADER.unpack_from(data)[5:7]
+                if source == (st.st_mtime_ns, st.st_size):
+                    return Level.fromBinary(data)
+    except (IOError, OSError, ValueError, struct.error):
+        pass
+    with open(filename) as f:
+        return Level(f.read())
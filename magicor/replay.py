@@ -0,0 +1,147 @@
+"""
+Recorded plays of a level.
+
+A replay holds the level, the seed the World was started with and what
+was pressed on every tick of the play. Since all randomness of the
+simulation comes from the seeded g_random, playing the replay back
+repeats the play exactly.
+
+Replays are stored as text in the same style as levels, the input is
+run-length encoded as count:buttons pairs where buttons has a bit set
+for each of Replay.BUTTONS.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import os, re, time, warnings
+
+from magicor.level import DataParser
+
+class ReplayInputs(object):
+    """
+    The buttons pressed on a tick, usable as input to World.control().
+    """
+
+    def __init__(self, buttons):
+        for i, name in enumerate(Replay.BUTTONS):
+            setattr(self, name, bool(buttons & (1 << i)))
+
+
+class Replay(DataParser):
+    VERSION = 1
+    BUTTONS = ("left", "right", "up", "down", "action")
+    RUNS_PER_LINE = 8
+
+    def __init__(self, data = None, level = None, seed = None,
+                 eyecandy = True):
+        """
+        Arguments:
+        data                Replay data to parse.
+        level               The Level the replay is recorded on.
+        seed                Seed of the World.
+        eyecandy            Whether eyecandy was on, it changes the
+                            random sequence.
+        """
+        self.version = self.VERSION
+        self.level = level and level.id
+        self.title = level and level.title
+        self.seed = seed
+        self.eyecandy = eyecandy
+        self.inputs = []
+        DataParser.__init__(self, data)
+
+    def handle(self, command, rest, lc):
+        try:
+            if command == "version":
+                self.version = int(rest)
+                if self.version > self.VERSION:
+                    warnings.warn("replay version %d is newer than %d"
+                                  %(self.version, self.VERSION))
+            elif command == "level":
+                self.level = rest
+            elif command == "title":
+                self.title = rest
+            elif command == "seed":
+                self.seed = int(rest)
+            elif command == "eyecandy":
+                self.eyecandy = rest.strip() not in ("0", "false", "no")
+            elif command == "input":
+                for run in rest.split():
+                    count, buttons = run.split(":")
+                    self.inputs.extend([int(buttons)] * int(count))
+            else:
+                warnings.warn("unknown command '%s' on row %d"%(command, lc))
+        except ValueError:
+            warnings.warn("invalid %s on row %d"%(command, lc))
+
+    def record(self, inputs):
+        """
+        Adds the buttons of inputs, None for nothing pressed, as the
+        input of the next tick.
+        """
+        buttons = 0
+        if inputs:
+            for i, name in enumerate(self.BUTTONS):
+                if getattr(inputs, name):
+                    buttons |= 1 << i
+        self.inputs.append(buttons)
+
+    def getInputs(self, tick):
+        """
+        The input of the tick, nothing pressed after the end.
+        """
+        if tick < len(self.inputs):
+            return ReplayInputs(self.inputs[tick])
+        return ReplayInputs(0)
+
+    def _runs(self):
+        runs = []
+        for buttons in self.inputs:
+            if runs and runs[-1][1] == buttons:
+                runs[-1][0] += 1
+            else:
+                runs.append([1, buttons])
+        return runs
+
+    def __str__(self):
+        output = ["version %d"%self.version,
+                  "level %s"%(self.level or ""),
+                  "title %s"%(self.title or ""),
+                  "seed %d"%self.seed,
+                  "eyecandy %d"%(self.eyecandy and 1 or 0),
+                  ""]
+        runs = ["%d:%d"%(count, buttons) for count, buttons in self._runs()]
+        for i in range(0, len(runs), self.RUNS_PER_LINE):
+            output.append("input %s"%" ".join(runs[i:i + self.RUNS_PER_LINE]))
+        return "\n".join(output) + "\n"
+
+    def save(self, path):
+        """
+        Saves the replay in the directory, named after the level and
+        the current time. Returns the filename.
+        """
+        path = os.path.expanduser(path)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        name = re.sub("[^a-z0-9]+", "-", (self.title or "level").lower())
+        filename = os.path.join(path, "%s-%s.replay"
+                                %(name.strip("-"),
+                                  time.strftime("%Y%m%d-%H%M%S")))
+        with open(filename, "w") as f:
+            f.write(str(self))
+        return filename
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            return cls(f.read())
+
+    def findLevel(self, resources):
+        """
+        Returns the filename and Level the replay was recorded on, or
+        (None, None) if it can not be found.
+        """
+        for entry in resources.loadLevelCatalog():
+            if entry.id == self.level:
+                return entry.filename, entry.getLevel()
+        return None, None
@@ -4,10 +4,14 @@ Handles a singleton resources instance.
 Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 (see LICENSE for more info)
 """
-import os
+import os, json, mmap, tempfile, warnings, weakref
+import pygame.display
 import pygame.image
+import pygame.mask
 import pygame.mixer
 from pygame.mixer import music
+from magicor.atlas import Atlas
+from magicor.catalog import LevelCatalog
 
 _RESOURCES = None
 
@@ -18,18 +22,312 @@ class ResourceNotFound(Exception):
         self.resource = resourceKey
 
 
+class Manifest(object):
+    """
+    The files and directories in the resource directories, listed once
+    so finding resources does not need to ask the filesystem.
+
+    Directories are listed as they are first looked up. With a cache
+    file the listings are kept between runs, a directory is only
+    listed again when its modification time has changed.
+    """
+    VERSION = 1
+
+    def __init__(self, cacheFile = None):
+        self.cacheFile = cacheFile
+        self._directories = {}
+        self._changed = False
+        if cacheFile:
+            self.load()
+
+    def _scan(self, path):
+        """
+        Lists the directory, entries are (name, isDirectory) pairs.
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            entries = [(entry.name, entry.is_dir())
+                       for entry in os.scandir(path)]
+        except OSError:
+            mtime = None
+            entries = []
+        self._directories[path] = (mtime, entries)
+        self._changed = True
+        return entries
+
+    def listdir(self, path):
+        """
+        Returns the (name, isDirectory) pairs of the directory in the
+        order os.listdir() gives them, none if it does not exist.
+        """
+        path = os.path.normpath(path)
+        directory = self._directories.get(path)
+        if directory is None:
+            return self._scan(path)
+        return directory[1]
+
+    def scanTree(self, path):
+        """
+        Lists the directory and all directories below it.
+        """
+        for name, isDirectory in self.listdir(path):
+            if isDirectory:
+                self.scanTree(os.path.join(path, name))
+
+    def isdir(self, path):
+        path = os.path.normpath(path)
+        self.listdir(path)
+        return self._directories[path][0] is not None
+
+    def isfile(self, filename):
+        path, name = os.path.split(os.path.normpath(filename))
+        for entry in self.listdir(path):
+            if entry[0] == name:
+                return not entry[1]
+        return False
+
+    def refresh(self, top = None):
+        """
+        Lists the directories again whose modification time changed,
+        only the directory top and the directories below it if given.
+        Returns whether any directory was listed again.
+        """
+        if top is not None:
+            top = os.path.normpath(top)
+            below = top + os.path.sep
+        changed = False
+        for path, (mtime, entries) in list(self._directories.items()):
+            if top is not None and path != top and not path.startswith(below):
+                continue
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime:
+                self._scan(path)
+                changed = True
+        return changed
+
+    def load(self):
+        try:
+            with open(self.cacheFile) as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if cache.get("version") != self.VERSION:
+            return
+        for path, (mtime, entries) in cache["directories"].items():
+            self._directories[path] = (mtime, [tuple(e) for e in entries])
+        self.refresh()
+
+    def save(self):
+        """
+        Writes the cache file if any directory was listed since it was
+        loaded.
+        """
+        if (not self.cacheFile or not self._changed
+            or not os.path.isdir(os.path.dirname(self.cacheFile))):
+            return
+        try:
+            with open(self.cacheFile, "w") as f:
+                json.dump({"version": self.VERSION,
+                           "directories": self._directories}, f)
+            self._changed = False
+        except (IOError, OSError) as e:
+            warnings.warn("unable to save resource manifest '%s'; %s"
+                          %(self.cacheFile, e))
+
+
+class ImageCache(object):
+    """
+    Decoded pixels of images kept on disk, so they do not have to be
+    decoded again the next time the game starts.
+
+    The pixels of all images are stored one after the other in
+    images.data, which is memory mapped, and images.index tells where
+    each image is and the size and modification time of the file it
+    was decoded from. An entry whose file has changed is not used and
+    is replaced by save().
+    """
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.indexFile = os.path.join(path, "images.index")
+        self.dataFile = os.path.join(path, "images.data")
+        self._entries = {}
+        self._pending = {}
+        self._data = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.indexFile) as f:
+                index = json.load(f)
+            if index.get("version") != self.VERSION:
+                return
+            with open(self.dataFile, "rb") as f:
+                if os.fstat(f.fileno()).st_size != index["size"]:
+                    return
+                if index["size"]:
+                    self._data = mmap.mmap(f.fileno(), 0,
+                                           access = mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError, KeyError):
+            return
+        self._entries = index["entries"]
+
+    def _stat(self, filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def get(self, filename):
+        """
+        Returns the cached image of the file or None if it is not
+        cached or the file changed. The image shares the memory of the
+        cache and must not be drawn on.
+        """
+        filename = os.path.abspath(filename)
+        if filename in self._pending:
+            entry, pixels = self._pending[filename]
+        else:
+            entry = self._entries.get(filename)
+            if not entry or entry[:2] != self._stat(filename):
+                return None
+            offset, length = entry[2:4]
+            pixels = memoryview(self._data)[offset:offset + length]
+        width, height, format_, colorkey = entry[4:]
+        surface = pygame.image.frombuffer(pixels, (width, height), format_)
+        if colorkey:
+            surface.set_colorkey(colorkey)
+        return surface
+
+    def put(self, filename, surface):
+        """
+        Adds the decoded image of the file, it is written by save().
+        """
+        filename = os.path.abspath(filename)
+        stat = self._stat(filename)
+        if not stat:
+            return
+        format_ = surface.get_flags() & pygame.SRCALPHA and "RGBA" or "RGB"
+        colorkey = surface.get_colorkey()
+        pixels = pygame.image.tobytes(surface, format_)
+        self._pending[filename] = (stat + [None, len(pixels)]
+                                   + list(surface.get_size())
+                                   + [format_, colorkey and colorkey[:3]],
+                                   pixels)
+
+    def _replace(self, filename, chunks):
+        """
+        Writes the chunks to a new file in the cache directory and puts
+        it in place of the file, which is never truncated while it is
+        mapped, by this game or another one.
+        """
+        fd, temporary = tempfile.mkstemp(dir = self.path, suffix = ".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(temporary, filename)
+        except (IOError, OSError):
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            raise
+
+    def save(self):
+        """
+        Writes the images added since the cache was loaded. The data
+        file is written anew when most of it would be stale entries,
+        the images are added to its end otherwise.
+        """
+        if not self._pending or not os.path.isdir(self.path):
+            return
+        entries = dict(self._entries)
+        size = self._data and len(self._data) or 0
+        live = sum(entries[k][3] for k in entries if k not in self._pending)
+        try:
+            if not self._entries or live < size // 2:
+                chunks = []
+                offset = 0
+                for filename, entry in list(entries.items()):
+                    if filename in self._pending:
+                        continue
+                    start = entry[2]
+                    chunks.append(self._data[start:start + entry[3]])
+                    entries[filename] = entry[:2] + [offset] + entry[3:]
+                    offset += entry[3]
+                rewrite = True
+            else:
+                chunks = []
+                offset = size
+                rewrite = False
+            for filename, (entry, pixels) in self._pending.items():
+                chunks.append(pixels)
+                entries[filename] = entry[:2] + [offset] + entry[3:]
+                offset += len(pixels)
+            if rewrite:
+                self._replace(self.dataFile, chunks)
+            else:
+                # what is mapped stays as it is, the file only grows
+                with open(self.dataFile, "ab") as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+            self._replace(self.indexFile,
+                          [json.dumps({"version": self.VERSION,
+                                       "size": offset,
+                                       "entries": entries}).encode()])
+        except (IOError, OSError) as e:
+            warnings.warn("unable to save image cache '%s'; %s"
+                          %(self.path, e))
+            return
+        self._pending = {}
+        self._entries = {}
+        self._data = None
+        self._load()
+
+
 class Resources(object):
     """
     Resource managing class. Caches all resources found in the
     sticky attribute. (second, optional init argument)
     Ommiting or passing None to the sticky argument means all are sticky.
+
+    The version is increased whenever resources are added or removed,
+    to let caches of loaded resources know they may be outdated.
+
+    Images are converted to the format of the display as they are
+    loaded, see convertImage(). Images loaded before the display exists
+    are converted by convertImages().
+
+    Files are looked up in a Manifest of the paths, listed when the
+    resources are created. Call rescan() to find files added later,
+    loadLevelCatalog() looks for levels added later itself.
+
+    With an image cache directory decoded images are kept in an
+    ImageCache there.
+
+    Once the display exists the sprite sheets added by addResources()
+    and addLevelResources() are packed into an Atlas, one for the game
+    and one for the level, see getFrames().
+
+    The levels are listed by loadLevelCatalog(), which keeps a
+    LevelCatalog in the level catalog file if one is given.
     """
     SUPPORTED_IMAGES = ("png", "jpg", "gif")
     SUPPORTED_MUSIC = ("ogg", "mp3", "mod", "xm")
     SUPPORTED_SOUNDS = ("wav",)
     SUPPORTED_FILES = SUPPORTED_IMAGES + SUPPORTED_MUSIC + SUPPORTED_SOUNDS
+    IMAGE_KINDS = ("opaque", "colorkey", "alpha", "unconverted")
+    # colorkeys tried for images that are either opaque or transparent
+    COLORKEYS = ((255, 0, 255), (0, 255, 0), (1, 2, 3))
 
-    def __init__(self, paths, sound, music):
+    def __init__(self, paths, sound, music, manifest = None,
+                 imageCache = None, levelCatalog = None):
         self.sound = sound
         self.joystick = None
         self.music = music
@@ -44,7 +342,25 @@ class Resources(object):
         self._resources = {}
         self._defaultTile = None
         self._level = {}
+        self._unconverted = weakref.WeakSet()
+        self._alternatives = {}
+        self.version = 0
         print("resources using paths: %s"%", ".join(paths))
+        if manifest:
+            manifest = os.path.expanduser(os.path.expandvars(manifest))
+        self.manifest = Manifest(manifest)
+        for path in self.paths:
+            self.manifest.scanTree(path)
+        self.manifest.save()
+        if imageCache:
+            imageCache = ImageCache(
+                os.path.expanduser(os.path.expandvars(imageCache)))
+        self.imageCache = imageCache
+        if levelCatalog:
+            levelCatalog = os.path.expanduser(os.path.expandvars(levelCatalog))
+        self.levelCatalog = LevelCatalog(levelCatalog)
+        self._atlas = Atlas()
+        self._levelAtlas = Atlas()
 
     def __getitem__(self, key):
         if key in self._level:
@@ -60,25 +376,155 @@ class Resources(object):
             return self._level[key]
         return default
 
+    def rescan(self):
+        """
+        Looks for files added to or removed from the paths.
+        """
+        self.manifest.refresh()
+        self.manifest.save()
+        self._alternatives = {}
+
     def findAlternative(self, path, name, suffixes):
+        key = (path, name, suffixes)
+        if key in self._alternatives:
+            return self._alternatives[key]
         name1 = name
         spl = name.split('/')
         name2 = "%s%s_%s"%(os.path.sep.join(spl[:-1]), os.path.sep, spl[-1])
+        ret = None
         for suffix in suffixes:
             fn1 = "%s%s%s.%s"%(path, os.path.sep, name1, suffix)
             fn2 = "%s%s%s.%s"%(path, os.path.sep, name2, suffix)
-            if os.path.isfile(fn1):
-                return fn1
-            elif os.path.isfile(fn2):
-                return fn2
-        return None
+            if self.manifest.isfile(fn1):
+                ret = fn1
+                break
+            elif self.manifest.isfile(fn2):
+                ret = fn2
+                break
+        self._alternatives[key] = ret
+        return ret
+
+    def convertImage(self, surface):
+        """
+        Returns the image converted to the format of the display with
+        the fastest way to blit it. Opaque images lose their alpha
+        channel, images with a colorkey or where every pixel is either
+        opaque or transparent are colorkeyed and RLE accelerated, the
+        rest keep their per-pixel alpha. Without a display the image is
+        returned as it is and left for convertImages().
+        """
+        display = pygame.display.get_surface()
+        if not display:
+            self._unconverted.add(surface)
+            return surface
+        if surface.get_colorkey():
+            ret = surface.convert()
+            ret.set_colorkey(ret.get_colorkey(), pygame.RLEACCEL)
+            return ret
+        if not surface.get_flags() & pygame.SRCALPHA:
+            return surface.convert()
+        width, height = surface.get_size()
+        opaque = pygame.mask.from_surface(surface, 254)
+        if opaque.count() == width * height:
+            return surface.convert()
+        if opaque.count() == pygame.mask.from_surface(surface, 0).count():
+            for key in self.COLORKEYS:
+                keyed = pygame.mask.from_threshold(surface, key,
+                                                   (1, 1, 1, 255))
+                if not keyed.overlap_area(opaque, (0, 0)):
+                    ret = pygame.Surface((width, height), 0, display)
+                    ret.fill(key)
+                    ret.blit(surface, (0, 0))
+                    ret.set_colorkey(key, pygame.RLEACCEL)
+                    return ret
+        return surface.convert_alpha()
+
+    def convertImages(self):
+        """
+        Converts the images loaded before the display existed.
+        """
+        if not pygame.display.get_surface():
+            return
+        for d in (self._resources, self._level):
+            for key, value in d.items():
+                if value in self._unconverted:
+                    d[key] = self.convertImage(value)
+                    self._unconverted.discard(value)
+        self.version += 1
+        self._pack(self._atlas, self._resources)
+        self._pack(self._levelAtlas, self._level)
+
+    def _pack(self, atlas, images):
+        """
+        Packs the converted images into the atlas, replacing them with
+        their subsurfaces in its pages.
+        """
+        if not pygame.display.get_surface():
+            return
+        sheets = atlas.build(
+            dict((name, image) for name, image in images.items()
+                 if isinstance(image, pygame.Surface)
+                 and image not in self._unconverted))
+        images.update(sheets)
+        self.version += 1
+        print("packed %d sheets into %d atlas pages"%(len(sheets),
+                                                     len(atlas.pages)))
+
+    def getFrames(self, image, width, height):
+        """
+        Returns the frames of width and height of a packed sheet as
+        subsurfaces, none if the sheet is not packed.
+        """
+        for atlas in (self._levelAtlas, self._atlas):
+            if atlas.hasSheet(image):
+                return atlas.getFrames(image, width, height)
+        return ()
+
+    def imageKind(self, surface):
+        """
+        How the image is blitted, one of IMAGE_KINDS.
+        """
+        if surface in self._unconverted:
+            return "unconverted"
+        elif surface.get_colorkey():
+            return "colorkey"
+        elif surface.get_flags() & pygame.SRCALPHA:
+            return "alpha"
+        return "opaque"
+
+    def getImageKinds(self):
+        """
+        Returns the number of loaded images of each kind.
+        """
+        ret = dict.fromkeys(self.IMAGE_KINDS, 0)
+        for d in (self._resources, self._level):
+            for value in d.values():
+                if isinstance(value, pygame.Surface):
+                    ret[self.imageKind(value)] += 1
+        return ret
+
+    def _decodeImage(self, filename):
+        if not self.imageCache:
+            return pygame.image.load(filename)
+        surface = self.imageCache.get(filename)
+        if not surface:
+            surface = pygame.image.load(filename)
+            self.imageCache.put(filename, surface)
+        elif not pygame.display.get_surface():
+            # it is kept as it is, and must not share the cache
+            surface = surface.copy()
+        return surface
 
     def _loadImage(self, path, name):
         fn = self.findAlternative(path, name, self.SUPPORTED_IMAGES)
         if fn:
-            return pygame.image.load(fn)
+            return self.convertImage(self._decodeImage(fn))
         return None
 
+    def saveImageCache(self):
+        if self.imageCache:
+            self.imageCache.save()
+
     def _loadMusic(self, path, name):
         if self.music:
             fn = self.findAlternative(path, name, self.SUPPORTED_MUSIC)
@@ -90,7 +536,7 @@ class Resources(object):
     def _loadSound(self, path, name):
         if self.sound:
             fn = "%s%s%s.wav"%(path, os.path.sep, name)
-            if os.path.isfile(fn):
+            if self.manifest.isfile(fn):
                 return pygame.mixer.Sound(fn)
         return None
 
@@ -104,6 +550,7 @@ class Resources(object):
         return key in self._resources
 
     def clear(self, prefix = None):
+        self.version += 1
         if prefix:
             for d in (self._resources, self._level):
                 for k in list(d.keys()):
@@ -121,11 +568,14 @@ class Resources(object):
             if ret:
                 if keep:
                     self._resources[name.replace(os.path.sep, "/")] = ret
+                    self.version += 1
                 return ret
         return None
 
     def loadImage(self, name, keep = True):
-        return self._loadSomething(name, self._loadImage, keep)
+        ret = self._loadSomething(name, self._loadImage, keep)
+        self.saveImageCache()
+        return ret
 
     def playMusic(self, name, loop=-1):
         if self._loadSomething(name, self._loadMusic, False):
@@ -149,30 +599,36 @@ class Resources(object):
             p = path
         p = p.replace("/", os.path.sep)
         print("using path %s"%p)
-        if os.path.isdir(p):
-            for f in os.listdir(p):
-                if (os.path.isfile("%s%s%s"%(p, os.path.sep, f))
-                    and f[:-4] not in ret
-                    and not f[:-4].startswith("_")):
-                    if f[:-4].startswith("_"):
-                        f = f[1:-4]
-                    if prefix:
-                        name = "%s%s%s"%(prefix, '/', f[:-4])
+        for f, isDirectory in self.manifest.listdir(p):
+            if (not isDirectory
+                and f[:-4] not in ret
+                and not f[:-4].startswith("_")):
+                if f[:-4].startswith("_"):
+                    f = f[1:-4]
+                if prefix:
+                    name = "%s%s%s"%(prefix, '/', f[:-4])
+                else:
+                    name = f[:-4]
+                if name.replace(os.path.sep, "/") in ret:
+                    continue
+                if f[-3:] in self.SUPPORTED_IMAGES:
+                    r = self._loadImage(path, name)
+                elif f[-3:] in self.SUPPORTED_SOUNDS:
+                    r = self._loadSound(path, name)
+                else:
+                    r = None
+                name = name.replace(os.path.sep, "/")
+                if r and name not in ret:
+                    ret[name] = r
+                    self.version += 1
+                    if isinstance(r, pygame.Surface):
+                        kind = " (%s)"%self.imageKind(r)
                     else:
-                        name = f[:-4]
-                    if f[-3:] in self.SUPPORTED_IMAGES:
-                        r = self._loadImage(path, name)
-                    elif f[-3:] in self.SUPPORTED_SOUNDS:
-                        r = self._loadSound(path, name)
+                        kind = ""
+                    if self._resources == ret:
+                        print("loaded resource '%s'%s"%(name, kind))
                     else:
-                        r = None
-                    name = name.replace(os.path.sep, "/")
-                    if r and name not in ret:
-                        ret[name] = r
-                        if self._resources == ret:
-                            print("loaded resource '%s'"%name)
-                        else:
-                            print("loaded level resource '%s'"%name)
+                        print("loaded level resource '%s'%s"%(name, kind))
         return ret
 
     def playSound(self, key):
@@ -181,8 +637,12 @@ class Resources(object):
             self[key].play()
 
     def addResources(self, prefix = None):
+        version = self.version
         for path in self.paths:
             self._addResources(self._resources, path, prefix)
+        self.saveImageCache()
+        if self.version != version:
+            self._pack(self._atlas, self._resources)
 
     def addLevelResources(self, filename):
         path = os.path.dirname(filename)
@@ -192,21 +652,30 @@ class Resources(object):
         self._addResources(self._level, d, pre)
         for p in ("%s%slevels"%(s, os.path.sep) for s in self.paths):
             self._addResources(self._level, p, pre)
+        self.saveImageCache()
+        self._pack(self._levelAtlas, self._level)
 
     def clearLevelResources(self):
         self._level = {}
+        self._levelAtlas = Atlas()
+        self.version += 1
+
+    def _findLevelFiles(self, path, recurse = True):
+        ret = []
+        for f, isDirectory in self.manifest.listdir(path):
+            fn = "%s%s%s"%(path, os.path.sep, f)
+            if not isDirectory and f.endswith(".lvl"):
+                ret.append(fn)
+            elif isDirectory and recurse:
+                ret += self._findLevelFiles(fn, False)
+        return ret
 
     def _loadLevelData(self, path, recurse = True):
         ret = []
-        if os.path.isdir(path):
-            for f in os.listdir(path):
-                fn = "%s%s%s"%(path, os.path.sep, f)
-                if os.path.isfile(fn) and f.endswith(".lvl"):
-                    data = self.loadData(fn)
-                    if data:
-                        ret.append((fn, data))
-                elif os.path.isdir(fn) and recurse:
-                    ret += self._loadLevelData(fn, False)
+        for fn in self._findLevelFiles(path, recurse):
+            data = self.loadData(fn)
+            if data:
+                ret.append((fn, data))
         return ret
 
     def setDefaultTile(self, surface):
@@ -224,6 +693,28 @@ class Resources(object):
                 ret.append((path, levelInfo))
         return ret
 
+    def loadLevelCatalog(self):
+        """
+        Returns a LevelEntry of every level in the order loadLevelData()
+        finds them. The theme of a level is the directory it is in, or
+        None for levels directly in a level path. The level directories
+        are looked through again for levels added or removed since they
+        were last listed.
+        """
+        filenames = []
+        for path in ("%s%slevels"%(p, os.path.sep) for p in self.paths):
+            print("searching levels in path %s"%path)
+            # levels may have been saved since, by the editor
+            if self.manifest.refresh(path):
+                self._alternatives = {}
+            for fn in self._findLevelFiles(path):
+                theme = os.path.dirname(fn[len(path):])[1:]
+                filenames.append((fn, theme or None))
+        ret = self.levelCatalog.update(filenames)
+        self.levelCatalog.save()
+        self.manifest.save()
+        return ret
+
     def getJoystick(self, num):
         if not self.joystick:
             self.joystick = pygame.joystick.Joystick(num)
@@ -238,5 +729,8 @@ def getResources(**kwargs):
     if not _RESOURCES:
         _RESOURCES = Resources(kwargs.get("paths", ["data"]),
                                kwargs.get("sound", 1),
-                               kwargs.get("music", 1))
+                               kwargs.get("music", 1),
+                               kwargs.get("manifest"),
+                               kwargs.get("imageCache"),
+                               kwargs.get("levelCatalog"))
     return _RESOURCES
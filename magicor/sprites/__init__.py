@@ -5,16 +5,50 @@ Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 (see LICENSE for more info)
 """
 
+import math
 import pygame.sprite
 from magicor.resources import getResources
-from operator import itemgetter
 from magicor import g_printkeys,g_devflags,dbgPrint
 
+# Opcodes of compiled animations, see Frame.compile().
+OP_ANIMATE = 0
+OP_IMAGE = 1
+OP_JUMP = 2
+OP_SET = 3
+OP_KILL = 4
+OP_MOVE = 5
+OP_SOUND = 6
+OP_ATTRIBUTE = 7
+OP_CALLBACK = 8
+OP_METHOD = 9
+OP_INVALID = 10
+
+def compileAnimation(frames, resources):
+    """
+    Compiles a sequence of frames into a tuple of (opcode, arg1, arg2)
+    instructions, one per frame so frame indices stay valid.
+    Anything that isn't a frame fails when the sprite reaches it.
+    """
+    program = []
+    for frame in frames:
+        if isinstance(frame, Frame):
+            program.append(frame.compile(resources))
+        else:
+            program.append((OP_INVALID, frame, None))
+    return tuple(program)
+
+
 class Frame(object):
     """
     Base type for animation frames.
     """
 
+    def compile(self, resources):
+        """
+        Returns the (opcode, arg1, arg2) instruction of the frame.
+        """
+        return (OP_INVALID, self, None)
+
     def __str__(self):
         return "<Frame>"
 
@@ -36,6 +70,12 @@ class ImageFrame(ResourceFrame):
         self.width = width
         self.height = height
 
+    def compile(self, resources):
+        image = resources[self.resource]
+        return (OP_IMAGE, image,
+                (self.width, self.height,
+                 resources.getFrames(image, self.width, self.height)))
+
     def __str__(self):
         return "<ImageFrame %dx%d>"%(self.width, self.height)
 
@@ -45,6 +85,9 @@ class SoundFrame(ResourceFrame):
     def __init__(self, sound):
         ResourceFrame.__init__(self, sound)
 
+    def compile(self, resources):
+        return (OP_SOUND, self.resource, None)
+
     def __str__(self):
         return "<SoundFrame>"
 
@@ -55,6 +98,9 @@ class JumpFrame(Frame):
         Frame.__init__(self)
         self.index = index
 
+    def compile(self, resources):
+        return (OP_JUMP, self.index, None)
+
     def __str__(self):
         return "<JumpFrame %d>"%self.index
 
@@ -66,6 +112,9 @@ class MoveFrame(Frame):
         self.x = x
         self.y = y
 
+    def compile(self, resources):
+        return (OP_MOVE, self.x, self.y)
+
     def __str__(self):
         return "<MoveFrame %.2f, %.2f>"%(self.x, self.y)
 
@@ -77,6 +126,9 @@ class AnimationFrame(Frame):
         self.frame = frame
         self.delay = delay
 
+    def compile(self, resources):
+        return (OP_ANIMATE, self.frame, self.delay)
+
     def __str__(self):
         return "<AnimationFrame %d %d>"%(self.frame, self.delay)
 
@@ -87,12 +139,18 @@ class SetFrame(Frame):
         Frame.__init__(self)
         self.animationName = animationName
 
+    def compile(self, resources):
+        return (OP_SET, self.animationName, None)
+
     def __str__(self):
         return "<SetFrame '%s'>"%self.animationName
 
 
 class KillFrame(Frame):
 
+    def compile(self, resources):
+        return (OP_KILL, None, None)
+
     def __str__(self):
         return "<KillFrame>"
 
@@ -104,11 +162,18 @@ class AttributeFrame(Frame):
         self.attr = attr
         self.value = value
 
+    def compile(self, resources):
+        return (OP_ATTRIBUTE, self.attr, self.value)
+
     def __str__(self):
         return "<AttributeFrame %s=%s>"%(self.attr, self.value)
 
 
 class CallbackFrame(Frame):
+    """
+    Calls a function, or the named method of the animated sprite.
+    Animations shared between sprites (see Animations) use names.
+    """
 
     def __init__(self, callback, *args, **kwargs):
         Frame.__init__(self)
@@ -116,22 +181,90 @@ class CallbackFrame(Frame):
         self.args = args
         self.kwargs = kwargs
 
+    def compile(self, resources):
+        if isinstance(self.callback, str):
+            return (OP_METHOD, self.callback, (self.args, self.kwargs))
+        return (OP_CALLBACK, self.callback, (self.args, self.kwargs))
+
     def __str__(self):
+        if isinstance(self.callback, str):
+            return "<CallbackFrame %s>"%self.callback
         return "<CallbackFrame %s>"%self.callback.__name__
 
 
+class Animations(dict):
+    """
+    A table of animations, mapping names to sequences of frames.
+
+    Sprite classes create their table once and share it between all
+    instances, so frames must not refer to a particular sprite. The
+    animations are compiled once for all sprites using the table, and
+    compiled again if the resources have changed since.
+    """
+
+    def __init__(self, animations = {}):
+        dict.__init__(self, animations)
+        self._programs = {}
+        self._version = None
+
+    def getProgram(self, name, resources):
+        """
+        Returns the compiled animation.
+        Raises KeyError if there is no such animation.
+        """
+        if self._version != resources.version:
+            self._programs = {}
+            self._version = resources.version
+        program = self._programs.get(name)
+        if program is None:
+            program = compileAnimation(self[name], resources)
+            self._programs[name] = program
+        return program
+
+
 class AnimationGroup(pygame.sprite.Group):
     """
     A group of animated objects.
+
+    Sprite rects are kept in a uniform grid of CELL_SIZE cells so the
+    getSprite/getSprites queries only test sprites in the touched cells.
+    Sprites notify the group through AnimatedSprite.reindex() whenever
+    their rect changes.
+
+    A group watched by an OccupancyGrid keeps the counts of the grid up
+    to date the same way, and does not update its sleeping sprites (see
+    AnimatedSprite.sleep). Sprites removed from such a group are woken
+    and stop listening to the grid (see AnimatedSprite.listen).
     """
+    CELL_SIZE = 32
 
     def __init__(self, *sprites):
+        self._cells = {}
+        self._spriteCells = {}
+        self.occupancy = None
+        self._order = {}
+        self._added = 0
         pygame.sprite.Group.__init__(self, *sprites)
         self.r = pygame.Rect((0, 0, 0, 0))
 
-    def draw(self, surface):
+    def draw(self, surface, alpha = None, sprites = None):
+        """
+        Draws all sprites, or only the given ones. With alpha, each
+        sprite is drawn that far between its saved and current position
+        (see savePositions).
+        """
+        if sprites is None:
+            sprites = self.sprites()
+        if alpha is None:
+            for sprite in sprites:
+                sprite.draw(surface)
+        else:
+            for sprite in sprites:
+                sprite.draw(surface, *sprite.interpolate(alpha))
+
+    def savePositions(self):
         for sprite in self.sprites():
-            sprite.draw(surface)
+            sprite.savePosition()
 
     def sort(self, f = None):
         if not f:
@@ -145,8 +278,77 @@ class AnimationGroup(pygame.sprite.Group):
     def remove(self, *sprites):
         pygame.sprite.Group.remove(self, *sprites)
 
+    def add_internal(self, sprite, layer = None):
+        pygame.sprite.Group.add_internal(self, sprite)
+        # insertion order, queries return sprites in the same order
+        # as iterating the group would
+        self._order[sprite] = self._added
+        self._added += 1
+        groups = getattr(sprite, "_indexGroups", None)
+        if groups is not None:
+            groups.append(self)
+        self.reindex(sprite)
+
+    def remove_internal(self, sprite):
+        pygame.sprite.Group.remove_internal(self, sprite)
+        del self._order[sprite]
+        bounds, cells = self._spriteCells.pop(sprite, (None, ()))
+        for cell in cells:
+            bucket = self._cells[cell]
+            bucket.discard(sprite)
+            if not bucket:
+                del self._cells[cell]
+        if self.occupancy is not None:
+            self.occupancy.move(self, sprite, cells, ())
+            sprite.wake()
+            if sprite.contacts is not None:
+                sprite._listenGrid.unlisten(sprite)
+        groups = getattr(sprite, "_indexGroups", None)
+        if groups is not None:
+            groups.remove(self)
+
+    def _cellRange(self, left, top, width, height):
+        size = self.CELL_SIZE
+        if width < 0:
+            left, width = left + width, -width
+        if height < 0:
+            top, height = top + height, -height
+        # the cells of the pixels of the rect, colliding rects always
+        # share a cell and empty rects do not collide
+        return (left // size, top // size,
+                (left + width - 1 if width else left) // size,
+                (top + height - 1 if height else top) // size)
+
+    def reindex(self, sprite):
+        """
+        Move the sprite to the cells covered by its current rect.
+        """
+        r = sprite.rect
+        bounds = self._cellRange(r.left, r.top, r.width, r.height)
+        old = self._spriteCells.get(sprite)
+        if old is not None:
+            if old[0] == bounds:
+                return
+            for cell in old[1]:
+                bucket = self._cells[cell]
+                bucket.discard(sprite)
+                if not bucket:
+                    del self._cells[cell]
+        x0, y0, x1, y1 = bounds
+        cells = [(cx, cy)
+                 for cx in range(x0, x1 + 1)
+                 for cy in range(y0, y1 + 1)]
+        for cell in cells:
+            bucket = self._cells.get(cell)
+            if bucket is None:
+                bucket = self._cells[cell] = set()
+            bucket.add(sprite)
+        self._spriteCells[sprite] = (bounds, cells)
+        if self.occupancy is not None:
+            self.occupancy.move(self, sprite, old and old[1] or (), cells)
+
     def getSpriteAt(self, x, y, exclude, type_ = None):
-        for sprite in self.sprites():
+        for sprite in self.spritedict:
             if (sprite != exclude
                 and sprite.x == x
                 and sprite.y == y
@@ -156,7 +358,15 @@ class AnimationGroup(pygame.sprite.Group):
         return None
 
     def count(self):
-        return len(self.sprites())
+        return len(self.spritedict)
+
+    def countSleeping(self):
+        """
+        The number of sprites not updated until woken.
+        """
+        if self.occupancy is None:
+            return 0
+        return sum(1 for s in self.spritedict if s.sleeping)
 
     def getSprite(self, x, y, width, height, exclude = None, type_ = None):
         return self._getSprites(x, y, width, height, exclude, type_)
@@ -165,21 +375,38 @@ class AnimationGroup(pygame.sprite.Group):
         return self._getSprites(x, y, width, height, exclude, type_, False)
 
     def _getSprites(self, x, y, width, height, exclude, type_, single = True):
+        r = self.r
+        r.left = x
+        r.top = y
+        r.width = width if width > 0 else 1
+        r.height = height if height > 0 else 1
+        x0, y0, x1, y1 = self._cellRange(r.left, r.top, r.width, r.height)
+        cells = self._cells
+        if x0 == x1 and y0 == y1:
+            candidates = cells.get((x0, y0), ())
+        else:
+            candidates = set()
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket:
+                        candidates.update(bucket)
+        order = self._order
         ret = []
-        self.r.left = x
-        self.r.top = y
-        self.r.width = width if width > 0 else 1
-        self.r.height = height if height > 0 else 1
-        for sprite in self.sprites():
+        best = None
+        for sprite in candidates:
             if (sprite != exclude
-                and self.r.colliderect(sprite.rect)
+                and r.colliderect(sprite.rect)
                 and (not type_ or isinstance(sprite, type_))
                 ):
                 if single:
-                    return sprite
-                ret.append(sprite)
+                    if best is None or order[sprite] < order[best]:
+                        best = sprite
+                else:
+                    ret.append(sprite)
         if single:
-            return None
+            return best
+        ret.sort(key=order.__getitem__)
         return ret
 
     def animate(self):
@@ -187,28 +414,43 @@ class AnimationGroup(pygame.sprite.Group):
             s.animate()
 
     def update(self):
-        for s in self.sprites():
-            s.update()
+        if self.occupancy is None:
+            for s in self.sprites():
+                s.update()
+        else:
+            for s in self.sprites():
+                if not s.sleeping:
+                    s.update()
 
 class AnimatedSprite(pygame.sprite.Sprite):
     """
     A sprite type that animates.
     """
+    INTERPOLATE_LIMIT = 32
+    sleeping = False
+    contacts = None
 
     def __init__(self, x, y, w, h, animations, default = None):
         """
         Arguments:
-        animations          A dictionary containing lists of animation frames.
+        animations          A dictionary containing lists of animation frames,
+                            preferably an Animations table shared by all
+                            sprites of the class.
         groups              Sequence of sprite groups.
         default             Default animation key.
         """
         pygame.sprite.Sprite.__init__(self)
+        self._indexGroups = []
         self.resources = getResources()
+        if not isinstance(animations, Animations):
+            animations = Animations(animations)
         self._animations = animations
         self.width = w
         self.height = h
         self.x = x
         self.y = y
+        self.prevX = x
+        self.prevY = y
         self._frameIndex = 0
         self.rect = pygame.Rect((x, y, w, h))
         if default:
@@ -217,8 +459,8 @@ class AnimatedSprite(pygame.sprite.Sprite):
             self.setAnimation("default")
 
     def isDone(self):
-        animation = self._animations[self._animationName]
-        return bool(not animation or self._index >= len(animation))
+        program = self._program
+        return bool(not program or self._index >= len(program))
 
     def setAnimation(self, name, bResetIndex=True):
         """
@@ -228,78 +470,174 @@ class AnimatedSprite(pygame.sprite.Sprite):
         if name not in self._animations:
             raise KeyError("no animation named '%s' for sprite %s"
                            %(name, type(self)))
+        program = self._animations.getProgram(name, self.resources)
+        self.wake()
         self._animationName = name
+        self._program = program
         self._index = 0
         self._count = 0
         self.image = None
+        self._frames = ()
         self.flags = {}
         self._srcRect = pygame.Rect((0, 0, 0, 0))
-        for frame in self._animations[name]:
-            if isinstance(frame, ImageFrame):
-                self.image = self.resources[frame.resource]
+        for op, arg1, arg2 in program:
+            if op == OP_IMAGE:
+                self.image = arg1
+                self._frames = arg2[2]
+                self._frameSize = arg2[:2]
                 self.rect.left = self.x
                 self.rect.top = self.y
-                self.rect.width = frame.width
-                self.rect.height = frame.height
+                self.rect.width, self.rect.height = arg2[:2]
                 if self.width is None:
-                    self.width = frame.width
+                    self.width = arg2[0]
                 if self.height is None:
-                    self.height = frame.height
-            elif self.image and isinstance(frame, AnimationFrame):
-                self._frameIndex = frame.frame
+                    self.height = arg2[1]
+            elif self.image and op == OP_ANIMATE:
+                self._frameIndex = arg1
                 break
+        self.reindex()
+
+    def reindex(self):
+        """
+        Tell the groups indexing this sprite that its rect has changed.
+        """
+        for group in self._indexGroups:
+            group.reindex(self)
+
+    def sleep(self, occupancy, cells = ()):
+        """
+        Stops the groups watched by the occupancy grid from updating the
+        sprite until wake() is called or a sprite of those groups enters,
+        leaves or moves in one of the cells, (x, y) tuples. Only a sprite
+        whose update would not change anything, for as long as nothing
+        happens in the cells, may sleep.
+        """
+        occupancy.sleep(self, cells)
+
+    def wake(self):
+        """
+        Lets the sprite be updated again after sleep().
+        """
+        if self.sleeping:
+            self._sleepGrid.wake(self)
+
+    def listen(self, occupancy, cells):
+        """
+        Keeps the contacts of the sprite, the sprites of the groups
+        watched by the occupancy grid in the cells, (x, y) tuples, from
+        now on. The grid calls onEnter() and onLeave() as sprites enter
+        and leave the cells, see touching(). Listening again moves the
+        contacts to the new cells.
+        Raises ValueError for cells beyond the grid.
+        """
+        occupancy.listen(self, cells)
+
+    def unlisten(self):
+        """
+        Stops keeping the contacts of the sprite after listen().
+        """
+        if self.contacts is not None:
+            self._listenGrid.unlisten(self)
+
+    def onEnter(self, group, sprite):
+        """
+        Called when a sprite of the group enters a cell listened to,
+        once for every cell.
+        """
+        contacts = self.contacts.get(group)
+        if contacts is None:
+            contacts = self.contacts[group] = {}
+        contacts[sprite] = contacts.get(sprite, 0) + 1
+
+    def onLeave(self, group, sprite):
+        """
+        Called when a sprite of the group leaves a cell listened to,
+        once for every cell.
+        """
+        contacts = self.contacts[group]
+        if contacts[sprite] > 1:
+            contacts[sprite] -= 1
+        else:
+            del contacts[sprite]
+
+    def touching(self, group):
+        """
+        The sprites of the group in the cells listened to, in the order
+        of the group, or all the sprites of the group when not listening.
+        """
+        if self.contacts is None:
+            return group.sprites()
+        contacts = self.contacts.get(group)
+        if not contacts:
+            return []
+        return sorted(contacts, key = group._order.__getitem__)
 
     def animate(self):
         """
-        Animates the sprite.
+        Animates the sprite by running its compiled animation until it
+        has to wait for the next frame.
         """
+        program = self._program
+        index = self._index
+        # most of the time the sprite just waits on its current frame
+        if index < len(program) and program[index][0] == OP_ANIMATE:
+            count = self._count
+            if count == 0:
+                self._frameIndex = program[index][1]
+            if count < program[index][2]:
+                self._count = count + 1
+                return
         name = self._animationName
-        animation = self._animations[self._animationName]
-        while self._index < len(animation):
+        while self._index < len(program):
             if name != self._animationName:
                 name = self._animationName
-                animation = self._animations[self._animationName]
-            frame = animation[self._index]
-            if isinstance(frame, ImageFrame):
-                self.image = self.resources[frame.resource]
-                self.rect.left = self.x
-                self.rect.top = self.y
-                self.rect.width = frame.width
-                self.rect.height = frame.height
-                self._index += 1
-            elif isinstance(frame, SetFrame):
-                self.setAnimation(frame.animationName)
-            elif isinstance(frame, JumpFrame):
-                self._index = frame.index
-            elif isinstance(frame, KillFrame):
-                self.kill()
-                break
-            elif isinstance(frame, AnimationFrame):
+                program = self._program
+            op, arg1, arg2 = program[self._index]
+            if op == OP_ANIMATE:
                 if self._count == 0:
-                    self._frameIndex = frame.frame
+                    self._frameIndex = arg1
                 self._count += 1
-                if self._count > frame.delay:
+                if self._count > arg2:
                     self._index += 1
                     self._count = 0
                 else:
                     break
-            elif isinstance(frame, MoveFrame):
-                self.x += frame.x
-                self.y += frame.y
+            elif op == OP_IMAGE:
+                self.image = arg1
+                self._frames = arg2[2]
+                self._frameSize = arg2[:2]
+                self.rect.left = self.x
+                self.rect.top = self.y
+                self.rect.width, self.rect.height = arg2[:2]
+                self.reindex()
+                self._index += 1
+            elif op == OP_JUMP:
+                self._index = arg1
+            elif op == OP_SET:
+                self.setAnimation(arg1)
+            elif op == OP_KILL:
+                self.kill()
+                break
+            elif op == OP_MOVE:
+                self.x += arg1
+                self.y += arg2
+                self._index += 1
+            elif op == OP_SOUND:
+                self.resources.playSound(arg1)
                 self._index += 1
-            elif isinstance(frame, SoundFrame):
-                self.resources.playSound(frame.resource)
+            elif op == OP_ATTRIBUTE:
+                if hasattr(self, arg1):
+                    setattr(self, arg1, arg2)
                 self._index += 1
-            elif isinstance(frame, AttributeFrame):
-                if hasattr(self, frame.attr):
-                    setattr(self, frame.attr, frame.value)
+            elif op == OP_METHOD:
+                getattr(self, arg1)(*arg2[0], **arg2[1])
                 self._index += 1
-            elif isinstance(frame, CallbackFrame):
-                frame.callback(*frame.args, **frame.kwargs)
+            elif op == OP_CALLBACK:
+                arg1(*arg2[0], **arg2[1])
                 self._index += 1
             else:
                 raise TypeError("invalid frame, %s in sprite %s"
-                                %(frame, self))
+                                %(arg1, self))
 
     def physics(self):
         pass
@@ -312,11 +650,58 @@ class AnimatedSprite(pygame.sprite.Sprite):
         self.rect.y = self.y
         self.rect.width = self.width
         self.rect.height = self.height
+        self.reindex()
+
+    def savePosition(self):
+        self.prevX = self.x
+        self.prevY = self.y
+
+    def interpolate(self, alpha):
+        """
+        Returns the drawing offset placing the sprite alpha (0.0 - 1.0)
+        of the way from its saved position to its current one. Moves
+        longer than INTERPOLATE_LIMIT are teleports and are not
+        interpolated.
+        """
+        dx = self.prevX - self.x
+        dy = self.prevY - self.y
+        if (abs(dx) > self.INTERPOLATE_LIMIT
+            or abs(dy) > self.INTERPOLATE_LIMIT):
+            return 0, 0
+        return dx * (1.0 - alpha), dy * (1.0 - alpha)
+
+    def drawRect(self, offsetX = 0, offsetY = 0):
+        """
+        The area draw() covers when called with the same offsets.
+        """
+        return pygame.Rect(self.x + offsetX, self.y + offsetY,
+                           self.width, self.height)
+
+    def drawRects(self, offsetX = 0, offsetY = 0):
+        """
+        The areas draw() covers when called with the same offsets, as
+        World.renderDirty() compares them.
+        """
+        return [self.drawRect(offsetX, offsetY)]
+
+    def drawState(self):
+        """
+        Anything besides the image, frame and drawRects() that changes
+        what draw() puts on the surface.
+        """
+        return None
 
     def draw(self, surface, offsetX = 0, offsetY = 0):
         """
         Draw the sprite using animation specs.
         """
+        frames = self._frames
+        index = self._frameIndex
+        # the frames sliced in the atlas, if it is a whole frame
+        if (type(index) is int and 0 <= index < len(frames)
+            and self._frameSize == (self.width, self.height)):
+            surface.blit(frames[index], (self.x + offsetX, self.y + offsetY))
+            return
         surface.blit(self.image,
                      (self.x + offsetX, self.y + offsetY),
                      (self._frameIndex * self.width,
@@ -398,10 +783,25 @@ class PhysicsSprite(AnimatedSprite):
                     self.x -= 4
                 self.moving += 1
 
+    def _occupied(self, x, y, width, height):
+        """
+        Asks the occupancy grid of the blocks, if any, whether a tile or
+        block is in the way in the area. Returns None if the grid does
+        not answer and the tiles and blocks have to be tested.
+        """
+        occupancy = self.blocksGroup.occupancy
+        if occupancy is None:
+            return None
+        return occupancy.test(self.blocksGroup, x, y, width, height, self)
+
     def blockedLeft(self):
         x, y = (self.x - 1) / 32, self.y / 32
-        if (self.x <= 0
-            or self.level[x, y]
+        if self.x <= 0:
+            return True
+        blocked = self._occupied(self.x - 1, self.y, 0, self.height)
+        if blocked is not None:
+            return blocked
+        if (self.level.isSolid(x, y)
             or self.blocksGroup.getSprite(self.x - 1,
                                           self.y,
                                           0,
@@ -413,8 +813,12 @@ class PhysicsSprite(AnimatedSprite):
 
     def blockedRight(self):
         x, y = (self.x + self.width) / 32, self.y / 32
-        if (self.x + self.width >= self.level.width * 32
-            or self.level[x, y]
+        if self.x + self.width >= self.level.width * 32:
+            return True
+        blocked = self._occupied(self.x + self.width, self.y, 0, self.height)
+        if blocked is not None:
+            return blocked
+        if (self.level.isSolid(x, y)
             or self.blocksGroup.getSprite(self.x + self.width,
                                           self.y, 0, self.height,
                                           self)
@@ -424,8 +828,12 @@ class PhysicsSprite(AnimatedSprite):
 
     def blockedLeftAbove(self):
         x, y = (self.x - 1) / 32, (self.y - 1) / 32
-        if (self.x <= 0
-            or self.level[x, y]
+        if self.x <= 0:
+            return True
+        blocked = self._occupied(self.x - 1, self.y - 1, 0, 0)
+        if blocked is not None:
+            return blocked
+        if (self.level.isSolid(x, y)
             or self.blocksGroup.getSprite(self.x - 1, self.y - 1,
                                           0, 0, self)
             ):
@@ -434,8 +842,12 @@ class PhysicsSprite(AnimatedSprite):
 
     def blockedRightAbove(self):
         x, y = (self.x + self.width) / 32, (self.y - 1) / 32
-        if (self.x + self.width >= self.level.width * 32
-            or self.level[x, y]
+        if self.x + self.width >= self.level.width * 32:
+            return True
+        blocked = self._occupied(self.x + self.width, self.y - 1, 0, 0)
+        if blocked is not None:
+            return blocked
+        if (self.level.isSolid(x, y)
             or self.blocksGroup.getSprite(self.x + self.width,
                                           self.y - 1, 0, 0, self)
             ):
@@ -447,9 +859,12 @@ class PhysicsSprite(AnimatedSprite):
         xr = (self.x + self.width - 1) / 32
         if (xr < 0 or xr > 20):
             return True
-        elif (y < self.level.height
-            and (self.level[x, y]
-                 or self.level[xr, y]
+        blocked = self._occupied(self.x, self.y + self.height, self.width, 0)
+        if blocked is not None:
+            return blocked
+        if (y < self.level.height
+            and (self.level.isSolid(x, y)
+                 or self.level.isSolid(xr, y)
                  or self.blocksGroup.getSprite(self.x,
                                                self.y + self.height,
                                                self.width, 0, self)
@@ -461,10 +876,15 @@ class PhysicsSprite(AnimatedSprite):
     def blockedAbove(self):
         x, y = self.x / 32, (self.y - 1) / 32
         xr = (self.x + self.width - 1) / 32
-        if (xr < 0 or xr > 20 or self.level[xr, y]):
+        if (xr < 0 or xr > 20):
+            return True
+        blocked = self._occupied(self.x, self.y - 1, self.width, 0)
+        if blocked is not None:
+            return blocked
+        if self.level.isSolid(xr, y):
             return True
         elif (y >= 0
-              and (self.level[x, y]
+              and (self.level.isSolid(x, y)
                    or self.blocksGroup.getSprite(self.x,
                                                  self.y - 1,
                                                  self.width, 0, self)
@@ -475,102 +895,193 @@ class PhysicsSprite(AnimatedSprite):
 
     def blockedRightBelow(self):
         x, y = (self.x + self.width) / 32, (self.y + self.height) / 32
-        if (y < self.level.height
-            and (self.x + self.width >= self.level.width * 32
-                 or x > 20
-                 or self.level[x, y]
-                 or self.blocksGroup.getSprite(self.x + self.width,
-                                               self.y + self.height,
-                                               0, 0, self)
-                 )
+        if y >= self.level.height:
+            return False
+        if self.x + self.width >= self.level.width * 32 or x > 20:
+            return True
+        blocked = self._occupied(self.x + self.width, self.y + self.height,
+                                 0, 0)
+        if blocked is not None:
+            return blocked
+        if (self.level.isSolid(x, y)
+            or self.blocksGroup.getSprite(self.x + self.width,
+                                          self.y + self.height,
+                                          0, 0, self)
             ):
             return True
         return False
 
     def blockedLeftBelow(self):
         x, y = (self.x - 1) / 32, (self.y + self.height) / 32
-        if (y < self.level.height
-            and (self.x <= 0
-                 or x < 0
-                 or self.level[x, y]
-                 or self.blocksGroup.getSprite(self.x - 1,
-                                               self.y + self.height,
-                                               0, 0, self)
-                 )
+        if y >= self.level.height:
+            return False
+        if self.x <= 0 or x < 0:
+            return True
+        blocked = self._occupied(self.x - 1, self.y + self.height, 0, 0)
+        if blocked is not None:
+            return blocked
+        if (self.level.isSolid(x, y)
+            or self.blocksGroup.getSprite(self.x - 1,
+                                          self.y + self.height,
+                                          0, 0, self)
             ):
             return True
         return False
 
 ##-> support functions for PhysicsStoneSprite
 
+# Stones are swept: instead of moving them in steps and probing for what
+# they run into, the travel to the first tile and to every sprite in
+# their way is worked out along the whole way they go in a tick, so
+# nothing is missed however fast and small the stones are.
+
+def sweepBox(x, y, width, height, dx, dy, target):
+    """
+    Sweeps the box along (dx, dy) past the target, an (x, y, width,
+    height) tuple, and returns the travel at which they start and stop
+    overlapping as (enter, leave), travel 1 moving the box by (dx, dy).
+    An enter below 0 means they overlap where the box is. None is
+    returned if they never overlap. Boxes only touching do not overlap,
+    as Rect.colliderect() takes it.
+    """
+    tx, ty, tw, th = target
+    if tw <= 0 or th <= 0:
+        return None
+    enter = float("-inf")
+    leave = float("inf")
+    for p, size, d, q, qsize in ((x, width, dx, tx, tw),
+                                 (y, height, dy, ty, th)):
+        if d:
+            t0 = (q - p - size) / float(d)
+            t1 = (q + qsize - p) / float(d)
+            if t0 > t1:
+                t0, t1 = t1, t0
+            if t0 > enter:
+                enter = t0
+            if t1 < leave:
+                leave = t1
+        elif p >= q + qsize or p + size <= q:
+            return None
+    if enter >= leave:
+        return None
+    return enter, leave
+
+def _solidTiles(level, x0, y0, x1, y1):
+    """
+    Whether a tile of the cells from x0, y0 to x1, y1 is solid, cells
+    beyond the level are not.
+    """
+    for y in range(max(y0, 0), min(y1, level.height - 1) + 1):
+        for x in range(max(x0, 0), min(x1, level.width - 1) + 1):
+            if level.isSolid(x, y):
+                return True
+    return False
+
+def _firstCrossing(p, size, d, cell):
+    """
+    The cell the leading edge of the span p, p + size moving by d enters
+    next and the travel to it.
+    """
+    if d > 0:
+        c = int(math.ceil((p + size) / float(cell)))
+        return c, (c * cell - p - size) / float(d)
+    c = int(math.floor(p / float(cell))) - 1
+    return c, (p - (c + 1) * cell) / float(-d)
+
+def sweepTiles(level, x, y, width, height, dx, dy, toTravel):
+    """
+    Sweeps the box along (dx, dy) through the tiles of the level, a cell
+    at a time as its leading edges cross the lines of the grid, and
+    returns the travel to the first solid tile it runs into, with
+    whether it runs into it with its side and with its top or bottom:
+    (travel, hitX, hitY). A box running into the corner of a tile hits
+    with both. Tiles the box overlaps where it is and tiles beyond the
+    level are not run into. None is returned if it travels toTravel
+    without running into a tile.
+    """
+    size = 32
+    inf = float("inf")
+    cx, tx = dx and _firstCrossing(x, width, dx, size) or (None, inf)
+    cy, ty = dy and _firstCrossing(y, height, dy, size) or (None, inf)
+    while True:
+        t = min(tx, ty)
+        if t >= toTravel:
+            return None
+        # the cells of the box along the other axis where it is at t
+        hitX = hitY = False
+        if tx == t:
+            top = y + dy * t
+            hitX = _solidTiles(level, cx, int(math.floor(top / size)),
+                               cx, int(math.ceil((top + height) / size)) - 1)
+        if ty == t:
+            left = x + dx * t
+            hitY = _solidTiles(level, int(math.floor(left / size)), cy,
+                               int(math.ceil((left + width) / size)) - 1, cy)
+        if tx == ty and not (hitX or hitY):
+            hitX = hitY = _solidTiles(level, cx, cy, cx, cy)
+        if hitX or hitY:
+            return t, hitX, hitY
+        if tx == t:
+            cx += dx > 0 and 1 or -1
+            tx += size / float(abs(dx))
+        if ty == t:
+            cy += dy > 0 and 1 or -1
+            ty += size / float(abs(dy))
+
 # bStop signals the cases where the sprite position must be updated to the last
 #point where colision doenst occur; alternatively
 # bNonBlockingInteraction = not bStop
 def getSpritesTouched( self,toTravel ):
-    #move the sprite to the tentative position; if no colision: done, else
-    #for each sprite do: move self from initial position to tentative position in
-    #steps of one, when colision detected freeTravel can be calc. The min free travel
-    #will be the final free travel ( counting only the sprites with bStop = True )
-    #if both sprites are small and fasteness is not small collision
-    #can be missed
-    x0=self.x; y0=self.y
-    #q: we need the pygame sprite moved, this really do it? Y. remember to
-    #restore prior to return
-    self.rect.x += self.veldir[0]*toTravel
-    self.rect.y += self.veldir[1]*toTravel
-    r=self.radius
+    """
+    Sweeps the stone along veldir for toTravel against the sprites of its
+    collisionTable, each shrunk by its minOverlap on every side, and
+    returns (minFreeTravel, bGenStuck, tl). minFreeTravel is the travel
+    to the first sprite stopping the stone (bStop), the others are
+    passed through. tl are the sprites touched up to there as
+    (freeTravel, minOverlap, bStop, bStuck, group, sprite, self_action,
+    inflict_action) tuples. A stone already overlapping a sprite
+    stopping it is stuck and does not travel.
+    """
+    r = self.radius
+    dx, dy = self.veldir
+    px = self.x + self.width / 2. - r
+    py = self.y + self.height / 2. - r
+    px1 = px + dx * toTravel
+    py1 = py + dy * toTravel
+    # the area the stone sweeps, a pixel more for the rounding of rects
+    left = int(math.floor(min(px, px1))) - 1
+    top = int(math.floor(min(py, py1))) - 1
+    right = int(math.ceil(max(px, px1) + 2. * r)) + 1
+    bottom = int(math.ceil(max(py, py1) + 2. * r)) + 1
     minFreeTravel = toTravel
-    tl=[]
+    tl = []
     bGenStuck = False
-    steps=int(toTravel)+1
-    dbgPrint( 'sb', g_devflags['F5'], "@@in spriteTouch - tryMove=",toTravel,"  steps=",steps)
-    dx=toTravel/float(steps)*self.veldir[0]
-    dy=toTravel/float(steps)*self.veldir[1]
+    dbgPrint( 'sb', g_devflags['F5'], "@@in spriteTouch - tryMove=",toTravel)
     for group,ignoreSubgroup, minOverlap,bStop, self_action, inflict_action in self.collisionTable:
-        for s in pygame.sprite.spritecollide(self, group, False):
-            if ((ignoreSubgroup is None) or
-                (ignoreSubgroup is not None and s.subgroup!=ignoreSubgroup)
-               ):
-                dbgPrint( 'sb', g_devflags['F5'], "@@@ spriteTouched x,y,width,height",s.x,s.y,s.width,s.height)
-                dbgPrint( 'sb', g_devflags['F5'], "@@@ sprite   Ball x,y,width,height",x0,y0,self.width,self.height)
-                dbgPrint( 'sb', g_devflags['F5'], "@@@   moved  Ball x,y", self.rect.x,self.rect.y)
-                ww=s.width-2.*minOverlap; hh=s.height-2.*minOverlap
-                target=pygame.Rect(s.x+minOverlap,s.y+minOverlap,ww,hh)
-                #####-> must be from the initial position
-                px=x0+self.width/2.-r   ; py=y0+self.height/2.0-r
-                bBump = False
-                for i in range(0,steps):
-                    dbgPrint( 'sb', g_devflags['F5'], "          probe left,right:",px,px+2*r)
-                    if target.colliderect( px,py,2.*r,2.*r ):
-                        bBump=True
-                        break
-                    px+=dx
-                    py+=dy
-                dbgPrint( 'sb', g_devflags['F5'], "bBump=",bBump,"  i=",i)
-                if bBump:
-                    if i==0 and bStop:
-                        bStuck = True
-                        bGenStuck = True
-                        freeTravel = 0
-                        overshot = toTravel
-                    else:
-                        bStuck = False
-                        freeTravel = (i-1)/float(steps)*toTravel
-                        overshot = toTravel - freeTravel
-                else:
-                    bStuck = False
-                    freeTravel = toTravel
-                    overshot = 0
-                dbgPrint( 'sb', g_devflags['F5'], "overshot",overshot)
-                tl.append( ( freeTravel, minOverlap, bStop,bStuck,
-                             group, s,
-                             self_action, inflict_action) )
-                if bStop and freeTravel<minFreeTravel:
-                    minFreeTravel=freeTravel
-    get0=itemgetter(0) #to acces member 0 of tuple without unpacking
-    tl = [ v for v in tl if get0(v)<=minFreeTravel ]
-    self.rect.x = x0
-    self.rect.y = y0
+        for s in group.getSprites(left, top, right - left, bottom - top,
+                                  self):
+            if ignoreSubgroup is not None and s.subgroup == ignoreSubgroup:
+                continue
+            hit = sweepBox(px, py, 2. * r, 2. * r, dx, dy,
+                           (s.x + minOverlap, s.y + minOverlap,
+                            s.width - 2. * minOverlap,
+                            s.height - 2. * minOverlap))
+            if hit is None or hit[0] >= toTravel or hit[1] <= 0:
+                continue
+            dbgPrint( 'sb', g_devflags['F5'], "@@@ spriteTouched x,y,width,height",s.x,s.y,s.width,s.height,"  at",hit[0])
+            if hit[0] < 0:
+                freeTravel = 0
+                bStuck = bStop
+                bGenStuck = bGenStuck or bStuck
+            else:
+                freeTravel = hit[0]
+                bStuck = False
+            tl.append( ( freeTravel, minOverlap, bStop,bStuck,
+                         group, s,
+                         self_action, inflict_action) )
+            if bStop and freeTravel<minFreeTravel:
+                minFreeTravel=freeTravel
+    tl = [ v for v in tl if v[0]<=minFreeTravel ]
     return minFreeTravel, bGenStuck, tl
 
 def collide_bounce(self,toTravel): ## to chek: maybe a dummy spriteTofollow is needed
@@ -585,23 +1096,19 @@ def collide_bounce(self,toTravel): ## to chek: maybe a dummy spriteTofollow is n
     return toTravel
 
 #stick is a variant of bounce when the stone loose al velocity
-def collide_stick(self, bounceDir, toTravel, spriteToFollow=None):
-    ## NOTE: probably wrong, never tested nor updated. Consider as placeholder.
+def collide_stick(self, toTravel, spriteToFollow=None):
     #maybe more work is needed when collisions with sprite and self is
     #following another sprite. Or we need an 'scrap' sister function that will be
     #the OnCollision when sprite is atached to a sprite.
     #if there is a timed event after stick , we need to add code to track this.
-    self.veldir = bounceDir
-    toTravel = 0
     self.fasteness = 0
+    self.dvy = 0.
     if spriteToFollow is not None:
         self.followMe = spriteToFollow
-    if self._animations.has_key["stick"]: ## lava can have more than 1 stick
+    if "stick" in self._animations: ## lava can have more than 1 stick
         #sequence: born, stick to world, loose stone
-        self.setAnimation["stick"]
-    elif self._animationName != "default":
-        self.setAnimationName = "default"
-    return toTravel
+        self.setAnimation("stick")
+    return 0
 
 def mov_0(self):
     # NOTE: untested and unupdated. Consider a placeholder
@@ -624,150 +1131,30 @@ def mov_0(self):
 
 
 
-def mov_h(self,toTravel):
-    x0=self.x;y0=int(self.y)
-    r=self.radius
-    bOutOfScreen = False
-    bBump = False
-    nonColisionTravel = toTravel
-    x1=x0+self.veldir[0]*toTravel
-    if self.veldir[0]<0:
-        if x1+self.width<0:
-            bOutOfScreen = True
-        elif self.level[int(x1)/32,y0/32]:
-                #world colision
-                x1 = (int(x1)/32+1)*32
-                nonColisionTravel = x0-x1
-                self.bounceDir = [1,0]
-                bBump = True
-        else:
-            pass
-    else:
-        if x1>=self.level.width*32:
-            bOutOfScreen = True
-        elif self.level[int(x1+self.width)/32,y0/32]:
-                #world colision
-                excess=int(x1+self.width)%32 #+1 seems correct but looks worse
-                x1 -= excess
-                nonColisionTravel = x1-x0
-                self.bounceDir = [-1,0]
-                bBump = True
-        else:
-            pass
-    return bBump, toTravel, nonColisionTravel, bOutOfScreen
-
-def mov_v(self,toTravel):
-    x0=int(self.x);y0=self.y
-    r=self.radius
-    bOutOfScreen = False
-    bBump = False
-    nonColisionTravel = toTravel
-    y1=y0+self.veldir[1]*toTravel
-    if self.veldir[1]<0:
-        if y1+self.height<0:
-            bOutOfScreen = True
-        elif self.level[x0/32,int(y1)/32]:
-                #world colision
-                y1 = (int(y1)/32+1)*32
-                nonColisionTravel = y0-y1
-                self.bounceDir = [0,1]
-                bBump = True
-        else:
-            pass
-    else:
-        if y1>=self.level.height*32:
-            bOutOfScreen = True
-        elif self.level[x0/32,int(y1+self.height)/32]:
-                #world colision
-                excess = int(y1+self.height)%32+1
-                y1 -= excess
-                nonColisionTravel = y1-y0
-                self.bounceDir = [0,-1]
-                bBump = True
-        else:
-            pass
-    return bBump, toTravel, nonColisionTravel, bOutOfScreen
-
-
-def mov_diagonal(self,toTravel):
-    #asume fasteness <32
-    x0=self.x;y0=self.y
-    r=self.radius-1
+def mov_sweep(self,toTravel):
+    """
+    Moves the stone along veldir for toTravel through the tiles of the
+    level, returns (bBump, toTravel, nonColisionTravel, bOutOfScreen).
+    On a bump nonColisionTravel is the travel to the tile and bounceDir
+    is veldir turned back on the sides that ran into it.
+    """
     veldir = self.veldir
     level = self.level
-    bOutOfScreen = False
-    bBump = False
-    nonColisionTravel = toTravel
-    #tentative next pos
-    x1=x0+veldir[0]*toTravel
-    y1=y0+veldir[1]*toTravel
-    #check out of screen
-    if veldir[0]<0:
-        if x1+self.width<0:
-            bOutOfScreen = True
-    else:
-        if x1>=self.level.width*32:
-            bOutOfScreen = True
-    if veldir[1]<0:
-        if y1+self.height<0:
-            bOutOfScreen = True
-    else:
-        if y1>=self.level.height*32:
-            bOutOfScreen = True
-    if bOutOfScreen:
-        return bBump, toTravel, toTravel, bOutOfScreen
-
-    #test colision by checking  the posible colisions of three points
-    #if a,b center of stone,
-    #the case test are:
-    #    (a,b)+r*cos(45)*veldir
-    #    (a,b)+r*(veldir[0],0)
-    #    (a,b)+r*(0,veldir[1])
-    #and we need to test if colisions happens when moving
-    #dt*fasteness*veldir
-    a=x0+self.width/2.0
-    b=y0+self.height/2.0
-
-    aa=a+r*veldir[0]
-    bb=b+r*veldir[1]
-
-    steps = int(toTravel)+1;
-    dx=self.fasteness/float(steps)*veldir[0]
-    dy=self.fasteness/float(steps)*veldir[1]
-
-    self.bounceDir = veldir
-    for i in range(0,steps):
-        aa += dx; a += dx
-        bb += dy; b += dy
-        #note: aa and bb seems the correct but with veldir >0 bounces prematurelly
-        #with (aa-1) and (bb-1) looks better, albeit not perfect.
-        if level[int(aa)/32,int(b)/32]:
-            bBump=True
-            self.bounceDir[0]=-veldir[0]
-        if level[int(a)/32,int(bb)/32]:
-            self.bounceDir[1]=-veldir[1]
-            bBump = True
-        if bBump:
-            break
-
-    if not bBump:
-        aa=(x0+self.width/2.0)+r*0.7071*veldir[0]
-        bb=(y0+self.height/2.0)+r*0.7071*veldir[1]
-        for i in range(0,steps):
-            aa += dx
-            bb += dy
-            if level[int(aa)/32,int(bb)/32]:
-                bBump=True
-                self.bounceDir[0]=-veldir[0]
-                self.bounceDir[1]=-veldir[1]
-            if bBump:
-                break
-    if bBump:
-        nonColisionTravel = i/float(steps)*toTravel
-    else:
-        nonColisionTravel = toTravel
-
-    return bBump, toTravel, nonColisionTravel, bOutOfScreen
+    hit = sweepTiles(level, self.x, self.y, self.width, self.height,
+                     veldir[0], veldir[1], toTravel)
+    if hit is not None:
+        nonColisionTravel, hitX, hitY = hit
+        self.bounceDir = [hitX and -veldir[0] or veldir[0],
+                          hitY and -veldir[1] or veldir[1]]
+        return True, toTravel, nonColisionTravel, False
+    x1 = self.x + veldir[0] * toTravel
+    y1 = self.y + veldir[1] * toTravel
+    bOutOfScreen = (x1 + self.width < 0 or x1 >= level.width * 32
+                    or y1 + self.height < 0 or y1 >= level.height * 32)
+    return False, toTravel, toTravel, bOutOfScreen
+
+# stones moving straight and diagonally are swept alike
+mov_h = mov_v = mov_diagonal = mov_sweep
 
 def calcSpriteBounceDir( ts , s ):
     """ts sprite to bounce
@@ -853,6 +1240,7 @@ class PhysicsStoneSprite(AnimatedSprite):
         self.tubed = False
         self.falling = False
         self.bounceDir = None
+        self.followMe = None
 
     def hack_info_vel(self): #must be NOP.
         pass
@@ -881,6 +1269,7 @@ class PhysicsStoneSprite(AnimatedSprite):
             y1 = y0 + maxTravel*self.veldir[1]
             self.x = x1; self.y=y1
             self.rect.x=x1; self.rect.y=y1
+            self.reindex()
             #update toTravel, and fasteness if grav
             if not dvy:
                 toTravel -= maxTravel
@@ -982,6 +1371,8 @@ class PhysicsStoneSprite(AnimatedSprite):
 
                     toTravel = collide_bounce(self,toTravel)
                     dbgPrint( 'sb', g_devflags['F5'],"   after bounce toTravel=",toTravel)
+                elif self_action == "stick":
+                    toTravel = collide_stick(self, toTravel, spriteTouched)
 ### note: maybe the else must catch self_action=='atach'
                 else:
                     self.doAction(self_action)
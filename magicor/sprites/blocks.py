@@ -7,18 +7,96 @@ Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 import random
 
 from magicor.sprites import *
-from magicor import g_groups
+from magicor.sprites.particles import ParticleType, emit
+from magicor import g_groups, g_random
 
+# rumbling is purely visual and drawn at display rate, it must not
+# disturb the random sequence of the simulation
+_rumble = random.Random()
 
 class BlocksGroup(AnimationGroup):
     """
     A group of ices used to synchronize animation.
+
+    Ices at rest sleep (see Ice.restingCells) and are not updated until
+    something happens around them.
+
+    While the group updates it remembers which ice holds up each ice of
+    a connected chain, in either direction, so a chain is walked once
+    rather than once for every ice in it. When an ice moves, is
+    connected or disconnected, or joins or leaves the group, only what
+    was remembered walking past it, or past the ices standing where it
+    was and is, is forgotten (see forgetSupports).
     """
     SHINE_INTERVAL = 50
 
     def __init__(self, *sprites):
+        # (ice, direction) -> the ice found walking from it that way
+        self._supports = None
+        # ice -> the (ice, direction) remembered by walking past it
+        self._walked = None
+        # (ice, direction) -> the (ice, direction) found through it
+        self._through = None
         AnimationGroup.__init__(self, *sprites)
-        self.shine = self.SHINE_INTERVAL + random.randint(0, 200)
+        self.shine = self.SHINE_INTERVAL + g_random.randint(0, 200)
+
+    def add_internal(self, sprite, layer = None):
+        AnimationGroup.add_internal(self, sprite, layer)
+        self.forgetSupportsAt(*sprite.rect)
+
+    def remove_internal(self, sprite):
+        AnimationGroup.remove_internal(self, sprite)
+        self.forgetSupports(sprite)
+        self.forgetSupportsAt(*sprite.rect)
+
+    def rememberSupport(self, path, direction, found, through = None):
+        """
+        Remembers that walking the chain in the direction from every ice
+        of the path finds the ice found, each ice of the path walking on
+        to the next and the last to the (ice, direction) through, if it
+        stopped at one remembered already.
+        """
+        supports = self._supports
+        walked = self._walked
+        after = through
+        for block in reversed(path):
+            key = (block, direction)
+            supports[key] = found
+            walked.setdefault(block, []).append(key)
+            if after is not None:
+                self._through.setdefault(after, []).append(key)
+            after = key
+
+    def forgetSupports(self, *blocks):
+        """
+        Forgets what was remembered walking past the blocks, and what
+        was found through that, all of it without blocks.
+        """
+        supports = self._supports
+        if not supports:
+            return
+        if not blocks:
+            supports.clear()
+            self._walked.clear()
+            self._through.clear()
+            return
+        keys = []
+        for block in blocks:
+            keys.extend(self._walked.pop(block, ()))
+        while keys:
+            key = keys.pop()
+            if supports.pop(key, self) is not self:
+                keys.extend(self._through.pop(key, ()))
+
+    def forgetSupportsAt(self, x, y, width, height):
+        """
+        Forgets what was remembered walking past the sprites in the area
+        and the ices standing on it, whose blockedBelow() can change when
+        something enters or leaves the area.
+        """
+        if self._supports:
+            self.forgetSupports(*self.getSprites(x - 1, y - 33, width + 2,
+                                                 height + 34))
 
     def isMoving(self):
         for s in self.sprites():
@@ -26,53 +104,47 @@ class BlocksGroup(AnimationGroup):
                 return True
         return False
 
+    def animateShine(self):
+        """
+        Moves the shine one step further along the ices, done once a
+        tick so the shine looks the same at any frame rate.
+        """
+        for s in self.sprites():
+            if s._shine >= 0:
+                s._shine -= 1
+
     def update(self):
-        AnimationGroup.update(self)
+        self.animateShine()
+        # other groups move between updates, nothing is remembered then
+        self._supports = {}
+        self._walked = {}
+        self._through = {}
+        try:
+            AnimationGroup.update(self)
+        finally:
+            self._supports = self._walked = self._through = None
         if self.shine > 0:
             self.shine -= 1
         else:
-            self.shine = self.SHINE_INTERVAL + random.randint(0, 200)
+            self.shine = self.SHINE_INTERVAL + g_random.randint(0, 200)
             for s in self.sprites():
                 s.shine(s.x / 32 + s.y / 32)
 
-    def draw(self, surface):
-        for s in (ss for ss in self.sprites() if ss.eyecandy):
+    def draw(self, surface, alpha = None, sprites = None):
+        if sprites is None:
+            sprites = self.sprites()
+        for s in (ss for ss in sprites if ss.eyecandy):
             s.updateZoom(surface)
-        AnimationGroup.draw(self, surface)
-
-class IcePiece(AnimatedSprite):
-
-    def __init__(self, x, y, piece, group):
-        AnimatedSprite.__init__(
-            self, x, y, 32, 32,
-            {"default": (ImageFrame("sprites/ice-normal", 32, 32),)}
-            )
-        group.add(self)
-        if piece == 0:
-            self._frameIndex = 9
-            self.dx = random.randint(-4, -1)
-            self.dy = random.randint(-4, -1)
-        elif piece == 1:
-            self._frameIndex = 10
-            self.dx = random.randint(1, 4)
-            self.dy = random.randint(-4, -1)
-        elif piece == 2:
-            self._frameIndex = 11
-            self.dx = random.randint(1, 4)
-            self.dy = random.randint(-2, -1)
-        elif piece == 3:
-            self._frameIndex = 12
-            self.dx = random.randint(-4, -1)
-            self.dy = random.randint(-2, -1)
-        else:
-            raise ValueError("ice piece must be 0-3")
+        AnimationGroup.draw(self, surface, alpha, sprites)
 
-    def update(self):
-        self.x += self.dx
-        self.y += self.dy
-        self.dy += 0.75
-        if self.y > 600:
-            self.kill()
+ICE_PIECE = ParticleType("sprites/ice-normal", 32, 32,
+                         gravity = 0.75, bottom = 600)
+
+# frame, dx and dy ranges of the pieces a broken ice falls apart into
+ICE_PIECES = ((9, (-4, -1), (-4, -1)),
+              (10, (1, 4), (-4, -1)),
+              (11, (1, 4), (-2, -1)),
+              (12, (-4, -1), (-2, -1)))
 
 
 class Ice(PhysicsSprite):
@@ -80,6 +152,44 @@ class Ice(PhysicsSprite):
     LEFT = 1
     RIGHT = 2
     BOTH = 3
+    _animationTables = {}
+
+    @classmethod
+    def getAnimations(cls, imgResource):
+        """
+        Returns the animations shared by all ices using the image.
+        """
+        animations = cls._animationTables.get(imgResource)
+        if animations is None:
+            animations = Animations(
+                {"default": (ImageFrame(imgResource, 32, 32),
+                             AnimationFrame(4, 0),
+                             AttributeFrame("created", True),
+                             ),
+                 "create": (ImageFrame(imgResource, 32, 32),
+                            AnimationFrame(0, 1),
+                            AnimationFrame(1, 1),
+                            AnimationFrame(2, 1),
+                            AnimationFrame(3, 1),
+                            AttributeFrame("created", True),
+                            CallbackFrame("addConnections"),
+                            ),
+                 "left": (ImageFrame(imgResource, 32, 32),
+                          AnimationFrame(5, 0),
+                          AttributeFrame("created", True),
+                          ),
+                 "right": (ImageFrame(imgResource, 32, 32),
+                           AnimationFrame(6, 0),
+                           AttributeFrame("created", True),
+                           ),
+                 "both": (ImageFrame(imgResource, 32, 32),
+                          AnimationFrame(7, 0),
+                          AttributeFrame("created", True),
+                          ),
+                 }
+                )
+            cls._animationTables[imgResource] = animations
+        return animations
 
     def __init__(self, x, y, level, blocksGroup, imgResource, life,
                  lightsGroup, players, enemies, eyecandy = True):
@@ -87,31 +197,7 @@ class Ice(PhysicsSprite):
             self,
             level,
             x, y, 32, 32,
-            {"default": (ImageFrame(imgResource, 32, 32),
-                         AnimationFrame(4, 0),
-                         AttributeFrame("created", True),
-                         ),
-             "create": (ImageFrame(imgResource, 32, 32),
-                        AnimationFrame(0, 1),
-                        AnimationFrame(1, 1),
-                        AnimationFrame(2, 1),
-                        AnimationFrame(3, 1),
-                        AttributeFrame("created", True),
-                        CallbackFrame(self.addConnections),
-                        ),
-            "left": (ImageFrame(imgResource, 32, 32),
-                      AnimationFrame(5, 0),
-                     AttributeFrame("created", True),
-                      ),
-             "right": (ImageFrame(imgResource, 32, 32),
-                       AnimationFrame(6, 0),
-                       AttributeFrame("created", True),
-                       ),
-             "both": (ImageFrame(imgResource, 32, 32),
-                      AnimationFrame(7, 0),
-                      AttributeFrame("created", True),
-                      ),
-             },
+            self.getAnimations(imgResource),
             blocksGroup)
         blocksGroup.add(self)
         self.eyecandy = eyecandy
@@ -131,11 +217,19 @@ class Ice(PhysicsSprite):
         self._shine = delay
 
     def blockedBelow(self):
-        return bool(PhysicsSprite.blockedBelow(self)
-                    or self.players.getSprite(self.x,
-                                              self.y + self.height,
-                                              self.width, 0, self)
-                    )
+        if PhysicsSprite.blockedBelow(self):
+            return True
+        occupancy = self.players.occupancy
+        if occupancy is not None:
+            # no tile below, or it would have been blocked
+            blocked = occupancy.test(self.players, self.x,
+                                     self.y + self.height, self.width, 0,
+                                     self)
+            if blocked is not None:
+                return blocked
+        return bool(self.players.getSprite(self.x,
+                                           self.y + self.height,
+                                           self.width, 0, self))
 
     def blockedLeft(self):
         enemy = self.enemyGroup.getSprite(self.x - 1,
@@ -169,22 +263,52 @@ class Ice(PhysicsSprite):
         if not self.zoomSurface:
             self.zoomSurface = self.getZoom(surface, self.x, self.y)
 
-    def draw(self, surface):
+    def drawRect(self, offsetX = 0, offsetY = 0):
+        rect = PhysicsSprite.drawRect(self, offsetX, offsetY)
+        if self.eyecandy and self.left == self:
+            rect.union_ip(rect.move(-32, 0))
+        if self.eyecandy and self.right == self:
+            rect.union_ip(rect.move(32, 0))
+        # the shine sweeps over into the ice to the left
+        if self._shine >= 0 and self._shine < 2:
+            rect.union_ip(pygame.Rect(self.rect.left + offsetX
+                                      + 16 - self._shine * 16,
+                                      self.rect.top + offsetY,
+                                      16,
+                                      self.rect.height))
+        if self.life < 16:
+            rect.union_ip(self.rect.move(offsetX, offsetY))
         if self.rumble:
-            ox = random.randint(0, 1) * 2 - 1
-            oy = random.randint(0, 1) * 2 - 1
+            rect.inflate_ip(2, 2)
+        return rect
+
+    def drawState(self):
+        # a shine at 0 is still drawn, it must not compare equal to False
+        shine = None
+        if self._shine >= 0 and self._shine < 2:
+            shine = self._shine
+        return (self.rumble,
+                shine,
+                self.life < 16,
+                self.zoomSurface)
+
+    def draw(self, surface, offsetX = 0, offsetY = 0):
+        x = self.x + offsetX
+        y = self.y + offsetY
+        ox = offsetX
+        oy = offsetY
+        if self.rumble:
+            ox += _rumble.randint(0, 1) * 2 - 1
+            oy += _rumble.randint(0, 1) * 2 - 1
             self.rumble = False
-        else:
-            ox = 0
-            oy = 0
         if self.eyecandy:
-            surface.blit(self.zoomSurface, (self.x, self.y))
+            surface.blit(self.zoomSurface, (x, y))
             if self.left == self:
                 surface.blit(self.frostImage,
-                             (self.x-32, self.y), (0, 0, 64, 32))
+                             (x - 32, y), (0, 0, 64, 32))
             if self.right == self:
                 surface.blit(self.frostImage,
-                             (self.x, self.y), (0, 0, 64, 32))
+                             (x, y), (0, 0, 64, 32))
         AnimatedSprite.draw(self, surface, ox, oy)
         if self._shine >= 0 and self._shine < 2:
             surface.fill(0xffffff,
@@ -193,8 +317,6 @@ class Ice(PhysicsSprite):
                           self.rect.top + oy,
                           16,
                           self.rect.height))
-        if self._shine >= 0:
-            self._shine -= 1
         if self.life < 16:
             surface.blit(self.image,
                          (self.rect.left + ox,
@@ -206,6 +328,7 @@ class Ice(PhysicsSprite):
                          )
 
     def melt(self):
+        self.wake()
         self.moving = 0
         self.life -= 1
         self.rumble = True
@@ -226,13 +349,32 @@ class Ice(PhysicsSprite):
             if self.life <= 0:
                 self.resources.playSound("samples/icebreak")
                 if self.eyecandy:
-                    IcePiece(self.x, self.y, 0, self.lightsGroup)
-                    IcePiece(self.x, self.y, 1, self.lightsGroup)
-                    IcePiece(self.x, self.y, 2, self.lightsGroup)
-                    IcePiece(self.x, self.y, 3, self.lightsGroup)
+                    for frame, dx, dy in ICE_PIECES:
+                        emit(self.lightsGroup, ICE_PIECE, self.x, self.y,
+                             g_random.randint(*dx),
+                             g_random.randint(*dy),
+                             frame)
         PhysicsSprite.kill(self)
 
+    def connected(self):
+        """
+        Returns the ices connected to this one, itself included.
+        """
+        ret = [self]
+        for direction in ("left", "right"):
+            block = getattr(self, direction)
+            while block and block != self and block not in ret:
+                ret.append(block)
+                block = getattr(block, direction)
+        return ret
+
+    def wakeConnected(self):
+        for block in self.connected():
+            block.wake()
+
     def removeConnections(self):
+        self.wakeConnected()
+        self.blocksGroup.forgetSupports(self, self.left, self.right)
         if self.left and self.left != self:
             self.left.right = None
             self.left.setConnectionAnimation()
@@ -244,6 +386,7 @@ class Ice(PhysicsSprite):
         self.setConnectionAnimation()
 
     def addConnections(self, direction = 0):
+        self.wakeConnected()
         if direction <= 0 and self.blockedLeft():
             self.left = self
         if direction >= 0 and self.blockedRight():
@@ -256,6 +399,7 @@ class Ice(PhysicsSprite):
                                                self,
                                                Ice)
             if block:
+                block.wakeConnected()
                 block.right = self
                 block.setConnectionAnimation()
                 self.left = block
@@ -267,31 +411,99 @@ class Ice(PhysicsSprite):
                                                self,
                                                Ice)
             if block:
+                block.wakeConnected()
                 block.left = self
                 block.setConnectionAnimation()
                 self.right = block
+        self.blocksGroup.forgetSupports(self, self.left, self.right)
+        self.wakeConnected()
         self.setConnectionAnimation()
 
+    def findSupport(self, direction):
+        """
+        Returns the first ice along the chain in the direction, "left"
+        or "right", that stands on something or is connected to a wall
+        on that side, None if no ice holds up the chain that way.
+        """
+        group = self.blocksGroup
+        supports = group._supports
+        path = []
+        found = None
+        through = None
+        block = getattr(self, direction)
+        while block:
+            if supports is not None and (block, direction) in supports:
+                through = (block, direction)
+                found = supports[through]
+                break
+            path.append(block)
+            if block.blockedBelow() or block == getattr(block, direction):
+                found = block
+                break
+            block = getattr(block, direction)
+        if supports is not None:
+            # every ice walked finds the same one further along
+            group.rememberSupport(path, direction, found, through)
+        return found
+
     def testFall(self):
         if (not self.created
             or self.blockedBelow()
             or self.right == self
             or self.left == self):
             return False
-        right = self.right
-        while right:
-            if right.blockedBelow() or right == right.right:
-                self.y = right.y
-                return False
-            right = right.right
-        left = self.left
-        while left:
-            if left.blockedBelow() or left == left.left:
-                self.y = left.y
-                return False
-            left = left.left
+        support = self.findSupport("right") or self.findSupport("left")
+        if support:
+            if self.y != support.y:
+                self.blocksGroup.forgetSupportsAt(self.x, self.y,
+                                                  self.width, self.height)
+                self.blocksGroup.forgetSupportsAt(self.x, support.y,
+                                                  self.width, self.height)
+            self.y = support.y
+            return False
         return True
 
+    def update(self):
+        moved = self.x, self.y, self.rect.x, self.rect.y
+        resting = self.isResting()
+        PhysicsSprite.update(self)
+        if moved != (self.x, self.y, self.rect.x, self.rect.y):
+            # the ices standing where it was and is may fall or land
+            for x, y in ((moved[0], moved[1]), (moved[2], moved[3]),
+                         (self.x, self.y)):
+                self.blocksGroup.forgetSupportsAt(x, y, self.width,
+                                                  self.height)
+        elif resting and self.blocksGroup.occupancy is not None:
+            cells = self.restingCells()
+            if cells is not None:
+                self.sleep(self.blocksGroup.occupancy, cells)
+
+    def isResting(self):
+        return bool(self.created and not self.falling and not self.moving
+                    and self.life > 0 and self.isDone())
+
+    def restingCells(self):
+        """
+        Returns the cells an ice at rest stays at rest for, as long as
+        nothing happens in them: the cells of the ices connected to it
+        and the cells below them, where testFall() looks. None if the
+        ice is not at rest or the ices are not lined up with the cells.
+        """
+        if not self.alive() or not self.isResting():
+            return None
+        # ices and players are one cell tall when the blocks update,
+        # they can not touch the top of a cell without being in it
+        ret = []
+        for block in self.connected():
+            if block.x % 32 or block.y % 32 or not block.alive():
+                return None
+            x, y = int(block.x) // 32, int(block.y) // 32
+            if not (0 <= x < self.level.width and 0 <= y < self.level.height):
+                return None
+            ret.append((x, y))
+            ret.append((x, y + 1))
+        return ret
+
     def physics(self):
         if (self.life <= 0
             or self.x + self.width < 0
@@ -317,6 +529,7 @@ class Ice(PhysicsSprite):
         fire=g_groups['fires'].getSpriteAt(self.x, self.y-32, None, None)
         if fire is not None:
             fire.followMe = self
+        self.wake()
         if direction < 0:
             self.moving = -99999
         elif direction > 0:
@@ -5,12 +5,13 @@ Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 (see LICENSE for more info)
 """
 
-import math, random
+import math
 from magicor.sprites import *
 from magicor.sprites.player import Player
 from magicor.sprites.blocks import Ice
 from magicor.sprites.world import Lava
 from magicor.resources import getResources
+from magicor import g_random
 
 class Enemy(PhysicsSprite):
     """
@@ -21,7 +22,12 @@ class Enemy(PhysicsSprite):
     walk-right: 1, 0, 2, 0
     walk-left: 4, 3, 5, 3
     die: 6, 7, 8, 9, kill
+
+    With the navigation of the level (see Navigation) enemies walking on
+    a platform or climbing in a climb go on without asking the level and
+    the groups what is in their way.
     """
+    navigation = None
 
     def __init__(self, x, y, w, h, frames,
                  imageResource, soundResource,
@@ -39,8 +45,8 @@ class Enemy(PhysicsSprite):
         if not self.dead:
             self.dead = True
             self.setAnimation("die")
-            self.dx = random.randint(-16, 16) / 4.0
-            self.dy = random.randint(-16, 0) / 4.0
+            self.dx = g_random.randint(-16, 16) / 4.0
+            self.dy = g_random.randint(-16, 0) / 4.0
 
     def physics(self):
         if self.dead:
@@ -75,6 +81,33 @@ class Enemy(PhysicsSprite):
     def move(self):
         pass
 
+    def walkable(self, x):
+        """
+        Whether the pixel column x ahead, as the blocked queries take
+        it, is on a platform the enemy stands on. False without a
+        navigation watched by its grid, the blocked queries answer then.
+        """
+        y = self.y
+        if (self.navigation is None or not self.navigation.watched()
+            or int(x) != x or x < 0
+            or int(y) != y or (y + self.height) % 32
+            or not 0 < self.height <= 32):
+            return False
+        return self.navigation.platform(int(x) // 32, int(y) // 32) is not None
+
+    def climbable(self, y):
+        """
+        Whether the pixel row y ahead, as the blocked queries take it,
+        is in a climb the enemy is in. False without a navigation
+        watched by its grid, the blocked queries answer then.
+        """
+        x = self.x
+        if (self.navigation is None or not self.navigation.watched()
+            or int(y) != y or y < 0
+            or int(x) != x or x % 32 + self.width > 32):
+            return False
+        return self.navigation.climb(int(x) // 32, int(y) // 32) is not None
+
     def testBlocks(self):
             block = self.blocksGroup.getSprite(self.x,
                                                self.y,
@@ -136,7 +169,9 @@ class WalkingEnemy(Enemy):
         
     def move(self):
             if self._animationName == "walk-right":
-                if (self.blockedRight()
+                if self.walkable(self.x + self.width):
+                    self.x += self.speed
+                elif (self.blockedRight()
                     or not self.blockedRightBelow()
                     or self.fireGroup.getSprite(self.x + self.width, self.y,
                                                 0, self.height,
@@ -150,7 +185,9 @@ class WalkingEnemy(Enemy):
                 else:
                     self.x += self.speed
             elif self._animationName == "walk-left":
-                if (self.blockedLeft()
+                if self.walkable(self.x - 1):
+                    self.x -= self.speed
+                elif (self.blockedLeft()
                     or not self.blockedLeftBelow()
                     or self.fireGroup.getSprite(self.x - 1, self.y,
                                                 0, self.height,
@@ -208,7 +245,9 @@ class ClimbingEnemy(Enemy):
     
     def move(self):
             if self._animationName == "climb-up":
-                if (self.blockedAbove()
+                if self.climbable(self.y - 1):
+                    self.y -= self.speed
+                elif (self.blockedAbove()
                     or self.fireGroup.getSprite(self.x, self.y - 1,
                                                 self.width, 0,
                                                 self)
@@ -221,7 +260,9 @@ class ClimbingEnemy(Enemy):
                 else:
                     self.y -= self.speed
             elif self._animationName == "climb-down":
-                if (self.blockedBelow()
+                if self.climbable(self.y + self.height):
+                    self.y += self.speed
+                elif (self.blockedBelow()
                     or self.fireGroup.getSprite(self.x, self.y + self.height,
                                                 self.width, 0,
                                                 self)
@@ -314,11 +355,22 @@ class StationaryEnemy(Enemy):
         return False
 
     def physics(self):
-        sprites = (self.players.getSprites(self.x, self.y,
-                                           self.width, self.height) +
-                   self.blocksGroup.getSprites(self.x, self.y,
-                                               self.width, self.height)
-                   )
+        occupancy = self.players.occupancy
+        if self.contacts is None and occupancy is not None:
+            # it never moves, only what enters its cells can touch it
+            self.listen(occupancy, occupancy.cells(self.rect))
+        if self.contacts is None:
+            sprites = (self.players.getSprites(self.x, self.y,
+                                               self.width, self.height) +
+                       self.blocksGroup.getSprites(self.x, self.y,
+                                                   self.width, self.height)
+                       )
+        else:
+            r = self.rect
+            sprites = ([s for s in self.touching(self.players)
+                        if r.colliderect(s.rect)] +
+                       [s for s in self.touching(self.blocksGroup)
+                        if r.colliderect(s.rect)])
         if sprites:
             for sprite in sprites:
                     if self.lethal:
@@ -5,33 +5,38 @@ Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 (see LICENSE for more info)
 """
 
-import math, random
+import math
 from magicor.sprites import *
-from magicor.sprites.lights import YellowLight, YellowSpark
+from magicor.sprites.lights import YellowLight, YELLOW_SPARK
+from magicor.sprites.particles import emit
 from magicor.sprites.blocks import Ice
-from magicor import g_groups
+from magicor import g_groups, g_random
 from magicor.sprites.seekers import Seeker
 
 class Fire(PhysicsSprite):
+    ANIMATIONS = Animations(
+        {"default": (ImageFrame("sprites/fire-normal", 32, 32),
+                     AnimationFrame(0, 1),
+                     AnimationFrame(1, 1),
+                     AnimationFrame(2, 1),
+                     AnimationFrame(3, 1),
+                     AnimationFrame(4, 1),
+                     AnimationFrame(5, 1),
+                     JumpFrame(1))}
+        )
 
     def __init__(self, x, y, level, blocksGroup, lightsGroup, players,
                  canFall = True):
         PhysicsSprite.__init__(
             self, level, x, y, 32, 32,
-            {"default": (ImageFrame("sprites/fire-normal", 32, 32),
-                         AnimationFrame(0, 1),
-                         AnimationFrame(1, 1),
-                         AnimationFrame(2, 1),
-                         AnimationFrame(3, 1),
-                         AnimationFrame(4, 1),
-                         AnimationFrame(5, 1),
-                         JumpFrame(1))},
+            self.ANIMATIONS,
             blocksGroup
             )
         self.players = players
         self.light = YellowLight(x - 32, y - 32)
         self.canFall = canFall
         self.followMe = None
+        self._listening = None
         lightsGroup.add(self.light)
         self.lightsGroup = lightsGroup
 
@@ -42,7 +47,24 @@ class Fire(PhysicsSprite):
             angle = i * (360 / 16.0)
             dx = 8.0 * math.cos(math.radians(angle))
             dy = 8.0 * math.sin(math.radians(angle))
-            self.lightsGroup.add(YellowSpark(self.x - 32, self.y - 32, dx, dy))
+            emit(self.lightsGroup, YELLOW_SPARK,
+                 self.x - 32, self.y - 32, dx, dy)
+
+    def listenHere(self):
+        """
+        Listens to the cell of the position of the fire, only what is in
+        that cell can be where the fire is.
+        """
+        occupancy = self.blocksGroup.occupancy
+        if occupancy is None or (self.x, self.y) == self._listening:
+            return
+        self._listening = (self.x, self.y)
+        try:
+            self.listen(occupancy,
+                        occupancy.cells(pygame.Rect(self.x, self.y, 1, 1)))
+        except ValueError:
+            # fell out of the level, look through the groups
+            self.unlisten()
 
     def physics(self):
         if self.followMe is not None:
@@ -70,26 +92,27 @@ class Fire(PhysicsSprite):
                 #check world colisions
                 if self.followMe is not None:
                     if self.followMe.moving>0:
-                        if self.level[(self.x+self.width)/32,(self.y+self.height/2)/32]:
+                        if self.level.isSolid((self.x+self.width)/32,(self.y+self.height/2)/32):
                             self.x = self.x/32*32
                             self.followMe = None
                     else:
-                        if self.level[self.x/32,(self.y+self.height/2)/32]:
+                        if self.level.isSolid(self.x/32,(self.y+self.height/2)/32):
                             self.x = (self.x/32+1)*32
                             self.followMe = None
                 #enemies are not checked, they need to be flying enemies wich
                 #can take damage from fire.
-                self.light.x = self.x - 32 + random.randint(-4, 4)
-                self.light.y = self.y - 32 + random.randint(-4, 4)
+                self.light.x = self.x - 32 + g_random.randint(-4, 4)
+                self.light.y = self.y - 32 + g_random.randint(-4, 4)
         else:
             #static or falling
-            for s in self.blocksGroup.sprites():
+            self.listenHere()
+            for s in self.touching(self.blocksGroup):
                 if isinstance(s, Ice) and s.x == self.x and s.y == self.y:
                     s.kill()
                     self.resources.playSound("samples/bonus")
                     self.kill()
                     break
-            for player in self.players.sprites():
+            for player in self.touching(self.players):
                 if player.x == self.x and player.y == self.y and not player.dead:
                     player.die()
             if self.canFall and not self.blockedBelow():
@@ -103,5 +126,5 @@ class Fire(PhysicsSprite):
                     for i in range(0,16):
                         heading = [math.cos(i*da),math.sin(i*da)]
                         g_groups['stones'].add(Seeker(x+heading[0]*4., y+heading[1]*4., heading,3.,target))
-            self.light.x = self.x - 32 + random.randint(-4, 4)
-            self.light.y = self.y - 32 + random.randint(-4, 4)
+            self.light.x = self.x - 32 + g_random.randint(-4, 4)
+            self.light.y = self.y - 32 + g_random.randint(-4, 4)
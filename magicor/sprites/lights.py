@@ -8,42 +8,38 @@ Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 
 import random
 from magicor.sprites import *
+from magicor.sprites.particles import ParticleType
 
-class BlueSparkle(AnimatedSprite):
+# particle types, emitted into the lights group with
+# magicor.sprites.particles.emit()
 
-    def __init__(self, x, y):
-        AnimatedSprite.__init__(
-            self, x, y, 128, 128,
-            {"default": (ImageFrame("sprites/sparkle-star", 128, 128),
-                         AnimationFrame(0, 1),
-                         AnimationFrame(1, 2),
-                         AnimationFrame(2, 3),
-                         AnimationFrame(3, 4),
-                         KillFrame())}
-            )
+# rises with a dy of -8
+BLUE_SPARKLE = ParticleType("sprites/sparkle-star", 128, 128,
+                            ((0, 1), (1, 2), (2, 3), (3, 4)),
+                            top = 0)
 
-    def physics(self):
-        self.y -= 8
-        if self.y + self.height < 0:
-            self.kill()
+YELLOW_SPARK = ParticleType("sprites/light-yellow", 96, 96,
+                            ((0, 1), (1, 1), (2, 1), (3, 1),
+                             (1, 1), (2, 1), (3, 1),
+                             (2, 1), (3, 1)))
 
+BURNING = ParticleType("sprites/burning", 64, 64,
+                       ((0, 1), (1, 1), (2, 2), (3, 2), (4, 2),
+                        (5, 4), (6, 4)))
 
-class YellowLight(AnimatedSprite):
+# moves with a dx of the direction and a dy of 2
+ICE_DUST_RIGHT = ParticleType("sprites/dust", 32, 32,
+                              ((0, 1), (1, 1), (2, 1), (3, 1), (4, 1),
+                               (10, 1), (11, 1), (12, 1)))
 
-    def __init__(self, x, y):
-        AnimatedSprite.__init__(
-            self, x, y, 96, 96,
-            {"default": (ImageFrame("sprites/light-yellow", 96, 96),
-                         AnimationFrame(0, 1),
-                         AnimationFrame(1, 1),
-                         AnimationFrame(2, 1),
-                         AnimationFrame(3, 1),
-                         JumpFrame(1))})
+ICE_DUST_LEFT = ParticleType("sprites/dust", 32, 32,
+                             ((5, 1), (6, 1), (7, 1), (8, 1), (9, 1),
+                              (10, 1), (11, 1), (12, 1)))
 
 
-class YellowSpark(AnimatedSprite):
+class YellowLight(AnimatedSprite):
 
-    def __init__(self, x, y, dx, dy):
+    def __init__(self, x, y):
         AnimatedSprite.__init__(
             self, x, y, 96, 96,
             {"default": (ImageFrame("sprites/light-yellow", 96, 96),
@@ -51,86 +47,8 @@ class YellowSpark(AnimatedSprite):
                          AnimationFrame(1, 1),
                          AnimationFrame(2, 1),
                          AnimationFrame(3, 1),
-                         AnimationFrame(1, 1),
-                         AnimationFrame(2, 1),
-                         AnimationFrame(3, 1),
-                         AnimationFrame(2, 1),
-                         AnimationFrame(3, 1),
-                         KillFrame())})
-        self.dx = dx
-        self.dy = dy
-
-    def physics(self):
-        self.x += self.dx
-        self.y += self.dy
-
-
-class Burning(AnimatedSprite):
-
-    def __init__(self, x, y, dx, dy):
-        AnimatedSprite.__init__(
-            self, x, y, 64, 64,
-            {"default": (ImageFrame("sprites/burning", 64, 64),
-                         AnimationFrame(0, 1),
-                         AnimationFrame(1, 1),
-                         AnimationFrame(2, 2),
-                         AnimationFrame(3, 2),
-                         AnimationFrame(4, 2),
-                         AnimationFrame(5, 4),
-                         AnimationFrame(6, 4),
-                         KillFrame())})
-        self.dx = dx
-        self.dy = dy
-
-
-    def physics(self):
-        self.x += self.dx
-        self.y += self.dy
-        
-
-class IceDust(AnimatedSprite):
+                         JumpFrame(1))})
 
-    def __init__(self, x, y, iceX, iceY, direction):
-        AnimatedSprite.__init__(
-            self, x, y, 32, 32,
-            {"right": (ImageFrame("sprites/dust", 32, 32),
-                       AnimationFrame(0, 1),
-                       AnimationFrame(1, 1),
-                       AnimationFrame(2, 1),
-                       AnimationFrame(3, 1),
-                       AnimationFrame(4, 1),
-                       AnimationFrame(10, 1),
-                       AnimationFrame(11, 1),
-                       AnimationFrame(12, 1),
-                       KillFrame()),
-             "left": (ImageFrame("sprites/dust", 32, 32),
-                       AnimationFrame(5, 1),
-                       AnimationFrame(6, 1),
-                       AnimationFrame(7, 1),
-                       AnimationFrame(8, 1),
-                       AnimationFrame(9, 1),
-                       AnimationFrame(10, 1),
-                       AnimationFrame(11, 1),
-                       AnimationFrame(12, 1),
-                       KillFrame()),
-             },
-            "right"
-            )
-        if direction > 0:
-            self.setAnimation("right")
-        elif direction < 0:
-            self.setAnimation("left")
-        else:
-            raise ValueError("direction must be -1 or 1")
-        self.iceX = iceX
-        self.iceY = iceY
-        self.direction = direction
-
-
-    def physics(self):
-        self.x += self.direction
-        self.y += 2
-        
 
 class SunLight(AnimatedSprite):
 
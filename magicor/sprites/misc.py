@@ -37,11 +37,18 @@ class Direction(AnimatedSprite):
     def update(self):
         self._move = (self._move + self._speed) % 360
 
-    def draw(self, surface):
+    def drawRect(self, offsetX = 0, offsetY = 0):
+        return AnimatedSprite.drawRect(self, offsetX, offsetY).inflate(
+            self._distance * 2, self._distance * 2)
+
+    def drawState(self):
+        return self._move
+
+    def draw(self, surface, offsetX = 0, offsetY = 0):
+        ox = offsetX
+        oy = offsetY
         if self._direction in ("left", "right"):
-            ox = int(self._distance * math.sin(math.radians(self._move)))
-            oy = 0
+            ox += int(self._distance * math.sin(math.radians(self._move)))
         else:
-            ox = 0
-            oy = int(self._distance * math.sin(math.radians(self._move)))
+            oy += int(self._distance * math.sin(math.radians(self._move)))
         AnimatedSprite.draw(self, surface, ox, oy)
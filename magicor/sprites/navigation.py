@@ -0,0 +1,113 @@
+"""
+Where enemies can walk and climb in a level.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+
+class Navigation(object):
+    """
+    The platforms enemies walk on and the columns they climb in, worked
+    out from the tiles of the level and what the occupancy grid counts
+    of the blocks, fires and world sprites.
+
+    A cell of a platform is free of tiles, blocks, fires and world
+    sprites and has a tile below it, a platform is a run of such cells
+    in a row. A cell of a climb is free of them too, a climb is a run of
+    such cells in a column. An enemy with its edge in a platform or a
+    climb is not in the way of anything it would turn around for.
+
+    The platforms of a row and the climbs of a column are worked out
+    when first asked for and forgotten when a block, fire or world
+    sprite enters or leaves a cell of the row or column, as the grid
+    tells it (see OccupancyGrid.observe).
+    """
+
+    def __init__(self, occupancy, blocksGroup, fireGroup, worldGroup):
+        self.occupancy = occupancy
+        self.level = occupancy.level
+        self.groups = (blocksGroup, fireGroup, worldGroup)
+        self._platforms = {}
+        self._climbs = {}
+        for group in self.groups:
+            occupancy.observe(group, self.changed)
+
+    def watched(self):
+        """
+        Whether the grid still watches the blocks, fires and world
+        sprites, the platforms and climbs are only right while it does.
+        """
+        occupancy = self.occupancy
+        for group in self.groups:
+            if group.occupancy is not occupancy:
+                return False
+        return True
+
+    def changed(self, cx, cy):
+        """
+        Forgets the platforms of the row and the climbs of the column of
+        the cell.
+        """
+        self._platforms.pop(cy, None)
+        self._climbs.pop(cx, None)
+
+    def _free(self, cx, cy):
+        if self.level.isSolid(cx, cy):
+            return False
+        count = self.occupancy.count
+        for group in self.groups:
+            if count(group, cx, cy):
+                return False
+        return True
+
+    def _runs(self, cells):
+        """
+        Returns the run of True cells every cell is in, as a (first,
+        end) tuple, or None for False cells.
+        """
+        runs = [None] * len(cells)
+        first = None
+        for i, free in enumerate(cells + [False]):
+            if free:
+                if first is None:
+                    first = i
+            elif first is not None:
+                run = (first, i)
+                runs[first:i] = [run] * (i - first)
+                first = None
+        return runs
+
+    def platform(self, cx, cy):
+        """
+        The platform the cell is in as the (first, end) columns of it,
+        or None if the cell is not in a platform.
+        """
+        platforms = self._platforms.get(cy)
+        if platforms is None:
+            level = self.level
+            if 0 <= cy < level.height - 1:
+                cells = [level.isSolid(x, cy + 1) and self._free(x, cy)
+                         for x in range(level.width)]
+            else:
+                cells = [False] * level.width
+            platforms = self._platforms[cy] = self._runs(cells)
+        if 0 <= cx < len(platforms):
+            return platforms[cx]
+        return None
+
+    def climb(self, cx, cy):
+        """
+        The climb the cell is in as the (first, end) rows of it, or None
+        if the cell is not in a climb.
+        """
+        climbs = self._climbs.get(cx)
+        if climbs is None:
+            level = self.level
+            if 0 <= cx < level.width:
+                cells = [self._free(cx, y) for y in range(level.height)]
+            else:
+                cells = [False] * level.height
+            climbs = self._climbs[cx] = self._runs(cells)
+        if 0 <= cy < len(climbs):
+            return climbs[cy]
+        return None
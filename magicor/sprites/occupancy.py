@@ -0,0 +1,279 @@
+"""
+An occupancy grid of the cells of a level.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import array
+import pygame
+
+class OccupancyGrid(object):
+    """
+    What occupies each cell of a level: the solid tiles of the level and
+    a count of the sprites of every watched AnimationGroup whose index
+    cells (see AnimationGroup.reindex) are at the cell. The counts are
+    kept up to date by the groups as their sprites move, so they are
+    right at any time during a tick.
+
+    The grid reaches one cell beyond the level on every side, so sprites
+    at the edges are counted too. The tiles are copied from the level
+    when the grid is made, they must not change after that.
+
+    Sprites at rest can sleep on cells of the grid (see
+    AnimatedSprite.sleep) and are woken when a sprite of a watched group
+    enters, leaves or moves in one of them.
+
+    Sprites can listen to cells of the grid too (see
+    AnimatedSprite.listen), they are told whenever a sprite of a watched
+    group enters or leaves one of them instead of looking through the
+    groups every tick.
+
+    Whatever is worked out from the sprites of a group can observe the
+    group instead, it is told about every cell one of them enters or
+    leaves.
+    """
+    CELL_SIZE = 32
+
+    def __init__(self, level):
+        self.level = level
+        self.width = level.width + 2
+        self.height = level.height + 2
+        self._tiles = array.array("B", [0]) * (self.width * self.height)
+        for y in range(level.height):
+            for x in range(level.width):
+                if level.isSolid(x, y):
+                    self._tiles[(y + 1) * self.width + x + 1] = 1
+        self._counts = {}
+        self._sleepers = {}
+        self._listeners = {}
+        self._observers = {}
+        self._rect = pygame.Rect(0, 0, 1, 1)
+
+    def watch(self, group):
+        """
+        Counts the sprites of the group from now on.
+        """
+        self._counts[group] = array.array("H", [0]) * (self.width
+                                                      * self.height)
+        group.occupancy = self
+        for sprite, (bounds, cells) in list(group._spriteCells.items()):
+            self.move(group, sprite, (), cells)
+
+    def move(self, group, sprite, old, new):
+        """
+        Moves a sprite of the group from the old cells to the new cells.
+        """
+        counts = self._counts[group]
+        width, height = self.width, self.height
+        sleepers = self._sleepers
+        listeners = self._listeners
+        for cell in old:
+            cx, cy = cell
+            if -1 <= cx < width - 1 and -1 <= cy < height - 1:
+                i = (cy + 1) * width + cx + 1
+                counts[i] -= 1
+                if i in sleepers:
+                    self._wakeCell(i)
+                if i in listeners and cell not in new:
+                    for listener in list(listeners[i]):
+                        listener.onLeave(group, sprite)
+        for cell in new:
+            cx, cy = cell
+            if -1 <= cx < width - 1 and -1 <= cy < height - 1:
+                i = (cy + 1) * width + cx + 1
+                counts[i] += 1
+                if i in sleepers:
+                    self._wakeCell(i)
+                if i in listeners and cell not in old:
+                    for listener in list(listeners[i]):
+                        listener.onEnter(group, sprite)
+        observers = self._observers.get(group)
+        if observers:
+            for cell in old:
+                if cell not in new:
+                    for observer in observers:
+                        observer(*cell)
+            for cell in new:
+                if cell not in old:
+                    for observer in observers:
+                        observer(*cell)
+
+    def observe(self, group, callback):
+        """
+        Calls callback(cx, cy) for every cell a sprite of the watched
+        group enters or leaves from now on.
+        """
+        self._observers.setdefault(group, []).append(callback)
+
+    def cells(self, rect):
+        """
+        The cells of the pixels of the rect, as AnimationGroup indexes
+        them.
+        """
+        size = self.CELL_SIZE
+        return [(cx, cy)
+                for cx in range(rect.left // size,
+                                (rect.right - 1) // size + 1)
+                for cy in range(rect.top // size,
+                                (rect.bottom - 1) // size + 1)]
+
+    def _index(self, cells):
+        width, height = self.width, self.height
+        indexes = []
+        for cx, cy in cells:
+            if not (-1 <= cx < width - 1 and -1 <= cy < height - 1):
+                raise ValueError("cell (%d, %d) out of range"%(cx, cy))
+            indexes.append((cy + 1) * width + cx + 1)
+        return indexes
+
+    def _sprites(self, i):
+        """
+        Yields the watched groups and their sprites at the cell index.
+        """
+        cell = (i % self.width - 1, i // self.width - 1)
+        for group in self._counts:
+            for sprite in list(group._cells.get(cell, ())):
+                yield group, sprite
+
+    def listen(self, sprite, cells):
+        """
+        Lets the sprite listen to the cells, (x, y) tuples, instead of
+        the cells it listened to before, see AnimatedSprite.listen.
+        sprite.onEnter() is called for the sprites already in cells it
+        did not listen to and sprite.onLeave() for the sprites in cells
+        it no longer listens to. Raises ValueError for cells beyond the
+        grid.
+        """
+        indexes = set(self._index(cells))
+        if sprite.contacts is not None and sprite._listenGrid is not self:
+            sprite._listenGrid.unlisten(sprite)
+        if sprite.contacts is None:
+            sprite.contacts = {}
+            sprite._listenGrid = self
+            sprite._listenCells = set()
+        old = sprite._listenCells
+        listeners = self._listeners
+        for i in sorted(old - indexes):
+            bucket = listeners[i]
+            bucket.discard(sprite)
+            if not bucket:
+                del listeners[i]
+            for group, other in self._sprites(i):
+                sprite.onLeave(group, other)
+        for i in sorted(indexes - old):
+            listeners.setdefault(i, set()).add(sprite)
+            for group, other in self._sprites(i):
+                sprite.onEnter(group, other)
+        sprite._listenCells = indexes
+
+    def unlisten(self, sprite):
+        """
+        Stops the sprite from listening to the grid, its contacts are
+        forgotten.
+        """
+        listeners = self._listeners
+        for i in sprite._listenCells:
+            bucket = listeners.get(i)
+            if bucket is not None:
+                bucket.discard(sprite)
+                if not bucket:
+                    del listeners[i]
+        sprite._listenCells = set()
+        sprite.contacts = None
+
+    def sleep(self, sprite, cells):
+        """
+        Puts the sprite to sleep on the cells, see AnimatedSprite.sleep.
+        Raises ValueError for cells beyond the grid.
+        """
+        indexes = self._index(cells)
+        sprite.wake()
+        sprite.sleeping = True
+        sprite._sleepGrid = self
+        sprite._sleepCells = indexes
+        sleepers = self._sleepers
+        for i in indexes:
+            sleepers.setdefault(i, set()).add(sprite)
+
+    def wake(self, sprite):
+        """
+        Wakes a sprite put to sleep on the grid.
+        """
+        sprite.sleeping = False
+        sleepers = self._sleepers
+        for i in sprite._sleepCells:
+            bucket = sleepers.get(i)
+            if bucket is not None:
+                bucket.discard(sprite)
+                if not bucket:
+                    del sleepers[i]
+        sprite._sleepCells = ()
+
+    def _wakeCell(self, i):
+        for sprite in list(self._sleepers[i]):
+            self.wake(sprite)
+
+    def count(self, group, cx, cy):
+        """
+        The number of sprites of the group at the cell.
+        """
+        return self._counts[group][(cy + 1) * self.width + cx + 1]
+
+    def test(self, group, x, y, width, height, exclude = None):
+        """
+        Whether something is in the way in the area, as the blocked
+        queries of PhysicsSprite ask it: a solid tile at either end of
+        the top row of cells of the area or a sprite of the group other
+        than exclude colliding with the area, as
+        AnimationGroup.getSprite() takes it. Only the sprites of occupied
+        cells are tested. Areas of fractional coordinates, which Rect
+        rounds, and areas reaching out of the level are not answered,
+        None is returned for them.
+        """
+        if (type(x) is not int or type(y) is not int
+            or type(width) is not int or type(height) is not int):
+            return None
+        size = self.CELL_SIZE
+        x0 = x // size
+        y0 = y // size
+        x1 = (x + width - 1) // size if width > 0 else x0
+        y1 = (y + height - 1) // size if height > 0 else y0
+        if (x0 < 0 or y0 < 0 or x1 >= self.level.width
+            or y1 >= self.level.height):
+            return None
+        stride = self.width
+        start = (y0 + 1) * stride + x0 + 1
+        tiles = self._tiles
+        if tiles[start] or tiles[start + x1 - x0]:
+            return True
+        counts = self._counts[group]
+        if x0 == x1 and y0 == y1:
+            if not counts[start]:
+                return False
+        else:
+            for row in range(start, (y1 + 1) * stride + x0 + 2, stride):
+                if any(counts[row:row + x1 - x0 + 1]):
+                    break
+            else:
+                return False
+        r = self._rect
+        r.left = x
+        r.top = y
+        r.width = width if width > 0 else 1
+        r.height = height if height > 0 else 1
+        cells = group._cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for sprite in cells.get((cx, cy), ()):
+                    if sprite != exclude and r.colliderect(sprite.rect):
+                        return True
+        return False
+
+    def testAll(self, group, areas):
+        """
+        Returns test() of every area, (x, y, width, height, exclude)
+        tuples, as a list.
+        """
+        test = self.test
+        return [test(group, x, y, width, height, exclude)
+                for x, y, width, height, exclude in areas]
@@ -0,0 +1,325 @@
+"""
+Particles are short lived eye-candy like sparks, dust and ice debris.
+
+Instead of being a sprite each, the particles emitted into a group are
+kept in columns of numbers by a single ParticleEmitter sprite. It moves
+and animates all of them in one step and draws them with one batch of
+blits. NumPy arrays are used when NumPy is installed, otherwise the
+columns are plain arrays from the array module.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+
+import math
+from array import array
+import pygame.sprite
+from magicor.resources import getResources
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# columns of every particle and their array typecodes
+COLUMNS = (("x", "d"), ("y", "d"), ("prevX", "d"), ("prevY", "d"),
+           ("dx", "d"), ("dy", "d"), ("ddy", "d"),
+           ("bottom", "d"), ("top", "d"),
+           ("age", "l"), ("life", "d"), ("first", "l"), ("frame", "l"),
+           ("kind", "l"))
+NUMPY_TYPES = numpy and {"d": numpy.float64, "l": numpy.int64}
+
+def emit(group, type_, x, y, dx = 0, dy = 0, frame = 0):
+    """
+    Emits a particle of type_ into the group, see ParticleEmitter.emit().
+    The emitter of a group is kept by the group, it goes with it.
+    """
+    emitter = getattr(group, "_emitter", None)
+    if emitter is None:
+        emitter = group._emitter = ParticleEmitter(group)
+    emitter.emit(type_, x, y, dx, dy, frame)
+
+
+class ParticleType(object):
+    """
+    What a kind of particle looks like and how it moves.
+
+    The frames are (frame, delay) pairs played the same way as the
+    AnimationFrames of a sprite, the particle dies after the last one.
+    Without frames the particle keeps the frame it was emitted with.
+    Either way it dies once it is entirely above top or its y is
+    below bottom. The gravity is added to dy every tick.
+    """
+
+    def __init__(self, resource, width, height, frames = None,
+                 gravity = 0, top = None, bottom = None):
+        self.resource = resource
+        self.width = width
+        self.height = height
+        self.frames = frames
+        self.gravity = gravity
+        self.top = top
+        self.bottom = bottom
+        self.schedule = frames and self._schedule(frames) or None
+
+    def _schedule(self, frames):
+        """
+        Returns the frame shown after each tick of the particle's life.
+        """
+        current = frames[0][0]
+        schedule = [current]
+        index = 0
+        count = 0
+        while True:
+            while index < len(frames):
+                frame, delay = frames[index]
+                if count == 0:
+                    current = frame
+                count += 1
+                if count > delay:
+                    index += 1
+                    count = 0
+                else:
+                    break
+            if index >= len(frames):
+                return tuple(schedule)
+            schedule.append(current)
+
+
+class ParticleEmitter(pygame.sprite.Sprite):
+    """
+    A sprite moving, animating and drawing the particles emitted into
+    a group. It is only in the group while it has particles, and is
+    added last so the particles are drawn above what was there before.
+    """
+    INTERPOLATE_LIMIT = 32
+    USE_NUMPY = numpy is not None
+
+    def __init__(self, group):
+        pygame.sprite.Sprite.__init__(self)
+        self.resources = getResources()
+        self.group = group
+        self.image = None
+        self.rect = pygame.Rect((0, 0, 0, 0))
+        self.x = self.y = 0
+        self.width = self.height = 0
+        self._frameIndex = 0
+        self._indexGroups = []
+        self._numpy = self.USE_NUMPY and numpy is not None
+        self._types = []
+        self._kinds = {}
+        self._firsts = []
+        self._schedule = []
+        self._ticks = 0
+        self._pending = []
+        self._columns = {}
+        for name, typecode in COLUMNS:
+            if self._numpy:
+                self._columns[name] = numpy.zeros(0, NUMPY_TYPES[typecode])
+            else:
+                self._columns[name] = array(typecode)
+
+    def count(self):
+        """
+        The number of particles alive.
+        """
+        return len(self._columns["x"]) + len(self._pending)
+
+    def _kind(self, type_):
+        kind = self._kinds.get(type_)
+        if kind is None:
+            kind = len(self._types)
+            self._types.append(type_)
+            self._kinds[type_] = kind
+            if type_.schedule:
+                self._firsts.append(len(self._schedule))
+                self._schedule.extend(type_.schedule)
+                if self._numpy:
+                    self._scheduleArray = numpy.array(self._schedule,
+                                                      numpy.int64)
+            else:
+                self._firsts.append(-1)
+        return kind
+
+    def emit(self, type_, x, y, dx = 0, dy = 0, frame = 0):
+        """
+        Adds a particle at x, y moving dx, dy every tick.
+        """
+        kind = self._kind(type_)
+        if type_.schedule:
+            life = len(type_.schedule)
+            frame = type_.schedule[0]
+        else:
+            life = math.inf
+        self._pending.append(
+            (x, y, x, y, dx, dy, type_.gravity,
+             type_.bottom is None and math.inf or type_.bottom,
+             type_.top is None and -math.inf or type_.top - type_.height,
+             0, life, self._firsts[kind], frame, kind))
+        if not self.alive():
+            self.group.add(self)
+
+    def _flush(self):
+        """
+        Moves the pending particles into the columns.
+        """
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
+        columns = self._columns
+        for (name, typecode), values in zip(COLUMNS, zip(*pending)):
+            if self._numpy:
+                columns[name] = numpy.concatenate(
+                    (columns[name], numpy.array(values, columns[name].dtype)))
+            else:
+                columns[name].extend(values)
+
+    def savePosition(self):
+        self._flush()
+        columns = self._columns
+        if self._numpy:
+            columns["prevX"] = columns["x"].copy()
+            columns["prevY"] = columns["y"].copy()
+        else:
+            columns["prevX"] = array("d", columns["x"])
+            columns["prevY"] = array("d", columns["y"])
+
+    def update(self):
+        """
+        Moves and animates all particles and drops the dead ones.
+        """
+        self._flush()
+        if self._numpy:
+            self._updateNumpy()
+        else:
+            self._updateArray()
+        self._ticks += 1
+        if not len(self._columns["x"]):
+            self.kill()
+
+    def animate(self):
+        pass
+
+    def _updateNumpy(self):
+        c = self._columns
+        c["x"] += c["dx"]
+        c["y"] += c["dy"]
+        c["dy"] += c["ddy"]
+        c["age"] += 1
+        keep = ((c["age"] < c["life"])
+                & ~(c["y"] > c["bottom"])
+                & ~(c["y"] < c["top"]))
+        if not keep.all():
+            for name in c:
+                c[name] = c[name][keep]
+        animated = c["first"] >= 0
+        if animated.any():
+            c["frame"][animated] = self._scheduleArray[
+                c["first"][animated] + c["age"][animated]]
+
+    def _updateArray(self):
+        c = self._columns
+        x, y, dx, dy, ddy = c["x"], c["y"], c["dx"], c["dy"], c["ddy"]
+        age, life, bottom, top = c["age"], c["life"], c["bottom"], c["top"]
+        first, frame = c["first"], c["frame"]
+        schedule = self._schedule
+        keep = []
+        for i in range(len(x)):
+            x[i] += dx[i]
+            y[i] += dy[i]
+            dy[i] += ddy[i]
+            age[i] += 1
+            if age[i] < life[i] and not y[i] > bottom[i] and not y[i] < top[i]:
+                keep.append(i)
+                if first[i] >= 0:
+                    frame[i] = schedule[first[i] + age[i]]
+        if len(keep) < len(x):
+            for name, typecode in COLUMNS:
+                column = c[name]
+                c[name] = array(typecode, [column[i] for i in keep])
+
+    def interpolate(self, alpha):
+        """
+        Returns the drawing offsets of the particles, like
+        AnimatedSprite.interpolate() does for a sprite.
+        """
+        self._flush()
+        c = self._columns
+        limit = self.INTERPOLATE_LIMIT
+        if self._numpy:
+            dx = c["prevX"] - c["x"]
+            dy = c["prevY"] - c["y"]
+            teleported = (numpy.abs(dx) > limit) | (numpy.abs(dy) > limit)
+            dx = dx * (1.0 - alpha)
+            dy = dy * (1.0 - alpha)
+            dx[teleported] = 0
+            dy[teleported] = 0
+            return dx, dy
+        offsetsX = []
+        offsetsY = []
+        for px, x, py, y in zip(c["prevX"], c["x"], c["prevY"], c["y"]):
+            dx = px - x
+            dy = py - y
+            if abs(dx) > limit or abs(dy) > limit:
+                offsetsX.append(0)
+                offsetsY.append(0)
+            else:
+                offsetsX.append(dx * (1.0 - alpha))
+                offsetsY.append(dy * (1.0 - alpha))
+        return offsetsX, offsetsY
+
+    def _positions(self, offsetX, offsetY):
+        c = self._columns
+        if self._numpy:
+            return ((c["x"] + offsetX).tolist(), (c["y"] + offsetY).tolist())
+        if not isinstance(offsetX, (list, tuple)):
+            offsetX = [offsetX] * len(c["x"])
+            offsetY = [offsetY] * len(c["x"])
+        return ([x + o for x, o in zip(c["x"], offsetX)],
+                [y + o for y, o in zip(c["y"], offsetY)])
+
+    def drawRects(self, offsetX = 0, offsetY = 0):
+        """
+        The areas draw() covers when called with the same offsets, one
+        for every particle, so only what is around the particles is
+        drawn again.
+        """
+        self._flush()
+        xs, ys = self._positions(offsetX, offsetY)
+        types = self._types
+        kinds = self._columns["kind"]
+        if self._numpy:
+            kinds = kinds.tolist()
+        rects = []
+        for x, y, kind in zip(xs, ys, kinds):
+            left = math.floor(x)
+            top = math.floor(y)
+            rects.append(pygame.Rect(left, top,
+                                     math.ceil(x + types[kind].width) - left,
+                                     math.ceil(y + types[kind].height) - top))
+        return rects
+
+    def drawState(self):
+        return self._ticks
+
+    def draw(self, surface, offsetX = 0, offsetY = 0):
+        """
+        Draws all particles in the order they were emitted.
+        """
+        self._flush()
+        c = self._columns
+        xs, ys = self._positions(offsetX, offsetY)
+        images = [self.resources[t.resource] for t in self._types]
+        sizes = [(t.width, t.height) for t in self._types]
+        kinds = c["kind"]
+        frames = c["frame"]
+        if self._numpy:
+            kinds = kinds.tolist()
+            frames = frames.tolist()
+        blits = []
+        for x, y, kind, frame in zip(xs, ys, kinds, frames):
+            width, height = sizes[kind]
+            blits.append((images[kind], (x, y),
+                          (frame * width, 0, width, height)))
+        surface.blits(blits, False)
@@ -5,13 +5,222 @@ Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 (see LICENSE for more info)
 """
 import time
+from magicor import g_random
 from magicor.sprites import *
 from magicor.sprites.blocks import *
 from magicor.sprites.world import Tube
-from magicor.sprites.lights import Burning, IceDust
+from magicor.sprites.lights import BURNING, ICE_DUST_LEFT, ICE_DUST_RIGHT
+from magicor.sprites.particles import emit
 
 class Player(PhysicsSprite):
     IMAGE = "sprites/player-penguin"
+    ANIMATIONS = Animations(
+        {"default":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(0, 0),
+          ),
+         "die":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(28, 4),
+          AnimationFrame(29, 4),
+          JumpFrame(1),
+          ),
+         "falling":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/fall"),
+          AnimationFrame(16, 4),
+          AnimationFrame(17, 4),
+          JumpFrame(2),
+          ),
+         "happy":
+         (ImageFrame(IMAGE, 32, 48),
+          MoveFrame(0, -10),
+          AnimationFrame(16, 4),
+          MoveFrame(0, -4),
+          AnimationFrame(17, 4),
+          MoveFrame(0, -2),
+          AnimationFrame(16, 4),
+          MoveFrame(0, 2),
+          AnimationFrame(17, 4),
+          MoveFrame(0, 4),
+          AnimationFrame(17, 4),
+          MoveFrame(0, 10),
+          AnimationFrame(16, 4),
+          SoundFrame("samples/done"),
+          AnimationFrame(34, 64),
+          ),
+         # right side
+         "stand-right":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(0, 8),
+          AttributeFrame("direction", 1),
+          ),
+         "crouch-right":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(18, 8),
+          ),
+         "walk-right":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/walk"),
+          AnimationFrame(1, 2),
+          AnimationFrame(2, 2),
+          SoundFrame("samples/walk"),
+          AnimationFrame(1, 2),
+          AnimationFrame(0, 2),
+          ),
+         "crawl-right":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(19, 4),
+          AnimationFrame(18, 4),
+          ),
+         "jump-right":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/jump"),
+          MoveFrame(8, 0),
+          AnimationFrame(6, 4),
+          MoveFrame(8, -16),
+          AnimationFrame(7, 4),
+          MoveFrame(8, 0),
+          AnimationFrame(8, 4),
+          MoveFrame(8, -16),
+          AnimationFrame(0, 0),
+          CallbackFrame("doneJumping"),
+          ),
+         "jump-tube-right":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/jump"),
+          MoveFrame(8, 0),
+          AnimationFrame(6, 4),
+          MoveFrame(8, -16),
+          AnimationFrame(7, 4),
+          MoveFrame(8, 0),
+          AnimationFrame(8, 4),
+          MoveFrame(8, -16),
+          AnimationFrame(26, 0),
+          CallbackFrame("doneJumping"),
+          ),
+         "push-right":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/push"),
+          AnimationFrame(12, 2),
+          AnimationFrame(13, 2),
+          AnimationFrame(12, 2),
+          AnimationFrame(0, 0),
+          AttributeFrame("pushing", False),
+          ),
+         "tube-right":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(26, 0),
+          ),
+         "freeze-right":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(30, 2),
+          AnimationFrame(31, 4),
+          AnimationFrame(30, 2),
+          AnimationFrame(0, 0),
+          AttributeFrame("freezing", False),
+          ),
+         "crouch-freeze-right":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(22, 2),
+          AnimationFrame(23, 4),
+          AnimationFrame(22, 2),
+          AnimationFrame(18, 0),
+          AttributeFrame("freezing", False),
+          ),
+         "land-right":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/playerland"),
+          AnimationFrame(18, 4),
+          AnimationFrame(0, 0),
+          ),
+         # left side
+         "stand-left":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(3, 8),
+          AttributeFrame("direction", -1),
+          ),
+         "crouch-left":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(20, 8),
+          ),
+         "walk-left":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/walk"),
+          AnimationFrame(4, 2),
+          AnimationFrame(5, 2),
+          SoundFrame("samples/walk"),
+          AnimationFrame(4, 2),
+          AnimationFrame(3, 2),
+          ),
+         "crawl-left":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(21, 4),
+          AnimationFrame(20, 4),
+          ),
+         "jump-left":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/jump"),
+          MoveFrame(-8, -0),
+          AnimationFrame(9, 4),
+          MoveFrame(-8, -16),
+          AnimationFrame(10, 4),
+          MoveFrame(-8, 0),
+          AnimationFrame(11, 4),
+          MoveFrame(-8, -16),
+          AnimationFrame(3, 0),
+          CallbackFrame("doneJumping"),
+          ),
+         "jump-tube-left":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/jump"),
+          MoveFrame(-8, -0),
+          AnimationFrame(9, 4),
+          MoveFrame(-8, -16),
+          AnimationFrame(10, 4),
+          MoveFrame(-8, 0),
+          AnimationFrame(11, 4),
+          MoveFrame(-8, -16),
+          AnimationFrame(27, 0),
+          CallbackFrame("doneJumping"),
+          ),
+         "push-left":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/push"),
+          AnimationFrame(14, 2),
+          AnimationFrame(15, 2),
+          AnimationFrame(14, 2),
+          AnimationFrame(3, 0),
+          AttributeFrame("pushing", False),
+          ),
+         "tube-left":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(27, 0),
+          ),
+         "freeze-left":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(32, 2),
+          AnimationFrame(33, 4),
+          AnimationFrame(32, 2),
+          AnimationFrame(3, 0),
+          AttributeFrame("freezing", False),
+          ),
+         "crouch-freeze-left":
+         (ImageFrame(IMAGE, 32, 48),
+          AnimationFrame(24, 2),
+          AnimationFrame(25, 4),
+          AnimationFrame(24, 2),
+          AnimationFrame(20, 0),
+          AttributeFrame("freezing", False),
+          ),
+         "land-left":
+         (ImageFrame(IMAGE, 32, 48),
+          SoundFrame("samples/playerland"),
+          AnimationFrame(20, 4),
+          AnimationFrame(3, 0),
+          ),
+         }
+        )
 
     def __init__(self, x, y,
                  level,
@@ -26,211 +235,7 @@ class Player(PhysicsSprite):
             self,
             level,
             x, y, 32, 32,
-            {"default":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(0, 0),
-              ),
-             "die":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(28, 4),
-              AnimationFrame(29, 4),
-              JumpFrame(1),
-              ),
-             "falling":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/fall"),
-              AnimationFrame(16, 4),
-              AnimationFrame(17, 4),
-              JumpFrame(2),
-              ),
-             "happy":
-             (ImageFrame(self.IMAGE, 32, 48),
-              MoveFrame(0, -10),
-              AnimationFrame(16, 4),
-              MoveFrame(0, -4),
-              AnimationFrame(17, 4),
-              MoveFrame(0, -2),
-              AnimationFrame(16, 4),
-              MoveFrame(0, 2),
-              AnimationFrame(17, 4),
-              MoveFrame(0, 4),
-              AnimationFrame(17, 4),
-              MoveFrame(0, 10),
-              AnimationFrame(16, 4),
-              SoundFrame("samples/done"),
-              AnimationFrame(34, 64),
-              ),
-             # right side
-             "stand-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(0, 8),
-              AttributeFrame("direction", 1),
-              ),
-             "crouch-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(18, 8),
-              ),
-             "walk-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/walk"),
-              AnimationFrame(1, 2),
-              AnimationFrame(2, 2),
-              SoundFrame("samples/walk"),
-              AnimationFrame(1, 2),
-              AnimationFrame(0, 2),
-              ),
-             "crawl-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(19, 4),
-              AnimationFrame(18, 4),
-              ),
-             "jump-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/jump"),
-              MoveFrame(8, 0),
-              AnimationFrame(6, 4),
-              MoveFrame(8, -16),
-              AnimationFrame(7, 4),
-              MoveFrame(8, 0),
-              AnimationFrame(8, 4),
-              MoveFrame(8, -16),
-              AnimationFrame(0, 0),
-              CallbackFrame(self.doneJumping),
-              ),
-             "jump-tube-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/jump"),
-              MoveFrame(8, 0),
-              AnimationFrame(6, 4),
-              MoveFrame(8, -16),
-              AnimationFrame(7, 4),
-              MoveFrame(8, 0),
-              AnimationFrame(8, 4),
-              MoveFrame(8, -16),
-              AnimationFrame(26, 0),
-              CallbackFrame(self.doneJumping),
-              ),
-             "push-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/push"),
-              AnimationFrame(12, 2),
-              AnimationFrame(13, 2),
-              AnimationFrame(12, 2),
-              AnimationFrame(0, 0),
-              AttributeFrame("pushing", False),
-              ),
-             "tube-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(26, 0),
-              ),
-             "freeze-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(30, 2),
-              AnimationFrame(31, 4),
-              AnimationFrame(30, 2),
-              AnimationFrame(0, 0),
-              AttributeFrame("freezing", False),
-              ),
-             "crouch-freeze-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(22, 2),
-              AnimationFrame(23, 4),
-              AnimationFrame(22, 2),
-              AnimationFrame(18, 0),
-              AttributeFrame("freezing", False),
-              ),
-             "land-right":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/playerland"),
-              AnimationFrame(18, 4),
-              AnimationFrame(0, 0),
-              ),
-             # left side
-             "stand-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(3, 8),
-              AttributeFrame("direction", -1),
-              ),
-             "crouch-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(20, 8),
-              ),
-             "walk-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/walk"),
-              AnimationFrame(4, 2),
-              AnimationFrame(5, 2),
-              SoundFrame("samples/walk"),
-              AnimationFrame(4, 2),
-              AnimationFrame(3, 2),
-              ),
-             "crawl-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(21, 4),
-              AnimationFrame(20, 4),
-              ),
-             "jump-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/jump"),
-              MoveFrame(-8, -0),
-              AnimationFrame(9, 4),
-              MoveFrame(-8, -16),
-              AnimationFrame(10, 4),
-              MoveFrame(-8, 0),
-              AnimationFrame(11, 4),
-              MoveFrame(-8, -16),
-              AnimationFrame(3, 0),
-              CallbackFrame(self.doneJumping),
-              ),
-             "jump-tube-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/jump"),
-              MoveFrame(-8, -0),
-              AnimationFrame(9, 4),
-              MoveFrame(-8, -16),
-              AnimationFrame(10, 4),
-              MoveFrame(-8, 0),
-              AnimationFrame(11, 4),
-              MoveFrame(-8, -16),
-              AnimationFrame(27, 0),
-              CallbackFrame(self.doneJumping),
-              ),
-             "push-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/push"),
-              AnimationFrame(14, 2),
-              AnimationFrame(15, 2),
-              AnimationFrame(14, 2),
-              AnimationFrame(3, 0),
-              AttributeFrame("pushing", False),
-              ),
-             "tube-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(27, 0),
-              ),
-             "freeze-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(32, 2),
-              AnimationFrame(33, 4),
-              AnimationFrame(32, 2),
-              AnimationFrame(3, 0),
-              AttributeFrame("freezing", False),
-              ),
-             "crouch-freeze-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              AnimationFrame(24, 2),
-              AnimationFrame(25, 4),
-              AnimationFrame(24, 2),
-              AnimationFrame(20, 0),
-              AttributeFrame("freezing", False),
-              ),
-             "land-left":
-             (ImageFrame(self.IMAGE, 32, 48),
-              SoundFrame("samples/playerland"),
-              AnimationFrame(20, 4),
-              AnimationFrame(3, 0),
-              ),
-             },
+            self.ANIMATIONS,
             blocksGroup)
         self.eyecandy = eyecandy
         self.players = players
@@ -370,7 +375,7 @@ class Player(PhysicsSprite):
         if self.canMove():
             if (self.direction > 0
                 and self.x / 32 < self.level.width - 1
-                and not self.level[self.x / 32 + 1, self.y / 32 + 1]
+                and not self.level.isSolid(self.x / 32 + 1, self.y / 32 + 1)
                 and not self.fireGroup.getSprite(self.x + self.width,
                                                  self.y + self.height,
                                                  self.width,
@@ -398,9 +403,8 @@ class Player(PhysicsSprite):
                                       self.enemyGroup,
                                       self.eyecandy)
                     i.setAnimation("create")
-                    self.lightGroup.add(IceDust(self.x + 20,
-                                                self.y,
-                                                x, y, 1))
+                    emit(self.lightGroup, ICE_DUST_RIGHT,
+                         self.x + 20, self.y, 1, 2)
                     self.resources.playSound("samples/createice")
                 if self.blockedAbove():
                     self.setAnimation("crouch-freeze-right")
@@ -409,8 +413,8 @@ class Player(PhysicsSprite):
                 self.freezing = True
             elif (self.direction < 0
                   and self.x / 32 > 0
-                  and not self.level[(self.x - 1) / 32,
-                                     self.y / 32 + 1]
+                  and not self.level.isSolid((self.x - 1) / 32,
+                                            self.y / 32 + 1)
                   and not self.fireGroup.getSprite(self.x - self.width,
                                                    self.y + self.height,
                                                    self.width,
@@ -438,9 +442,8 @@ class Player(PhysicsSprite):
                                       self.enemyGroup,
                                       self.eyecandy)
                     i.setAnimation("create")
-                    self.lightGroup.add(IceDust(self.x - 20,
-                                                self.y,
-                                                x, y, -1))
+                    emit(self.lightGroup, ICE_DUST_LEFT,
+                         self.x - 20, self.y, -1, 2)
                     self.resources.playSound("samples/createice")
                 if self.blockedAbove():
                     self.setAnimation("crouch-freeze-left")
@@ -462,8 +465,8 @@ class Player(PhysicsSprite):
             self.dead = True
             self._finished = False
             self._deadCounter = 0
-            self.dieX = random.randint(-40, 40) / 10.0
-            self.dieY = random.randint(-80, -60) / 10.0
+            self.dieX = g_random.randint(-40, 40) / 10.0
+            self.dieY = g_random.randint(-80, -60) / 10.0
             self.setAnimation("die")
             self.resources.playSound("samples/playerdie")
 
@@ -483,11 +486,10 @@ class Player(PhysicsSprite):
             self.dieY += 0.5
             self._deadCounter += 1
             if self._deadCounter % 4 == 0:
-                self.lightGroup.add(Burning(self.x - random.randint(8, 24),
-                                            self.y - random.randint(8, 24),
-                                            0,
-                                            -1)
-                                )
+                emit(self.lightGroup, BURNING,
+                     self.x - g_random.randint(8, 24),
+                     self.y - g_random.randint(8, 24),
+                     0, -1)
         elif not self._finished:
             PhysicsSprite.physics(self)
             y = (self.y - self.height + 1) // 32
@@ -619,9 +621,13 @@ class Player(PhysicsSprite):
         self.x = (self.x / 32) * 32
         self.y = (self.y / 32) * 32
 
-    def draw(self, surface):
+    def drawRect(self, offsetX = 0, offsetY = 0):
+        return pygame.Rect(self.x + offsetX, self.y - 16 + offsetY,
+                           self.width, self.height + 16)
+
+    def draw(self, surface, offsetX = 0, offsetY = 0):
         surface.blit(self.image,
-                     (self.x, self.y - 16),
+                     (self.x + offsetX, self.y - 16 + offsetY),
                      (self._frameIndex * self.width,
                       0, self.width, self.height + 16)
                      )
@@ -41,7 +41,23 @@ def mov2_seeker(self):
     self.y+=self.heading[1]*self.fasteness
 
 
+def _seekerAnimations():
+    d={"default":   (ImageFrame("sprites/seeker3x18", 18, 18),
+                    CallbackFrame("setInitialAnimation"))}
+    for i in range(0,16):
+        d["%d"%i]=(
+            ImageFrame("sprites/seeker3x18", 18, 18),
+            AnimationFrame(i*4,2),
+            AnimationFrame(i*4+1,2),
+            AnimationFrame(i*4+2,2),
+            AnimationFrame(i*4+3,2),
+            JumpFrame(i*4) )
+    return Animations(d)
+
+
 class Seeker(AnimatedSprite):
+    ANIMATIONS = _seekerAnimations()
+
     def __init__(self, x, y, heading,fasteness,target):
         self.xx0 = x; self.yy0=y
         self.fasteness = fasteness
@@ -52,23 +68,16 @@ class Seeker(AnimatedSprite):
             n2=heading[1]=1.0
         self.heading =[ heading[0]/n2 , heading[1]/n2 ]
         self.angle0 = angle_from_heading(self.heading)
-        initial_anim = "%d"%self.angle0
+        self.initialAnimation = "%d"%self.angle0
 
         self.subgroup = 'seeker'
-        d={"default":   (ImageFrame("sprites/seeker3x18", 18, 18),
-                        CallbackFrame(self.setAnimation, initial_anim))}
-        for i in range(0,16):
-            d["%d"%i]=(
-                ImageFrame("sprites/seeker3x18", 18, 18),
-                AnimationFrame(i*4,2),
-                AnimationFrame(i*4+1,2),
-                AnimationFrame(i*4+2,2),
-                AnimationFrame(i*4+3,2),
-                JumpFrame(i*4) )
-                
         self.mov = mov1_seeker
 
-        AnimatedSprite.__init__(self, x, y, 18, 18, d ,'default')
+        AnimatedSprite.__init__(self, x, y, 18, 18, self.ANIMATIONS,
+                                'default')
+
+    def setInitialAnimation(self):
+        self.setAnimation(self.initialAnimation)
 
     def event_mov1_terminated(self):
         self.mov=mov2_seeker
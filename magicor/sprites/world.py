@@ -5,56 +5,71 @@ Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 (see LICENSE for more info)
 """
 
-import random,math
+import math
 
 from magicor.sprites import *
 from magicor.sprites.blocks import Ice
 from magicor.sprites.seekers import Seeker
-from magicor import Text, g_groups
+from magicor import Text, g_groups, g_random
 
 class Lava(AnimatedSprite):
-    
+    _animationTables = {}
+
+    @classmethod
+    def getAnimations(cls, s, x):
+        """
+        Returns the animations shared by lava using the image s at x,
+        the flow is offset by the column.
+        """
+        animations = cls._animationTables.get((s, x))
+        if animations is None:
+            animations = Animations(
+                {"default": (ImageFrame(s, 32, 64),
+                             AnimationFrame((0+x/32)%12, 2),
+                             AnimationFrame((1+x/32)%12, 2),
+                             AnimationFrame((2+x/32)%12, 2),
+                             AnimationFrame((3+x/32)%12, 2),
+                             AnimationFrame((4+x/32)%12, 2),
+                             AnimationFrame((5+x/32)%12, 2),
+                             AnimationFrame((6+x/32)%12, 2),
+                             AnimationFrame((7+x/32)%12, 2),
+                             AnimationFrame((8+x/32)%12, 2),
+                             AnimationFrame((9+x/32)%12, 2),
+                             AnimationFrame((10+x/32)%12, 2),
+                             AnimationFrame((11+x/32)%12, 2),
+                             JumpFrame(1)),
+                "dormant": (ImageFrame(s, 32, 64),
+                            AnimationFrame(12, 8),),
+                "erupt": (ImageFrame(s, 32, 64),
+                          AnimationFrame(12, 2),
+                          AnimationFrame(13, 2),
+                          AnimationFrame(14, 2),
+                          AnimationFrame(15, 2),
+                          AnimationFrame(16, 2),
+                          AnimationFrame(17, 2),
+                          AnimationFrame(18, 2),
+                          CallbackFrame("ignitePeers")),
+##                          AnimationFrame(0, 4),
+##                          AnimationFrame(1, 4),
+##                          AnimationFrame(2, 4),
+##                          AnimationFrame(3, 4),
+##                          AnimationFrame(4, 4),
+##                          AnimationFrame(5, 4),
+##                          AnimationFrame(6, 4),
+##                          AnimationFrame(7, 4),
+##                          JumpFrame(8)),
+                 }
+                )
+            cls._animationTables[(s, x)] = animations
+        return animations
+
     def __init__(self, x, y, blocksGroup, players, fireGroup,
                  worldGroup, dormant,bSpiting,t):
         if bSpiting: s="sprites/spiting_lava"
         else: s="sprites/lava"
         AnimatedSprite.__init__(
             self, x, y, 32, 64,
-            {"default": (ImageFrame(s, 32, 64),
-                         AnimationFrame((0+x/32)%12, 2),
-                         AnimationFrame((1+x/32)%12, 2),
-                         AnimationFrame((2+x/32)%12, 2),
-                         AnimationFrame((3+x/32)%12, 2),
-                         AnimationFrame((4+x/32)%12, 2),
-                         AnimationFrame((5+x/32)%12, 2),
-                         AnimationFrame((6+x/32)%12, 2),
-                         AnimationFrame((7+x/32)%12, 2),
-                         AnimationFrame((8+x/32)%12, 2),
-                         AnimationFrame((9+x/32)%12, 2),
-                         AnimationFrame((10+x/32)%12, 2),
-                         AnimationFrame((11+x/32)%12, 2),
-                         JumpFrame(1)),
-            "dormant": (ImageFrame(s, 32, 64),
-                        AnimationFrame(12, 8),),
-            "erupt": (ImageFrame(s, 32, 64),
-                      AnimationFrame(12, 2),
-                      AnimationFrame(13, 2),
-                      AnimationFrame(14, 2),
-                      AnimationFrame(15, 2),
-                      AnimationFrame(16, 2),
-                      AnimationFrame(17, 2),
-                      AnimationFrame(18, 2),
-                      CallbackFrame(self.ignitePeers)),
-##                      AnimationFrame(0, 4),
-##                      AnimationFrame(1, 4),
-##                      AnimationFrame(2, 4),
-##                      AnimationFrame(3, 4),
-##                      AnimationFrame(4, 4),
-##                      AnimationFrame(5, 4),
-##                      AnimationFrame(6, 4),
-##                      AnimationFrame(7, 4),
-##                      JumpFrame(8)),
-             }
+            self.getAnimations(s, x)
             )
         self.dormant = dormant
         self.bSpiting = bSpiting
@@ -93,16 +108,21 @@ class Lava(AnimatedSprite):
 
     def update(self):
         AnimatedSprite.update(self)
+        # only what is in the top cell can be where the lava is
+        if self.contacts is None and self.worldGroup.occupancy is not None:
+            self.listen(self.worldGroup.occupancy,
+                        self.worldGroup.occupancy.cells(
+                            pygame.Rect(self.x, self.y, 1, 1)))
         if self.dormant:
-            for fire in self.fireGroup.sprites():
+            for fire in self.touching(self.fireGroup):
                 if fire.x == self.x and fire.y == self.y:
                     self.erupt()
         else:
-            for block in self.blocksGroup.sprites():
+            for block in self.touching(self.blocksGroup):
                 if (isinstance(block, Ice)
                     and block.x == self.x and block.y == self.y):
                     block.melt()
-            for player in self.players.sprites():
+            for player in self.touching(self.players):
                 if (player.x == self.x
                     and player.y == self.y
                     and not player.dead):
@@ -117,7 +137,14 @@ class Lava(AnimatedSprite):
             
 
 class Tube(PhysicsSprite):
-    
+    """
+    Tubes put the player out of a matching tube, see getMatching().
+    """
+    # the cell in front of the mouth of a tube by its direction
+    MOUTHS = {"left": (-1, 0), "right": (1, 0), "up": (0, -1),
+              "down": (0, 1)}
+    registry = None
+
     def __init__(self, x, y, level, direction, name, blocks,
                  worldGroup, players):
         PhysicsSprite.__init__(
@@ -146,6 +173,14 @@ class Tube(PhysicsSprite):
     def testFall(self):
         return False
 
+    def update(self):
+        resting = not self.falling and not self.moving and self.isDone()
+        PhysicsSprite.update(self)
+        # tubes never move, once still nothing but an animation wakes them
+        if (resting and not self.falling and not self.moving
+            and self.worldGroup.occupancy is not None):
+            self.sleep(self.worldGroup.occupancy)
+
     def bounce(self, player):
         if self.direction == "left":
             player.x = self.x - 4
@@ -180,7 +215,21 @@ class Tube(PhysicsSprite):
             return True
         return False
             
+    def mouth(self):
+        """
+        The cell in front of the mouth of the tube.
+        """
+        dx, dy = self.MOUTHS.get(self.direction, (0, 0))
+        return int(self.x) // 32 + dx, int(self.y) // 32 + dy
+
     def getMatching(self):
+        """
+        Returns the first other tube of the same name not blocked, or
+        for unnamed tubes any other tube at random. None is returned if
+        there is no such tube.
+        """
+        if self.registry is not None and self in self.registry:
+            return self.registry.getMatching(self)
         if self.name:
             for tube in self.worldGroup:
                 if (isinstance(tube, Tube)
@@ -194,7 +243,7 @@ class Tube(PhysicsSprite):
                 if isinstance(tube, Tube) and tube != self:
                     tubes.append(tube)
             if tubes:
-                return tubes[random.randint(0, len(tubes) - 1)]
+                return tubes[g_random.randint(0, len(tubes) - 1)]
         return None
 
     def output(self, player):
@@ -225,8 +274,65 @@ class Tube(PhysicsSprite):
                 player.y = tube.y
                 player.vertical = -8
 
-    def draw(self, surface):
-        PhysicsSprite.draw(self, surface)
+    def draw(self, surface, offsetX = 0, offsetY = 0):
+        PhysicsSprite.draw(self, surface, offsetX, offsetY)
+
+class TubeRegistry(object):
+    """
+    The tubes of a level, the named ones by name, to match tubes
+    without looking through the world group.
+
+    Whether a tube is blocked is asked once and kept as long as no
+    block is in the cell in front of its mouth, the tiles there never
+    change; with blocks there it is asked every time. The occupancy
+    grid counts the blocks of the cell.
+    """
+
+    def __init__(self, tubes, occupancy, blocks):
+        self.tubes = list(tubes)
+        self.occupancy = occupancy
+        self.blocks = blocks
+        self._indexes = dict((tube, i) for i, tube in enumerate(self.tubes))
+        self._named = {}
+        self._blocked = {}
+        for tube in self.tubes:
+            if tube.name:
+                self._named.setdefault(tube.name, []).append(tube)
+            tube.registry = self
+
+    def __contains__(self, tube):
+        return tube in self._indexes
+
+    def blocked(self, tube):
+        """
+        Tube.blocked() of the tube.
+        """
+        cx, cy = tube.mouth()
+        if self.occupancy.count(self.blocks, cx, cy):
+            return tube.blocked()
+        blocked = self._blocked.get(tube)
+        if blocked is None:
+            blocked = self._blocked[tube] = tube.blocked()
+        return blocked
+
+    def getMatching(self, tube):
+        """
+        Tube.getMatching() of the tube, the random tube is drawn the
+        same way.
+        """
+        if tube.name:
+            for other in self._named[tube.name]:
+                if other != tube and not self.blocked(other):
+                    return other
+            return None
+        count = len(self.tubes) - 1
+        if count > 0:
+            i = g_random.randint(0, count - 1)
+            if i >= self._indexes[tube]:
+                i += 1
+            return self.tubes[i]
+        return None
+
 
 class Trapola(AnimatedSprite):
     def __init__(self, x, y):
@@ -273,6 +379,7 @@ class Trapola(AnimatedSprite):
     def eventExplode(self):
         #HERE: start box animation, including sound effects
         self.explodeStage=1
+        self.unlisten()
         self.setAnimation("explode")
         # setAnimation at fault or missing feature?
         self.width = 64
@@ -283,7 +390,12 @@ class Trapola(AnimatedSprite):
             #if any sprite except decoration and light touches, then trigger the trapola
             for k,group in g_groups.items():
                 if k!='decorations' and k!='world':
-                    s=pygame.sprite.spritecollideany(self,group)
+                    if self.contacts is None and group.occupancy is not None:
+                        # only what enters the cells can touch it
+                        self.listen(group.occupancy,
+                                    group.occupancy.cells(self.rect))
+                    s=pygame.sprite.spritecollideany(self,
+                                                     self.touching(group))
                     if s:
                         self.eventExplode()
                         break
@@ -306,6 +418,12 @@ class Trapola(AnimatedSprite):
                     g_groups['stones'].add(Seeker(x+heading[0]*4., y+heading[1]*4., heading,3.,target))
 
 
+    def drawRect(self, offsetX = 0, offsetY = 0):
+        if self.explodeStage!=0:
+            offsetX -= 16
+            offsetY -= 16
+        return AnimatedSprite.drawRect(self, offsetX, offsetY)
+
     def draw(self, surface, offsetX = 0, offsetY = 0):
         if self.explodeStage!=0:
             #correct for bigger size
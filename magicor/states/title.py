@@ -4,11 +4,10 @@ All title-like (intros, level selection, etc) states are here.
 Copyright 2006  Peter Gebauer. Licensed as Public Domain.
 (see LICENSE for more info)
 """
-import math, warnings, random, os
+import math, warnings, random
 import pygame
 
 from magicor import Text
-from magicor.level import Level
 from magicor.resources import ResourceNotFound
 from magicor.states import MenuState, BaseState
 from magicor.states.play import PlayState
@@ -137,20 +136,17 @@ class LevelSelectState(BaseState):
         self.shadeSurface.fill(0)
         self.shadeSurface.set_alpha(64)
         self.renderSurface = pygame.Surface((640, 576), pygame.HWSURFACE, 32)
-        self.renderSurface.set_colorkey(0)
+        # only redrawn when another level is selected
+        self.renderSurface.set_colorkey(0, pygame.RLEACCEL)
         self.scrollAngle = 0
         self.screen.fill(0)
         self.rotoAngle = 0
         self.text = Text(self.screen, self.resources["fonts/info"])
-        self.levelPaths = {}
-        for path, levelInfo in self.resources.loadLevelData():
-            for filename, data in levelInfo:
-                theme = os.path.dirname(filename[len(path):])[1:]
-                if not theme.startswith("_") or config.get("devmode"):
-                    level = Level(data)
-                    level.theme = theme or None
-                    self.levels.append(level)
-                    self.levelPaths[level] = path + filename
+        # catalog entries, a level is parsed when it is shown or played
+        for entry in self.resources.loadLevelCatalog():
+            if (not (entry.theme or "").startswith("_")
+                or config.get("devmode")):
+                self.levels.append(entry)
         #self.levels.sort(lambda x, y:
         #                 cmp(x.theme, y.theme)
         #                 or cmp(x.title, y.title))
@@ -185,7 +181,7 @@ class LevelSelectState(BaseState):
             self.setNext(PlayState(self.config,
                                    self.data,
                                    self.screen,
-                                   self.levels[self.selected],
+                                   self.levels[self.selected].getLevel(),
                                    LevelSelectState))
         elif self.controls.up:
             self.resources.playSound("samples/menu")
@@ -207,7 +203,7 @@ class LevelSelectState(BaseState):
                 try:
                     if not self.loaded:
                         self.resources.clearLevelResources()
-                        lp = self.levelPaths[self.levels[self.selected]]
+                        lp = self.levels[self.selected].filename
                         self.resources.addLevelResources(lp)
                         self.loaded = True
                     if self.selected < 0:
@@ -217,7 +213,7 @@ class LevelSelectState(BaseState):
                     self.data.lastLevel = self.levels[self.selected].id
                     self.renderLevel(self.renderSurface)
                     rendered = True
-                except (ValueError, ResourceNotFound) as e:
+                except (ValueError, ResourceNotFound, IOError) as e:
                     warnings.warn("Unable to init level-Resource not found: %s"%e)
                     del self.levels[self.selected]
 
@@ -278,7 +274,7 @@ class LevelSelectState(BaseState):
             self.text.draw("Error: no levels found!", 0, 0)
 
     def renderLevel(self, surface):
-        level = self.levels[self.selected]
+        level = self.levels[self.selected].getLevel()
         surface.fill(0)
         for y in range(level.height):
             for x in range(level.width):
@@ -0,0 +1,494 @@
+"""
+The level simulation, separated from any game state and display.
+
+A World is built from a Level and advanced one tick at a time with
+step(). Rendering is optional, so a world can be simulated headless
+(see initHeadless) as fast as the CPU allows.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import os, random
+import pygame
+
+from magicor import set_group, g_random
+from magicor.resources import getResources
+from magicor.sprites import AnimationGroup
+from magicor.sprites.occupancy import OccupancyGrid
+from magicor.sprites.navigation import Navigation
+from magicor.sprites.blocks import BlocksGroup, NormalIce
+from magicor.sprites.world import Lava, Tube, TubeRegistry, Trapola
+from magicor.sprites.fires import Fire
+from magicor.sprites.player import Player
+from magicor.sprites.stones import Ball
+from magicor.sprites.decorations import Decoration
+from magicor.sprites.enemies import (WalkingEnemy,
+                                     ClimbingEnemy,
+                                     StationaryEnemy)
+from magicor.sprites.misc import Direction
+
+RESOURCE_PREFIXES = ("tiles", "sprites", "samples", "fonts", "sounds")
+
+def initHeadless(paths = ["data"], defaultTile = "tiles/stone"):
+    """
+    Initializes pygame with the SDL dummy drivers and loads the
+    resources a World needs, without opening a window or audio device.
+    Returns the resources instance.
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.display.init()
+    resources = getResources(paths=paths, sound=False, music=False)
+    for prefix in RESOURCE_PREFIXES:
+        resources.addResources(prefix)
+    resources.setDefaultTile(resources[defaultTile])
+    return resources
+
+
+class World(object):
+    """
+    All sprites of a level and the rules advancing them.
+
+    The inputs given to step() are any object with the boolean
+    attributes left, right, up, down and action, such as Controls.
+
+    With interpolate set, every tick remembers where the sprites were
+    so render() can draw them in between two ticks.
+
+    The world seeds the random generator of the simulation, g_random,
+    with the given seed or a random one kept in the seed attribute. The
+    same seed and inputs always play out the same way.
+    """
+
+    def __init__(self, level, eyecandy = True, interpolate = False,
+                 seed = None):
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        g_random.seed(seed)
+        self.level = level
+        self.eyecandy = eyecandy
+        self.interpolate = interpolate
+        self.resources = getResources()
+        self.blocks = BlocksGroup()
+        set_group( 'blocks', self.blocks )
+        self.decorations = AnimationGroup()
+        self.fires = AnimationGroup()
+        set_group( 'fires', self.fires )
+        self.world = AnimationGroup()
+        set_group( 'world', self.world )
+        self.lights = AnimationGroup()
+        self.enemies = AnimationGroup()
+        set_group( 'enemies', self.enemies )
+        self.players = AnimationGroup()
+        set_group( 'players', self.players )
+        self.stones = AnimationGroup()
+        set_group( 'stones', self.stones )
+        self.hudSprites = AnimationGroup()
+        self.occupancy = None
+        self.navigation = None
+        self.tubes = None
+        self.player = None
+        self.cleared = False
+        self.ticks = 0
+        self.background = None
+        self.levelSurface = None
+        self._drawn = None
+
+    def initializeSprites(self):
+        """
+        Creates the sprites listed in the level.
+        Raises ValueError on invalid sprite arguments or a missing player.
+        """
+        for s in self.level.sprites:
+            x, y, name, arg = s.x, s.y, s.name, s.args
+            if name == "player":
+                self.player = Player(x * 32, y * 32,
+                                     self.level,
+                                     self.players,
+                                     self.blocks,
+                                     self.fires,
+                                     self.world,
+                                     self.lights,
+                                     self.enemies,
+                                     self.eyecandy)
+                if arg == "left":
+                    self.player.setAnimation("stand-left")
+                self.players.add(self.player)
+            elif name.startswith("ice"):
+                ice = NormalIce(x * 32,
+                                y * 32,
+                                self.level,
+                                self.blocks,
+                                self.lights,
+                                self.players,
+                                self.enemies,
+                                self.eyecandy)
+                if arg == "connect":
+                    ice.addConnections()
+                elif arg == "connect-left":
+                    ice.addConnections(-1)
+                elif arg == "connect-right":
+                    ice.addConnections(1)
+            elif name == "lava":
+                ##->@@spitting lava modifications
+                bSpiting = False
+                t=None
+                if arg is None:
+                    bDormant=False
+                else:
+                    spl=arg.split(' ')
+                    if  spl[0]=='dormant':
+                        bDormant=True
+                    else:
+                        bSpiting=True
+                        bDormant=bool(spl[0]=='spit_dorm')
+                        if len(spl)<2: t=16
+                        else: t = int(spl[3])
+                self.world.add(Lava(x * 32, y * 32,
+                                    self.blocks,
+                                    self.players,
+                                    self.fires,
+                                    self.world,
+                                    bDormant,
+                                    bSpiting,
+                                    t))
+                ##<-@@spitting lava modifications
+            elif name == "fire":
+                self.fires.add(Fire(x * 32, y * 32,
+                                    self.level,
+                                    self.blocks,
+                                    self.lights,
+                                    self.players,
+                                    arg != "nofall"))
+            elif name == "tube":
+                spl = arg.split(" ", 1)
+                if len(spl) < 1:
+                    raise ValueError("tube sprites require direction and "
+                                     "optional name arguments")
+                elif len(spl) == 2:
+                    name = spl[1]
+                else:
+                    name = None
+                tube = Tube(x * 32, y * 32,
+                            self.level,
+                            spl[0], name,
+                            self.blocks,
+                            self.world,
+                            self.players)
+                self.world.add(tube)
+                self.level[x, y] = "!"
+            elif name == "decoration":
+                spl = arg.split(" ", 3)
+                if len(spl) < 4:
+                    raise ValueError("decoration sprites requires resource, "
+                                     "width, height and speed arguments")
+                self.decorations.add(
+                    Decoration(spl[0],
+                               x * 32, y * 32,
+                               int(spl[1]),
+                               int(spl[2]),
+                               int(spl[3].strip()))
+                    )
+            elif name in ("walking-enemy", "climbing-enemy"):
+                spl = arg.split(" ", 3)
+                if len(spl) != 4:
+                    raise ValueError("walking/climbing-emeny sprites requires "
+                                     "direction, image resource, sound "
+                                     "resource and speed "
+                                     "arguments")
+                s = int(spl[3])
+                if name.startswith("walking"):
+                    type_ = WalkingEnemy
+                else:
+                    type_ = ClimbingEnemy
+                self.enemies.add(type_(x * 32, y * 32,
+                                       spl[0],
+                                       spl[1],
+                                       spl[2],
+                                       s,
+                                       self.level,
+                                       self.blocks,
+                                       self.players,
+                                       self.fires,
+                                       self.world))
+            elif name == "stationary-enemy":
+                spl = arg.split(" ", 3)
+                if len(spl) != 4:
+                    raise ValueError("stationary-emeny sprites requires "
+                                     "direction, image resource, "
+                                     "sound resource "
+                                     "and trigger period")
+                t = int(spl[3])
+                self.enemies.add(StationaryEnemy(x * 32, y * 32,
+                                                 spl[0],
+                                                 spl[1],
+                                                 spl[2],
+                                                 t,
+                                                 self.level,
+                                                 self.blocks,
+                                                 self.players,
+                                                 self.fires,
+                                                 self.world))
+            elif name == "ball":
+                 bReadOk, direction, fasteness, dvy = Ball.parse(arg)
+                 if bReadOk:
+                     self.stones.add(Ball(self.level, x*32, y*32,direction,fasteness,dvy))
+
+            elif name == "trapola":
+                self.world.add(Trapola(x*32,y*32-1))
+                if not self.level[x,y]:
+                    #TODO: put a suitable tile if empty - at this time level
+                    #designers should put a tile behind the trapola
+                    self.level[x, y] = "!"
+
+            elif name == "direction":
+                self.hudSprites.add(Direction(x * 32, y * 32, arg))
+        if not self.player:
+            raise ValueError("no player on level")
+        # made last, tubes and trapolas put tiles in the level, the
+        # groups the physics asks for what is in the way
+        self.occupancy = OccupancyGrid(self.level)
+        for group in (self.blocks, self.players, self.enemies, self.fires,
+                      self.world, self.stones):
+            self.occupancy.watch(group)
+        self.navigation = Navigation(self.occupancy, self.blocks, self.fires,
+                                     self.world)
+        for enemy in self.enemies:
+            enemy.navigation = self.navigation
+        self.tubes = TubeRegistry([sprite for sprite in self.world
+                                   if isinstance(sprite, Tube)],
+                                  self.occupancy, self.blocks)
+
+    def over(self):
+        """
+        True when the player is gone or done celebrating.
+        """
+        return bool(not self.player.alive()
+                    or (self.player._finished and self.player.isDone()))
+
+    def step(self, inputs = None):
+        """
+        Advances the simulation one tick. The inputs are handed to the
+        player after the sprites have moved, the same way PlayState
+        controls the player after each frame, so they take effect on
+        the next tick.
+        """
+        if (not self.over()
+            and not self.player._finished and self.fires.count() == 0
+            and not self.player.dead):
+            self.player.finished()
+            self.cleared = True
+        if self.interpolate:
+            self.savePositions()
+        self.fires.update()
+        self.players.update()
+        self.enemies.update()
+        self.world.update()
+        self.blocks.update()
+        self.stones.update()
+        self.decorations.update()
+        if self.eyecandy:
+            self.lights.update()
+        self.hudSprites.update()
+        if inputs:
+            self.control(inputs)
+        self.ticks += 1
+
+    def control(self, inputs):
+        if inputs.left:
+            self.player.goLeft()
+        elif inputs.right:
+            self.player.goRight()
+        elif inputs.down:
+            self.player.goDown()
+        elif inputs.up:
+            self.player.goUp()
+        elif inputs.action:
+            self.player.manipulateIce()
+
+    def animate(self):
+        """
+        Animates the world without moving anything, used while a level
+        is fading in or out.
+        """
+        if self.interpolate:
+            self.savePositions()
+        self.blocks.animateShine()
+        self.fires.animate()
+        self.world.animate()
+        self.lights.update()
+        self.decorations.animate()
+        self.hudSprites.update()
+
+    def savePositions(self):
+        for group in (self.fires, self.enemies, self.blocks, self.players,
+                      self.world, self.decorations, self.stones,
+                      self.lights, self.hudSprites):
+            group.savePositions()
+
+    def drawnGroups(self):
+        """
+        The groups render() draws, in drawing order.
+        """
+        groups = [self.fires, self.enemies, self.blocks, self.players,
+                  self.world, self.decorations, self.stones]
+        if self.eyecandy:
+            groups.append(self.lights)
+        groups.append(self.hudSprites)
+        return groups
+
+    def shouldRender(self, x, y):
+        v = self.level[x, y]
+        if v and v != "!":
+            return v
+        return None
+
+    def renderLevel(self):
+        """
+        Renders background and tiles to the cached level surface.
+        Raises ResourceNotFound if a tile resource is missing.
+        """
+        level = self.level
+        if level.background:
+            self.background = self.resources.loadImage("%s"%level.background,
+                                                       False)
+        surface = pygame.Surface((level.width * 32, level.height * 32),
+                                 pygame.HWSURFACE, 32)
+        self.levelSurface = surface
+        if self.background:
+            w, h = self.background.get_width(), self.background.get_height()
+            for y in range(0, 576, h):
+                for x in range(0, 640, w):
+                    surface.blit(self.background, (x, y))
+            surface.fill(0, (0, 576, 640, 64))
+        else:
+            surface.fill(0)
+        for y in range(self.level.height):
+            for x in range(self.level.width):
+                if self.shouldRender(x, y):
+                    if self.level.shadows:
+                        surface.blit(
+                            self.resources["tiles/shadow"], (x * 32, y * 32))
+                    surface.blit(self.resources.getTile("%s"%self.level[x, y]),
+                                 (x * 32, y * 32), (0, 0, 32, 32))
+                elif (x > 0 and y > 0
+                      and self.shouldRender(x - 1, y)
+                      and self.shouldRender(x, y - 1)):
+                    surface.blit(
+                        self.resources.getTile("%s"%self.level[x - 1, y]),
+                        (x * 32, y * 32),
+                        (32, 0, 32, 32))
+                elif (x < self.level.width - 1
+                      and y > 0
+                      and self.shouldRender(x + 1, y)
+                      and self.shouldRender(x, y - 1)):
+                    surface.blit(
+                        self.resources.getTile("%s"%self.level[x + 1, y]),
+                        (x * 32, y * 32),
+                        (64, 0, 32, 32))
+                elif (x < self.level.width - 1
+                      and y < self.level.height - 1
+                      and self.shouldRender(x + 1, y)
+                      and self.shouldRender(x, y + 1)):
+                    surface.blit(
+                        self.resources.getTile("%s"%self.level[x + 1, y]),
+                        (x * 32, y * 32),
+                        (96, 0, 32, 32))
+                elif (x > 0
+                      and y < self.level.height - 1
+                      and self.shouldRender(x - 1, y)
+                      and self.shouldRender(x, y + 1)):
+                    surface.blit(
+                        self.resources.getTile("%s"%self.level[x - 1, y]),
+                        (x * 32, y * 32),
+                        (128, 0, 32, 32))
+        return surface
+
+    def render(self, surface, alpha = None):
+        """
+        Draws the level and all sprites on the surface. The alpha
+        (0.0 - 1.0) draws the sprites that far between their position
+        of the previous tick and the current one, None draws them where
+        they are.
+        """
+        if not self.levelSurface:
+            self.renderLevel()
+        surface.blit(self.levelSurface, (0, 0))
+        for group in self.drawnGroups():
+            group.draw(surface, alpha)
+        self._drawn = None
+
+    def _drawnSprites(self, alpha):
+        """
+        Returns the areas and state of every sprite, as compared by
+        renderDirty().
+        """
+        drawn = {}
+        for group in self.drawnGroups():
+            for sprite in group.sprites():
+                if alpha is None:
+                    rects = sprite.drawRects()
+                else:
+                    rects = sprite.drawRects(*sprite.interpolate(alpha))
+                # sprites are positioned with sub-pixel precision
+                for rect in rects:
+                    rect.inflate_ip(2, 2)
+                drawn[sprite] = (rects, (sprite.image, sprite._frameIndex,
+                                         sprite.drawState()))
+        return drawn
+
+    def renderDirty(self, surface, alpha = None):
+        """
+        Like render(), but assumes the surface still holds what the
+        previous call drew and only redraws the sprites that changed.
+        The background is restored from the level surface under the old
+        and new areas of the changed sprites, then every sprite touching
+        those areas is drawn again, in order.
+        Returns the list of changed areas of the surface.
+        """
+        drawn = self._drawnSprites(alpha)
+        previous = self._drawn
+        if previous is None:
+            self.render(surface, alpha)
+            self._drawn = drawn
+            return [surface.get_rect()]
+        self._drawn = drawn
+        dirty = []
+        for sprite, (rects, state) in drawn.items():
+            old = previous.pop(sprite, None)
+            if old is None:
+                dirty.extend(rects)
+            elif old[0] != rects or old[1] != state:
+                dirty.extend(old[0])
+                dirty.extend(rects)
+        # what is left has been removed since the last call
+        for rects, state in previous.values():
+            dirty.extend(rects)
+        if not dirty:
+            return []
+        # a sprite drawn over a dirty area has to be drawn again, and
+        # so has everything overlapping that sprite
+        redraw = set()
+        rest = list(drawn.items())
+        while rest:
+            left = []
+            for sprite, (rects, state) in rest:
+                for rect in rects:
+                    if rect.collidelist(dirty) >= 0:
+                        redraw.add(sprite)
+                        dirty.extend(rects)
+                        break
+                else:
+                    left.append((sprite, (rects, state)))
+            if len(left) == len(rest):
+                break
+            rest = left
+        for rect in dirty:
+            surface.blit(self.levelSurface, rect, rect)
+        for group in self.drawnGroups():
+            sprites = [s for s in group.sprites() if s in redraw]
+            if sprites:
+                group.draw(surface, alpha, sprites)
+        bounds = surface.get_rect()
+        return [rect.clip(bounds) for rect in dirty]
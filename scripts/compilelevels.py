@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+#
+# Magicor
+# Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+# (see LICENSE for more info)
+"""
+Compiles level files to the binary level format.
+
+Every .lvl file in the given directories and the directories below them
+is compiled to a .lvlc file next to it, which the game loads instead of
+the level file for as long as the level file is not changed. Each
+compiled level is checked to load as the same level as the level file.
+
+Usage: python scripts/compilelevels.py [options] [directory...]
+"""
+import os, sys, warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from optparse import OptionParser
+from magicor.level import Level, compileLevel, compiledFilename
+
+
+def findLevels(path):
+    ret = []
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            if f.endswith(".lvl"):
+                ret.append(os.path.join(root, f))
+    ret.sort()
+    return ret
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [directory...]")
+    parser.add_option("-r", "--remove", action="store_true", dest="remove",
+                      default=False, help="remove the compiled files instead")
+    parser.add_option("-q", "--quiet", action="store_true", dest="quiet",
+                      default=False, help="only print errors")
+    (options, args) = parser.parse_args()
+    warnings.simplefilter("ignore")
+    failed = 0
+    for path in args or ["data/levels"]:
+        for filename in findLevels(path):
+            compiled = compiledFilename(filename)
+            if options.remove:
+                if os.path.exists(compiled):
+                    os.remove(compiled)
+                continue
+            try:
+                compileLevel(filename)
+                with open(filename) as f:
+                    level = Level(f.read())
+                with open(compiled, "rb") as f:
+                    loaded = Level.fromBinary(f.read())
+                if str(loaded) != str(level) or loaded.id != level.id:
+                    raise ValueError("compiled level differs")
+            except (IOError, OSError, ValueError) as e:
+                print("%s: %s"%(filename, e))
+                if os.path.exists(compiled):
+                    os.remove(compiled)
+                failed += 1
+                continue
+            if not options.quiet:
+                print("%s: %d bytes"%(compiled, os.path.getsize(compiled)))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Unit tests of Magicor, run with "make test".
+
+The tests run headless on the shipped data, see headless() and
+loadWorld().
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import os, io, contextlib, warnings
+
+from magicor.level import Level
+from magicor.replay import Replay
+from magicor.world import World, initHeadless
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(BASE_PATH, "data")
+
+
+class Pressed(object):
+    """
+    Input for World.step() and World.control() with one of the buttons
+    pressed, or none.
+    """
+
+    def __init__(self, name = None):
+        for button in Replay.BUTTONS:
+            setattr(self, button, button == name)
+
+
+def headless():
+    """
+    Returns the resources of the shipped data, without a window.
+    """
+    warnings.simplefilter("ignore")
+    # resources are chatty about every file they load
+    with contextlib.redirect_stdout(io.StringIO()):
+        return initHeadless([DATA_PATH])
+
+
+def loadWorld(name, seed = 1, eyecandy = True):
+    """
+    Returns a World of the shipped level with its sprites created, name
+    being the file name relative to data/levels.
+    """
+    resources = headless()
+    filename = os.path.join(DATA_PATH, "levels", name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        resources.clearLevelResources()
+        resources.addLevelResources(filename)
+    with open(filename) as f:
+        world = World(Level(f.read()), eyecandy, seed = seed)
+    world.initializeSprites()
+    return world
@@ -0,0 +1,98 @@
+"""
+Tests of the contacts of sprites listening to the occupancy grid.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import random, unittest
+
+from magicor.replay import Replay
+from magicor.sprites import AnimatedSprite
+from tests import Pressed, loadWorld
+
+MOVES = Replay.BUTTONS + (None, None)
+
+
+def watched(world):
+    return (world.players, world.blocks, world.fires, world.enemies,
+            world.world, world.stones)
+
+
+def positions(world):
+    return [(type(s).__name__, s.x, s.y, s._animationName)
+            for group in watched(world) for s in group]
+
+
+def play(world, ticks, check = None):
+    rand = random.Random(11)
+    for i in range(ticks):
+        if world.over():
+            break
+        world.step(Pressed(rand.choice(MOVES)))
+        if check:
+            check(world)
+
+
+class ContactsTest(unittest.TestCase):
+    LEVELS = ("pompei/pompei-13.lvl", "pompei/pompei-15.lvl",
+              "snow/snow-10.lvl")
+
+    def assertContacts(self, world):
+        """
+        The contacts of every listening sprite are the sprites in its
+        cells.
+        """
+        occupancy = world.occupancy
+        listeners = set()
+        for bucket in occupancy._listeners.values():
+            listeners.update(bucket)
+        self.listened += len(listeners)
+        for listener in listeners:
+            cells = set((i % occupancy.width - 1, i // occupancy.width - 1)
+                        for i in listener._listenCells)
+            for group in watched(world):
+                found = [s for s in group
+                         if cells.intersection(group._spriteCells[s][1])]
+                self.assertEqual(listener.touching(group), found)
+
+    def testContacts(self):
+        self.listened = 0
+        for name in self.LEVELS:
+            play(loadWorld(name), 300, self.assertContacts)
+        self.assertTrue(self.listened)
+
+    def testUnlisten(self):
+        world = loadWorld(self.LEVELS[0])
+        play(world, 50)
+        listeners = set()
+        for bucket in world.occupancy._listeners.values():
+            listeners.update(bucket)
+        listener = listeners.pop()
+        listener.unlisten()
+        self.assertIsNone(listener.contacts)
+        self.assertEqual(listener.touching(world.blocks),
+                         world.blocks.sprites())
+        for bucket in world.occupancy._listeners.values():
+            self.assertNotIn(listener, bucket)
+
+    def testPolling(self):
+        """
+        The levels play the same way with every sprite looking through
+        the groups instead.
+        """
+        listen = AnimatedSprite.listen
+        for name in self.LEVELS:
+            world = loadWorld(name)
+            play(world, 300)
+            expected = positions(world)
+            AnimatedSprite.listen = lambda sprite, occupancy, cells: None
+            try:
+                world = loadWorld(name)
+                play(world, 300)
+            finally:
+                AnimatedSprite.listen = listen
+            self.assertEqual(positions(world), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
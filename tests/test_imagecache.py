@@ -0,0 +1,125 @@
+"""
+Tests of the cache of decoded images.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import os, shutil, tempfile, unittest
+import pygame
+import pygame.image
+
+from magicor.resources import ImageCache
+
+
+class ImageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.saved = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def makeImage(self, name, color, size = (8, 4), alpha = False):
+        """
+        Saves an image filled with the color, returns the filename and
+        the surface.
+        """
+        surface = pygame.Surface(size, alpha and pygame.SRCALPHA or 0, 32)
+        surface.fill(color)
+        filename = os.path.join(self.path, name)
+        pygame.image.save(surface, filename)
+        # every save a second later, a change within the resolution of
+        # the filesystem clock would go unnoticed
+        self.saved += 1
+        st = os.stat(filename)
+        os.utime(filename, ns = (st.st_atime_ns,
+                                 st.st_mtime_ns + self.saved * 10 ** 9))
+        return filename, surface
+
+    def assertSamePixels(self, a, b):
+        format_ = b.get_flags() & pygame.SRCALPHA and "RGBA" or "RGB"
+        self.assertEqual(a.get_size(), b.get_size())
+        self.assertEqual(pygame.image.tobytes(a, format_),
+                         pygame.image.tobytes(b, format_))
+
+    def testRoundTrip(self):
+        red, redSurface = self.makeImage("red.png", (255, 0, 0))
+        clear, clearSurface = self.makeImage("clear.png", (0, 0, 255, 100),
+                                             alpha = True)
+        redSurface.set_colorkey((255, 0, 255))
+        cache = ImageCache(self.path)
+        self.assertIsNone(cache.get(red))
+        cache.put(red, redSurface)
+        cache.put(clear, clearSurface)
+        # pending images are there before they are saved
+        self.assertSamePixels(cache.get(red), redSurface)
+        cache.save()
+        cache = ImageCache(self.path)
+        self.assertSamePixels(cache.get(red), redSurface)
+        self.assertEqual(cache.get(red).get_colorkey()[:3], (255, 0, 255))
+        self.assertSamePixels(cache.get(clear), clearSurface)
+        self.assertTrue(cache.get(clear).get_flags() & pygame.SRCALPHA)
+
+    def testChangedFile(self):
+        filename, surface = self.makeImage("image.png", (255, 0, 0))
+        cache = ImageCache(self.path)
+        cache.put(filename, surface)
+        cache.save()
+        self.makeImage("image.png", (0, 255, 0))
+        self.assertIsNone(ImageCache(self.path).get(filename))
+
+    def testAppend(self):
+        """
+        Images added to a cache of live images go at the end of the data
+        file, where what is already mapped stays as it is.
+        """
+        images = [self.makeImage("image%d.png"%i, (i * 50, 0, 0))
+                  for i in range(4)]
+        cache = ImageCache(self.path)
+        for filename, surface in images[:3]:
+            cache.put(filename, surface)
+        cache.save()
+        before = os.stat(cache.dataFile)
+        mapped = cache.get(images[0][0])
+        cache.put(*images[3])
+        cache.save()
+        after = os.stat(cache.dataFile)
+        self.assertEqual(after.st_ino, before.st_ino)
+        self.assertEqual(after.st_size, before.st_size * 4 // 3)
+        self.assertSamePixels(mapped, images[0][1])
+        cache = ImageCache(self.path)
+        for filename, surface in images:
+            self.assertSamePixels(cache.get(filename), surface)
+
+    def testRewrite(self):
+        """
+        When most of the data file would be stale images it is written
+        anew with only the live ones, in place of the mapped file.
+        """
+        images = [self.makeImage("image%d.png"%i, (i * 50, 0, 0))
+                  for i in range(3)]
+        cache = ImageCache(self.path)
+        for filename, surface in images:
+            cache.put(filename, surface)
+        cache.save()
+        before = os.stat(cache.dataFile)
+        mapped = cache.get(images[0][0])
+        changed = [self.makeImage("image%d.png"%i, (0, i * 50, 0))
+                   for i in range(2)]
+        for filename, surface in changed:
+            cache.put(filename, surface)
+        cache.save()
+        after = os.stat(cache.dataFile)
+        self.assertNotEqual(after.st_ino, before.st_ino)
+        self.assertEqual(after.st_size, before.st_size)
+        self.assertSamePixels(mapped, images[0][1])
+        cache = ImageCache(self.path)
+        for filename, surface in changed + images[2:]:
+            self.assertSamePixels(cache.get(filename), surface)
+        self.assertEqual([f for f in os.listdir(self.path)
+                          if f.endswith(".tmp")], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Tests of the compiled level format.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import os, shutil, tempfile, warnings, unittest
+
+from magicor.level import (Level, compileLevel, compiledFilename,
+                           loadLevel)
+from tests import DATA_PATH
+
+
+def shippedLevels():
+    path = os.path.join(DATA_PATH, "levels")
+    return sorted(os.path.join(root, name)
+                  for root, dirs, names in os.walk(path)
+                  for name in names if name.endswith(".lvl"))
+
+
+class CompiledLevelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, "level.lvl")
+        shutil.copy(shippedLevels()[0], self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def assertSameLevel(self, a, b):
+        self.assertEqual(str(a), str(b))
+        self.assertEqual(a.id, b.id)
+        self.assertEqual((a.width, a.height, a.shadows),
+                         (b.width, b.height, b.shadows))
+        self.assertEqual(a.tiles, b.tiles)
+        self.assertEqual([a.getSolidRow(y) for y in range(a.height)],
+                         [b.getSolidRow(y) for y in range(b.height)])
+
+    def testShippedLevels(self):
+        for filename in shippedLevels():
+            with open(filename) as f, warnings.catch_warnings():
+                # some shipped levels have rows the parser skips
+                warnings.simplefilter("ignore")
+                level = Level(f.read())
+            self.assertSameLevel(Level.fromBinary(level.toBinary()), level)
+
+    def testFields(self):
+        level = Level("title På isen\nshadows 0\n"
+                      "tile 0 0 tiles/stone\ntile 19 17 tiles/stone\n"
+                      "sprite 1 2 player left\nsprite 3 4 ice\n")
+        loaded = Level.fromBinary(level.toBinary())
+        self.assertSameLevel(loaded, level)
+        self.assertEqual(loaded.title, "På isen")
+        self.assertIsNone(loaded.hint)
+        self.assertFalse(loaded.shadows)
+        self.assertEqual([(s.x, s.y, s.name, s.args) for s in loaded.sprites],
+                         [(1, 2, "player", "left"), (3, 4, "ice", None)])
+
+    def testNotCompiled(self):
+        self.assertRaises(ValueError, Level.fromBinary, b"")
+        self.assertRaises(ValueError, Level.fromBinary, b"MLVL" + b"\0" * 100)
+
+    def testLoad(self):
+        compiled = compileLevel(self.filename)
+        self.assertEqual(compiled, compiledFilename(self.filename))
+        # mark the compiled level to tell where it was loaded from
+        with open(self.filename) as f:
+            level = Level(f.read())
+        level.title = "Compiled"
+        st = os.stat(self.filename)
+        with open(compiled, "wb") as f:
+            f.write(level.toBinary((st.st_mtime_ns, st.st_size)))
+        self.assertEqual(loadLevel(self.filename).title, "Compiled")
+
+    def testLoadStale(self):
+        compileLevel(self.filename)
+        with open(self.filename, "a") as f:
+            f.write("\nhint Changed\n")
+        level = loadLevel(self.filename)
+        self.assertEqual(level.hint, "Changed")
+        with open(self.filename) as f:
+            self.assertSameLevel(level, Level(f.read()))
+
+    def testLoadBroken(self):
+        with open(compiledFilename(self.filename), "wb") as f:
+            f.write(b"MLVL")
+        with open(self.filename) as f:
+            self.assertSameLevel(loadLevel(self.filename), Level(f.read()))
+        os.remove(compiledFilename(self.filename))
+        with open(self.filename) as f:
+            self.assertSameLevel(loadLevel(self.filename), Level(f.read()))
+
+
+if __name__ == "__main__":
+    unittest.main()
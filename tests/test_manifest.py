@@ -0,0 +1,123 @@
+"""
+Tests of the manifest resource files are looked up in.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import os, io, shutil, tempfile, contextlib, unittest
+
+from magicor.resources import Manifest, Resources
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, "levels"))
+        os.mkdir(os.path.join(self.path, "levels", "forest"))
+        os.mkdir(os.path.join(self.path, "sprites"))
+        self.write("levels", "forest", "forest-01.lvl")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def join(self, *names):
+        return os.path.join(self.path, *names)
+
+    def write(self, *names):
+        with open(self.join(*names), "w") as f:
+            f.write("title Test\n")
+
+    def touch(self, *names):
+        """
+        Moves the modification time of the directory on, as a change
+        made within the resolution of the filesystem clock would not.
+        """
+        st = os.stat(self.join(*names))
+        os.utime(self.join(*names),
+                 ns = (st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    def testLookups(self):
+        manifest = Manifest()
+        manifest.scanTree(self.path)
+        self.assertTrue(manifest.isdir(self.join("levels")))
+        self.assertTrue(manifest.isfile(self.join("levels", "forest",
+                                                  "forest-01.lvl")))
+        self.assertFalse(manifest.isfile(self.join("levels", "forest")))
+        self.assertFalse(manifest.isdir(self.join("missing")))
+        self.assertEqual(sorted(manifest.listdir(self.join("levels"))),
+                         [("forest", True)])
+
+    def testRefresh(self):
+        manifest = Manifest()
+        manifest.scanTree(self.path)
+        self.assertFalse(manifest.refresh())
+        self.write("levels", "forest", "forest-02.lvl")
+        self.touch("levels", "forest")
+        filename = self.join("levels", "forest", "forest-02.lvl")
+        # the listing is kept until refreshed
+        self.assertFalse(manifest.isfile(filename))
+        self.assertTrue(manifest.refresh())
+        self.assertTrue(manifest.isfile(filename))
+        self.assertFalse(manifest.refresh())
+
+    def testRefreshRemoved(self):
+        manifest = Manifest()
+        manifest.scanTree(self.path)
+        shutil.rmtree(self.join("levels", "forest"))
+        self.assertTrue(manifest.refresh())
+        self.assertFalse(manifest.isdir(self.join("levels", "forest")))
+
+    def testRefreshTop(self):
+        manifest = Manifest()
+        manifest.scanTree(self.path)
+        self.write("sprites", "player.png")
+        self.touch("sprites")
+        self.write("levels", "forest", "forest-02.lvl")
+        self.touch("levels", "forest")
+        self.assertTrue(manifest.refresh(self.join("levels")))
+        self.assertTrue(manifest.isfile(self.join("levels", "forest",
+                                                  "forest-02.lvl")))
+        # outside top is left alone
+        self.assertFalse(manifest.isfile(self.join("sprites", "player.png")))
+        self.assertFalse(manifest.refresh(self.join("levels")))
+        self.assertTrue(manifest.refresh())
+
+    def testCacheFile(self):
+        cacheFile = self.join("manifest.json")
+        manifest = Manifest(cacheFile)
+        manifest.scanTree(self.join("levels"))
+        manifest.save()
+        self.assertTrue(os.path.isfile(cacheFile))
+        loaded = Manifest(cacheFile)
+        self.assertEqual(loaded._directories, manifest._directories)
+        # a directory changed between runs is listed again on load
+        self.write("levels", "forest", "forest-02.lvl")
+        self.touch("levels", "forest")
+        loaded = Manifest(cacheFile)
+        self.assertTrue(loaded.isfile(self.join("levels", "forest",
+                                                "forest-02.lvl")))
+
+    def testLevelCatalog(self):
+        """
+        Levels saved since the resources were created are in the
+        catalog the next time it is loaded.
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            resources = Resources([self.path], False, False)
+            before = resources.loadLevelCatalog()
+        self.write("levels", "forest", "forest-02.lvl")
+        self.touch("levels", "forest")
+        with contextlib.redirect_stdout(io.StringIO()):
+            after = resources.loadLevelCatalog()
+        self.assertEqual([e.filename for e in before],
+                         [self.join("levels", "forest", "forest-01.lvl")])
+        self.assertEqual([(e.filename, e.theme) for e in after],
+                         [(self.join("levels", "forest", "forest-01.lvl"),
+                           "forest"),
+                          (self.join("levels", "forest", "forest-02.lvl"),
+                           "forest")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Tests of where enemies walk and climb.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import random, unittest
+
+from magicor.replay import Replay
+from tests import Pressed, loadWorld
+
+MOVES = Replay.BUTTONS + (None, None)
+
+
+def positions(world):
+    return [(type(s).__name__, s.x, s.y, s._animationName)
+            for group in (world.players, world.blocks, world.fires,
+                          world.enemies, world.world)
+            for s in group]
+
+
+class NavigationTest(unittest.TestCase):
+
+    def play(self, world, ticks, seed = 3):
+        rand = random.Random(seed)
+        for i in range(ticks):
+            world.step(Pressed(rand.choice(MOVES)))
+
+    def runs(self, cells):
+        """
+        The (first, end) run of True cells each cell is in, None for
+        False cells.
+        """
+        ret = []
+        for i, cell in enumerate(cells):
+            if not cell:
+                ret.append(None)
+            elif i and ret[-1]:
+                ret.append(ret[-1])
+            else:
+                end = i
+                while end < len(cells) and cells[end]:
+                    end += 1
+                ret.append((i, end))
+        return ret
+
+    def assertNavigation(self, world):
+        """
+        The platforms and climbs are those of the level and the sprites
+        as they are, not as they were when first asked for.
+        """
+        level = world.level
+        taken = set()
+        for group in (world.blocks, world.fires, world.world):
+            for sprite in group:
+                taken.update(world.occupancy.cells(sprite.rect))
+        free = [[not level.isSolid(x, y) and (x, y) not in taken
+                 for x in range(level.width)]
+                for y in range(level.height)]
+        navigation = world.navigation
+        for y in range(level.height):
+            platforms = self.runs([y < level.height - 1
+                                   and level.isSolid(x, y + 1)
+                                   and free[y][x]
+                                   for x in range(level.width)])
+            self.assertEqual([navigation.platform(x, y)
+                              for x in range(level.width)], platforms)
+        for x in range(level.width):
+            climbs = self.runs([free[y][x] for y in range(level.height)])
+            self.assertEqual([navigation.climb(x, y)
+                              for y in range(level.height)], climbs)
+
+    def testPlatformsAndClimbs(self):
+        for name in ("space/space-15.lvl", "egypt/egypt-11.lvl"):
+            world = loadWorld(name, seed = 5)
+            self.assertNavigation(world)
+            for i in range(8):
+                self.play(world, 25, seed = i)
+                self.assertNavigation(world)
+
+    def testOutside(self):
+        world = loadWorld("space/space-15.lvl")
+        navigation = world.navigation
+        level = world.level
+        for cx, cy in ((-1, 0), (level.width, 0), (0, -1),
+                       (0, level.height), (0, level.height - 1)):
+            self.assertIsNone(navigation.platform(cx, cy))
+        for cx, cy in ((-1, 0), (level.width, 0), (0, -1),
+                       (0, level.height)):
+            self.assertIsNone(navigation.climb(cx, cy))
+
+    def testForget(self):
+        """
+        Only the rows and columns of the cells a sprite enters or leaves
+        are worked out again.
+        """
+        world = loadWorld("egypt/egypt-11.lvl")
+        navigation = world.navigation
+        level = world.level
+        for y in range(level.height):
+            navigation.platform(0, y)
+        for x in range(level.width):
+            navigation.climb(x, 0)
+        platforms = dict(navigation._platforms)
+        climbs = dict(navigation._climbs)
+        ice = world.blocks.sprites()[0]
+        cells = world.occupancy.cells(ice.rect)
+        ice.rect.move_ip(32, 0)
+        ice.reindex()
+        cells += world.occupancy.cells(ice.rect)
+        for y in range(level.height):
+            self.assertEqual(navigation._platforms.get(y) is platforms[y],
+                             y not in [cy for cx, cy in cells])
+        for x in range(level.width):
+            self.assertEqual(navigation._climbs.get(x) is climbs[x],
+                             x not in [cx for cx, cy in cells])
+        self.assertNavigation(world)
+
+    def testEnemies(self):
+        """
+        Enemies move the same with the navigation as without it.
+        """
+        for name in ("space/space-15.lvl", "egypt/egypt-11.lvl"):
+            world = loadWorld(name, seed = 5)
+            self.play(world, 300)
+            expected = positions(world)
+            world = loadWorld(name, seed = 5)
+            for enemy in world.enemies:
+                enemy.navigation = None
+            self.play(world, 300)
+            self.assertEqual(positions(world), expected)
+
+    def testWatched(self):
+        world = loadWorld("space/space-15.lvl")
+        enemy = world.enemies.sprites()[0]
+        self.assertTrue(world.navigation.watched())
+        world.fires.occupancy = None
+        self.assertFalse(world.navigation.watched())
+        # the blocked queries answer instead
+        self.assertFalse(enemy.walkable(enemy.x))
+        self.assertFalse(enemy.climbable(enemy.y))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Tests of the occupancy grid of a level.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import random, unittest
+
+from magicor.replay import Replay
+from magicor.sprites.occupancy import OccupancyGrid
+from tests import Pressed, loadWorld
+
+MOVES = Replay.BUTTONS + (None, None)
+
+
+def watched(world):
+    return (world.blocks, world.players, world.enemies, world.fires,
+            world.world, world.stones)
+
+
+class OccupancyGridTest(unittest.TestCase):
+
+    def setUp(self):
+        self.world = loadWorld("forest/forest-13.lvl", seed = 7)
+        self.random = random.Random(7)
+
+    def play(self, ticks):
+        for i in range(ticks):
+            self.world.step(Pressed(self.random.choice(MOVES)))
+
+    def assertCounts(self, grid, group):
+        counts = {}
+        for sprite in group:
+            for cell in grid.cells(sprite.rect):
+                counts[cell] = counts.get(cell, 0) + 1
+        for cy in range(-1, grid.height - 1):
+            for cx in range(-1, grid.width - 1):
+                self.assertEqual(grid.count(group, cx, cy),
+                                 counts.get((cx, cy), 0))
+
+    def expected(self, group, x, y, width, height, exclude):
+        """
+        What the blocked queries find without the grid.
+        """
+        level = self.world.level
+        if (level.isSolid(x // 32, y // 32)
+            or level.isSolid((x + max(width, 1) - 1) // 32, y // 32)):
+            return True
+        return group.getSprite(x, y, width, height, exclude) is not None
+
+    def testCounts(self):
+        grid = self.world.occupancy
+        for i in range(10):
+            self.play(30)
+            for group in watched(self.world):
+                self.assertCounts(grid, group)
+
+    def testWatch(self):
+        self.play(50)
+        grid = OccupancyGrid(self.world.level)
+        grid.watch(self.world.blocks)
+        self.assertCounts(grid, self.world.blocks)
+        self.assertIs(self.world.blocks.occupancy, grid)
+
+    def testEdges(self):
+        grid = self.world.occupancy
+        blocks = self.world.blocks
+        ice = blocks.sprites()[0]
+        for x, y in ((-16, 64), (0, -32), (grid.level.width * 32, 64)):
+            ice.rect.topleft = (x, y)
+            ice.reindex()
+            self.assertCounts(grid, blocks)
+
+    def testAreas(self):
+        grid = self.world.occupancy
+        level = self.world.level
+        blocks = self.world.blocks
+        for i in range(5):
+            self.play(40)
+            sprites = blocks.sprites() + [None]
+            for j in range(500):
+                width = self.random.randrange(0, 70)
+                height = self.random.randrange(0, 70)
+                x = self.random.randrange(0, level.width * 32 - width)
+                y = self.random.randrange(0, level.height * 32 - height)
+                exclude = self.random.choice(sprites)
+                self.assertEqual(grid.test(blocks, x, y, width, height,
+                                           exclude),
+                                 self.expected(blocks, x, y, width, height,
+                                               exclude))
+
+    def testUnanswered(self):
+        grid = self.world.occupancy
+        blocks = self.world.blocks
+        level = self.world.level
+        self.assertIsNone(grid.test(blocks, 32.5, 32, 32, 32))
+        self.assertIsNone(grid.test(blocks, 32, 32, 31.0, 32))
+        self.assertIsNone(grid.test(blocks, -1, 32, 32, 32))
+        self.assertIsNone(grid.test(blocks, 32, level.height * 32 - 16,
+                                    32, 32))
+        self.assertIsNone(grid.test(blocks, level.width * 32, 32, 0, 32))
+
+    def testTestAll(self):
+        grid = self.world.occupancy
+        blocks = self.world.blocks
+        areas = [(x, 64, 32, 32, None) for x in range(0, 320, 16)]
+        self.assertEqual(grid.testAll(blocks, areas),
+                         [grid.test(blocks, *area) for area in areas])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Tests of recording, storing and playing back replays.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import random, unittest
+
+from magicor.replay import Replay, ReplayInputs
+from tests import Pressed, loadWorld
+
+
+def positions(world):
+    return [(type(s).__name__, s.x, s.y, s._animationName)
+            for group in (world.players, world.blocks, world.fires,
+                          world.enemies, world.world)
+            for s in group]
+
+
+class ReplayTest(unittest.TestCase):
+
+    def testRecord(self):
+        replay = Replay(seed = 1)
+        replay.record(Pressed("left"))
+        replay.record(None)
+        replay.record(Pressed("action"))
+        self.assertEqual(replay.inputs, [1, 0, 16])
+
+    def testGetInputs(self):
+        replay = Replay(seed = 1)
+        replay.inputs = [2, 8]
+        inputs = replay.getInputs(1)
+        self.assertTrue(inputs.down)
+        self.assertFalse(inputs.right or inputs.left or inputs.up
+                         or inputs.action)
+        # nothing is pressed after the end
+        inputs = replay.getInputs(2)
+        for button in Replay.BUTTONS:
+            self.assertFalse(getattr(inputs, button))
+
+    def testRunLengths(self):
+        replay = Replay(seed = 7, eyecandy = False)
+        replay.inputs = [0, 0, 0, 1, 1, 4, 0, 0]
+        lines = str(replay).splitlines()
+        self.assertIn("seed 7", lines)
+        self.assertIn("eyecandy 0", lines)
+        self.assertIn("input 3:0 2:1 1:4 2:0", lines)
+
+    def testRunsPerLine(self):
+        replay = Replay(seed = 1)
+        replay.inputs = [i % 2 for i in range(Replay.RUNS_PER_LINE * 2 + 1)]
+        lines = [l for l in str(replay).splitlines()
+                 if l.startswith("input ")]
+        self.assertEqual([len(l.split()) - 1 for l in lines],
+                         [Replay.RUNS_PER_LINE, Replay.RUNS_PER_LINE, 1])
+
+    def testRoundTrip(self):
+        rand = random.Random(3)
+        replay = Replay(seed = 12345, eyecandy = False)
+        replay.level = "level-id"
+        replay.title = "Some Level"
+        replay.inputs = [rand.choice((0, 0, 0, 1, 2, 16)) for i in range(500)]
+        loaded = Replay(str(replay))
+        self.assertEqual(loaded.inputs, replay.inputs)
+        self.assertEqual(loaded.seed, 12345)
+        self.assertEqual(loaded.eyecandy, False)
+        self.assertEqual(loaded.level, "level-id")
+        self.assertEqual(loaded.title, "Some Level")
+
+    def testPlayBack(self):
+        """
+        A play recorded the way PlayState records it plays back the same
+        way, with every input on the tick it was pressed.
+        """
+        rand = random.Random(5)
+        moves = Replay.BUTTONS + (None, None)
+        world = loadWorld("forest/forest-03.lvl", seed = 99)
+        replay = Replay(level = world.level, seed = world.seed)
+        recorded = []
+        for i in range(300):
+            world.step()
+            inputs = Pressed(rand.choice(moves))
+            replay.record(inputs)
+            world.control(inputs)
+            recorded.append(positions(world))
+        replay = Replay(str(replay))
+        world = loadWorld("forest/forest-03.lvl", seed = replay.seed)
+        for i in range(300):
+            world.step()
+            world.control(replay.getInputs(world.ticks - 1))
+            self.assertEqual(positions(world), recorded[i])
+
+
+if __name__ == "__main__":
+    unittest.main()
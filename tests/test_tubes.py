@@ -0,0 +1,74 @@
+"""
+Tests of matching tubes through the tube registry of a level.
+
+Copyright 2006  Peter Gebauer. Licensed as Public Domain.
+(see LICENSE for more info)
+"""
+import random, unittest
+
+from magicor import g_random
+from magicor.replay import Replay
+from tests import Pressed, loadWorld
+
+MOVES = Replay.BUTTONS + (None, None)
+
+
+class TubeRegistryTest(unittest.TestCase):
+    LEVELS = ("snow/snow-08.lvl", "snow/snow-03.lvl", "egypt/egypt-06.lvl")
+
+    def scanned(self, tube):
+        """
+        The tube Tube.getMatching() finds looking through the world
+        group, drawing the same random number.
+        """
+        state = g_random.getstate()
+        registry = tube.registry
+        tube.registry = None
+        try:
+            return tube.getMatching()
+        finally:
+            tube.registry = registry
+            g_random.setstate(state)
+
+    def assertMatching(self, world):
+        for tube in world.tubes.tubes:
+            expected = self.scanned(tube)
+            self.assertIs(tube.getMatching(), expected)
+
+    def testMatching(self):
+        for name in self.LEVELS:
+            world = loadWorld(name)
+            self.assertTrue(world.tubes.tubes)
+            self.assertMatching(world)
+            rand = random.Random(2)
+            for i in range(300):
+                if world.over():
+                    break
+                world.step(Pressed(rand.choice(MOVES)))
+                if i % 10 == 0:
+                    self.assertMatching(world)
+
+    def testBlocked(self):
+        """
+        A block in front of the mouth of a tube blocks it, until it is
+        gone again.
+        """
+        for name in ("snow/snow-08.lvl", "snow/snow-11.lvl"):
+            world = loadWorld(name)
+            registry = world.tubes
+            ice = world.blocks.sprites()[0]
+            for tube in registry.tubes:
+                registry.blocked(tube)
+                cx, cy = tube.mouth()
+                x, y = ice.rect.topleft
+                ice.rect.topleft = (cx * 32, cy * 32)
+                ice.reindex()
+                self.assertEqual(registry.blocked(tube), tube.blocked())
+                self.assertTrue(registry.blocked(tube))
+                ice.rect.topleft = (x, y)
+                ice.reindex()
+                self.assertEqual(registry.blocked(tube), tube.blocked())
+
+
+if __name__ == "__main__":
+    unittest.main()